@@ -1,26 +1,46 @@
+import os
 import sys
-import json
 import re
+import time
+from html import escape
+import numpy as np
 from PyQt6.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton,
-    QListWidget, QListWidgetItem, QTableWidget, QTableWidgetItem, QScrollArea,
+    QTableWidget, QTableWidgetItem, QTableView, QListView, QStyledItemDelegate, QStyle, QScrollArea,
     QMessageBox, QFileDialog, QColorDialog, QDialog, QDialogButtonBox, QFormLayout,
-    QComboBox, QTabWidget, QSizePolicy, QGridLayout
+    QComboBox, QTabWidget, QSizePolicy, QGridLayout, QCheckBox, QSpinBox
 )
-from PyQt6.QtCore import Qt, QMimeData, QSize
-from PyQt6.QtGui import QDrag, QColor, QBrush, QFont
+from PyQt6.QtCore import (
+    Qt, QMimeData, QSize, QTimer, QAbstractTableModel, QAbstractListModel, QModelIndex, QRect, QSortFilterProxyModel,
+    pyqtSignal
+)
+from PyQt6.QtGui import QDrag, QColor, QBrush, QFont, QFontMetrics, QKeySequence, QShortcut, QPdfWriter, QTextDocument
 from PyQt6.QtGui import QIcon
 
+import timetable_autosave
+import timetable_perf
+import timetable_store
+from timetable_autosave import Autosave
+from timetable_cover import plan_cover
+from timetable_health import Health
+from timetable_history import History
+from timetable_model import WEEKDAYS, Room, School, Teacher, current_format
+from timetable_search import TeacherIndex
+from timetable_solver import FREE, RestartRun, apply_solution, check, snapshot
+
 
-class Teacher:
-    def __init__(self, name, subject, color):
-        self.name = name
-        self.subject = subject
-        self.color = color
+def parse_subjects(text):
+    """Title-cased subjects from a comma-separated list, without blanks or repeats."""
+    subjects = []
+    for subject in text.split(","):
+        subject = subject.strip().title()
+        if subject and subject not in subjects:
+            subjects.append(subject)
+    return subjects
 
 
 class TeacherEditDialog(QDialog):
-    def __init__(self, teacher, parent=None):
+    def __init__(self, teacher, school, parent=None):
         super().__init__(parent)
         self.setWindowTitle("Edit or Delete Teacher")
         self.teacher = teacher
@@ -28,15 +48,45 @@ class TeacherEditDialog(QDialog):
         layout = QFormLayout(self)
 
         self.name_input = QLineEdit(teacher.name)
-        self.subject_input = QLineEdit(teacher.subject)
+        self.subject_input = QLineEdit(", ".join(teacher.subjects))
         self.color_btn = QPushButton()
         self.update_color_btn()
         self.color_btn.clicked.connect(self.pick_color)
 
         layout.addRow("Name:", self.name_input)
-        layout.addRow("Subject:", self.subject_input)
+        layout.addRow("Subjects:", self.subject_input)
         layout.addRow("Subject Color:", self.color_btn)
 
+        # 0 means no limit.
+        limits = school.teacher_limits.get(teacher.id, {})
+        self.day_limit_spin = QSpinBox()
+        self.day_limit_spin.setRange(0, 16)
+        self.day_limit_spin.setSpecialValueText("No limit")
+        self.day_limit_spin.setValue(limits.get("day", 0))
+        self.week_limit_spin = QSpinBox()
+        self.week_limit_spin.setRange(0, 16 * len(WEEKDAYS))
+        self.week_limit_spin.setSpecialValueText("No limit")
+        self.week_limit_spin.setValue(limits.get("week", 0))
+        layout.addRow("Max periods per day:", self.day_limit_spin)
+        layout.addRow("Max periods per week:", self.week_limit_spin)
+
+        # One checkbox per slot, ticked where the teacher can be timetabled.
+        self.school = school
+        mask = school.unavailable.get(teacher.id, 0)
+        self.availability_table = QTableWidget(school.periods, len(school.days))
+        self.availability_table.setHorizontalHeaderLabels(school.days)
+        self.availability_table.setVerticalHeaderLabels([f"P{i}" for i in range(1, school.periods + 1)])
+        self.availability_table.horizontalHeader().setDefaultSectionSize(44)
+        self.availability_table.verticalHeader().setDefaultSectionSize(22)
+        for r in range(school.periods):
+            for c in range(len(school.days)):
+                item = QTableWidgetItem()
+                item.setFlags(Qt.ItemFlag.ItemIsUserCheckable | Qt.ItemFlag.ItemIsEnabled)
+                unavailable = mask >> school.slot(r, c) & 1
+                item.setCheckState(Qt.CheckState.Unchecked if unavailable else Qt.CheckState.Checked)
+                self.availability_table.setItem(r, c, item)
+        layout.addRow("Available:", self.availability_table)
+
         buttons = QDialogButtonBox()
         self.modify_btn = buttons.addButton("Modify", QDialogButtonBox.ButtonRole.AcceptRole)
         self.delete_btn = buttons.addButton("Delete", QDialogButtonBox.ButtonRole.DestructiveRole)
@@ -61,12 +111,24 @@ class TeacherEditDialog(QDialog):
             self.update_color_btn()
 
     def modify_clicked(self):
-        if not self.name_input.text().strip() or not self.subject_input.text().strip():
-            QMessageBox.warning(self, "Input Error", "Please enter both name and subject.")
+        if not self.name_input.text().strip() or not parse_subjects(self.subject_input.text()):
+            QMessageBox.warning(self, "Input Error", "Please enter a name and at least one subject.")
             return
         self.action = "modify"
         self.accept()
 
+    def limits(self):
+        limits = {"day": self.day_limit_spin.value(), "week": self.week_limit_spin.value()}
+        return {kind: n for kind, n in limits.items() if n}
+
+    def unavailable_mask(self):
+        mask = 0
+        for r in range(self.availability_table.rowCount()):
+            for c in range(self.availability_table.columnCount()):
+                if self.availability_table.item(r, c).checkState() == Qt.CheckState.Unchecked:
+                    mask |= 1 << self.school.slot(r, c)
+        return mask
+
     def delete_clicked(self):
         confirm = QMessageBox.question(self, "Confirm Delete", f"Delete teacher '{self.teacher.name}'?", QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
         if confirm == QMessageBox.StandardButton.Yes:
@@ -74,21 +136,111 @@ class TeacherEditDialog(QDialog):
             self.accept()
 
 
-class TeacherList(QListWidget):
+class TeacherListModel(QAbstractListModel):
+    """One row per lesson code (teacher and subject) in the teacher list."""
+
+    def __init__(self, school):
+        super().__init__()
+        self.school = school
+        self.codes = []
+        self.rows = {}
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.codes)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        code = self.codes[index.row()]
+        if role == Qt.ItemDataRole.UserRole:
+            return code
+        teacher = self.school.teacher_of(code)
+        if teacher is None:
+            return None
+        if role == Qt.ItemDataRole.DisplayRole:
+            return f"{teacher.name} ({self.school.lesson_of(code)[1]})"
+        if role == Qt.ItemDataRole.BackgroundRole:
+            return QBrush(teacher.color)
+        if role == Qt.ItemDataRole.ForegroundRole:
+            return QBrush(Qt.GlobalColor.white)
+        return None
+
+    def flags(self, index):
+        return super().flags(index) | Qt.ItemFlag.ItemIsDragEnabled
+
+    def set_codes(self, codes):
+        self.beginResetModel()
+        self.codes = list(codes)
+        self.rows = {code: row for row, code in enumerate(self.codes)}
+        self.endResetModel()
+
+    def append(self, codes):
+        codes = [code for code in codes if code not in self.rows]
+        if not codes:
+            return
+        first = len(self.codes)
+        self.beginInsertRows(QModelIndex(), first, first + len(codes) - 1)
+        for code in codes:
+            self.rows[code] = len(self.codes)
+            self.codes.append(code)
+        self.endInsertRows()
+
+    def remove(self, code):
+        row = self.rows.pop(code)
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self.codes[row]
+        for later in self.codes[row:]:
+            self.rows[later] -= 1
+        self.endRemoveRows()
+
+    def changed(self, code):
+        index = self.index(self.rows[code])
+        self.dataChanged.emit(index, index)
+
+
+class TeacherFilterProxy(QSortFilterProxyModel):
+    """Hides the rows outside the free-teacher filter or the search box's matches.
+
+    Both are sets of lesson codes, or None to show everything, so a keystroke
+    costs one set lookup per row and the source list is never rebuilt.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.allowed = None
+        self.matches = None
+
+    def set_sets(self, allowed, matches):
+        self.allowed = allowed
+        self.matches = matches
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        code = self.sourceModel().codes[source_row]
+        return ((self.allowed is None or code in self.allowed)
+                and (self.matches is None or code in self.matches))
+
+
+class TeacherList(QListView):
     def __init__(self, teachers, parent):
         super().__init__()
         self.setDragEnabled(True)
+        self.setEditTriggers(QListView.EditTrigger.NoEditTriggers)
+        self.setUniformItemSizes(True)
         self.teachers = teachers
         self.parent = parent
-        self.itemDoubleClicked.connect(self.edit_teacher_dialog)
+        self.source = TeacherListModel(parent.school)
+        self.proxy = TeacherFilterProxy()
+        self.proxy.setSourceModel(self.source)
+        self.setModel(self.proxy)
+        self.query = ""
+        self.doubleClicked.connect(self.edit_teacher_dialog)
         self.setStyleSheet("""
-            QListWidget {
+            QListView {
                 background-color: #2e2e2e;
                 border-radius: 8px;
                 color: white;
                 font-size: 14px;
             }
-            QListWidget::item:selected {
+            QListView::item:selected {
                 background-color: #5a9bd8;
                 color: white;
             }
@@ -96,127 +248,203 @@ class TeacherList(QListWidget):
 
 
     def startDrag(self, dropActions):
-        item = self.currentItem()
-        if item:
-            key = item.data(Qt.ItemDataRole.UserRole)
-            if key:
-                mime_data = QMimeData()
-                mime_data.setText(key)
-                drag = QDrag(self)
-                drag.setMimeData(mime_data)
-                drag.exec()
-
-    def add_teacher(self, teacher):
-        key = f"{teacher.name}|{teacher.subject}"
-        self.teachers[key] = teacher
-        item = QListWidgetItem(f"{teacher.name} ({teacher.subject})")
-        item.setForeground(QBrush(Qt.GlobalColor.white))
-        item.setBackground(QBrush(teacher.color))
-        item.setData(Qt.ItemDataRole.UserRole, key)
-        self.addItem(item)
-
-    def update_teacher_item(self, old_key, new_teacher):
-        if old_key != f"{new_teacher.name}|{new_teacher.subject}":
-            self.teachers.pop(old_key, None)
-            new_key = f"{new_teacher.name}|{new_teacher.subject}"
-            self.teachers[new_key] = new_teacher
-            for i in range(self.count()):
-                item = self.item(i)
-                if item.data(Qt.ItemDataRole.UserRole) == old_key:
-                    item.setText(f"{new_teacher.name} ({new_teacher.subject})")
-                    item.setBackground(QBrush(new_teacher.color))
-                    item.setForeground(QBrush(Qt.GlobalColor.white))
-                    item.setData(Qt.ItemDataRole.UserRole, new_key)
-                    # Fix style shape by resetting stylesheet or item flags if needed:
-                    item.setFont(QFont("Segoe UI", 11, QFont.Weight.Bold))
-                    break
-
-
-    def edit_teacher_dialog(self, item):
-        old_key = item.data(Qt.ItemDataRole.UserRole)
-        if not old_key or old_key not in self.teachers:
+        code = self.current_code()
+        if code:
+            mime_data = QMimeData()
+            mime_data.setText(str(code))
+            drag = QDrag(self)
+            drag.setMimeData(mime_data)
+            drag.exec()
+
+    def current_code(self):
+        index = self.currentIndex()
+        return index.data(Qt.ItemDataRole.UserRole) if index.isValid() else None
+
+    def add_teacher(self, teacher, subjects=None):
+        """Add *teacher* to the school if new, and list one item per subject (or per one of *subjects*)."""
+        school = self.parent.school
+        if teacher.id not in self.teachers:
+            with self.parent.history.transaction("Add Teacher"):
+                school.add_teacher(teacher)
+        self.source.append([school.code_of(teacher.id, subject) for subject in subjects or teacher.subjects])
+        self.refresh_search()
+
+    def reload(self):
+        """List every teacher of the school afresh, after a load; the free-teacher filter is dropped."""
+        school = self.parent.school
+        self.source.set_codes(school.code_of(tid, subject)
+                              for tid, teacher in self.teachers.items() for subject in teacher.subjects)
+        self.proxy.set_sets(None, self.parent.teacher_index.search(self.query))
+
+    def sync(self, teacher_ids):
+        """Bring the items of *teacher_ids* in line with the school after an edit, undo or redo."""
+        school = self.parent.school
+        for teacher_id in teacher_ids:
+            teacher = self.teachers.get(teacher_id)
+            subjects = teacher.subjects if teacher is not None else []
+            for code in [code for code in self.source.codes if school.lesson_of(code)[0] == teacher_id]:
+                if school.lesson_of(code)[1] in subjects:
+                    self.source.changed(code)
+                else:
+                    self.source.remove(code)
+            if teacher is not None:
+                self.source.append([school.code_of(teacher_id, subject) for subject in subjects])
+        self.refresh_search()
+
+    def search(self, query):
+        """Show only the items whose teacher name or subject match *query* as typed so far."""
+        self.query = query
+        with timetable_perf.timed("teacher_search", len(self.source.codes)):
+            self.proxy.set_sets(self.proxy.allowed, self.parent.teacher_index.search(query))
+
+    def refresh_search(self):
+        # A renamed or new teacher may now match the query, or no longer match it.
+        if self.proxy.matches is not None:
+            self.search(self.query)
+
+    def set_allowed(self, codes):
+        """Show only the lesson codes in *codes* (None shows all) until reset."""
+        self.proxy.set_sets(codes, self.proxy.matches)
+
+    def edit_teacher_dialog(self, index):
+        code = index.data(Qt.ItemDataRole.UserRole)
+        school = self.parent.school
+        teacher = school.teacher_of(code) if code else None
+        if teacher is None:
             return
-        teacher = self.teachers[old_key]
-        dialog = TeacherEditDialog(teacher, self)
+        dialog = TeacherEditDialog(teacher, school, self)
         if dialog.exec():
             if dialog.action == "modify":
                 new_name = dialog.name_input.text().strip().title()
-                new_subject = dialog.subject_input.text().strip().title()
-                new_color = dialog.selected_color
-                new_teacher = Teacher(new_name, new_subject, new_color)
-                self.update_teacher_item(old_key, new_teacher)
-                for grade_tab in self.parent.all_tables.values():
-                    for class_table in grade_tab["tables"].values():
-                        for row in range(class_table.rowCount()):
-                            for col in range(class_table.columnCount()):
-                                cell = class_table.item(row, col)
-                                if cell.data(Qt.ItemDataRole.UserRole) == old_key:
-                                    cell.setText(new_name)
-                                    cell.setBackground(QBrush(new_color))
-                                    cell.setForeground(QBrush(Qt.GlobalColor.white))
-                                    cell.setFont(QFont("Segoe UI", 11, QFont.Weight.Bold))
-                                    cell.setData(Qt.ItemDataRole.UserRole, f"{new_name}|{new_subject}")
-                                    
+                new_subjects = parse_subjects(dialog.subject_input.text())
+                if not new_name or not new_subjects:
+                    QMessageBox.warning(self, "Input Error", "A teacher needs a name and at least one subject.")
+                    return
+                new_teacher = Teacher(new_name, new_subjects, dialog.selected_color, teacher.id)
+                # Cells refer to the teacher's ID, so a rename or recolour changes no cell;
+                # only lessons in a dropped subject are cleared. The rest are repainted here.
+                with timetable_perf.timed("teacher_edit"):
+                    # Everything the dialog changed undoes as one step.
+                    with self.parent.history.transaction("Edit Teacher"):
+                        school.set_limits(teacher.id, dialog.limits())
+                        school.set_unavailable(teacher.id, dialog.unavailable_mask())
+                        cells = school.update_teacher(new_teacher)
+                    self.sync([teacher.id])
+                    for timetable, row, col in cells:
+                        self.parent.refresh_cell(timetable, row, col)
+
             elif dialog.action == "delete":
-                del self.teachers[old_key]
-                self.takeItem(self.row(item))
-                for grade_tab in self.parent.all_tables.values():
-                    for class_table in grade_tab["tables"].values():
-                        for row in range(class_table.rowCount()):
-                            for col in range(class_table.columnCount()):
-                                cell = class_table.item(row, col)
-                                if cell.data(Qt.ItemDataRole.UserRole) == old_key:
-                                    cell.setText("")
-                                    cell.setBackground(QBrush(Qt.GlobalColor.transparent))
-                                    cell.setForeground(QBrush(Qt.GlobalColor.black))
-                                    cell.setFont(QFont())
-                                    cell.setData(Qt.ItemDataRole.UserRole, None)
-
-
-class TimetableCell(QTableWidgetItem):
-    def __init__(self):
-        super().__init__("")
-        self.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-
-class TimetableTable(QTableWidget):
-    def __init__(self, class_name, all_tables_ref, teachers):
-        super().__init__(8, 5)
-        self.class_name = class_name
-        self.all_tables_ref = all_tables_ref
-        self.teachers = teachers
+                with timetable_perf.timed("teacher_delete"), self.parent.history.transaction("Delete Teacher"):
+                    school.remove_teacher(teacher.id)
+                self.sync([teacher.id])
+
+
+class TeacherPalette:
+    """(background, font) per teacher ID, shared by every table and dropped when the teacher changes.
+
+    A load replaces the teachers without hooks, so it must ``clear`` the palette.
+    """
+
+    def __init__(self, school):
+        self.teachers = school.teachers
+        self.styles = {}
+        school.hooks.append(self.on_change)
+
+    def clear(self):
+        self.styles.clear()
+
+    def on_change(self, change):
+        if change[0] == "teacher":
+            self.styles.pop(change[1], None)
+
+    def style(self, teacher_id):
+        style = self.styles.get(teacher_id)
+        if style is None:
+            teacher = self.teachers.get(teacher_id)
+            if teacher is None:
+                return None
+            style = (QBrush(QColor(teacher.color)), QFont("Segoe UI", 11, QFont.Weight.Bold))
+            self.styles[teacher_id] = style
+        return style
+
+
+class TimetableModel(QAbstractTableModel):
+    """Read-only Qt view of one Timetable; cells are never copied into Qt objects."""
+
+    def __init__(self, timetable, parent=None):
+        super().__init__(parent)
+        self.timetable = timetable
+        self.school = timetable.school
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.timetable.rows
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.timetable.cols
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if role in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.UserRole, Qt.ItemDataRole.ToolTipRole):
+            code = self.timetable.get_id(index.row(), index.column())
+            teacher = self.school.teacher_of(code)
+            if role == Qt.ItemDataRole.DisplayRole:
+                return teacher.name if teacher else ""
+            if role == Qt.ItemDataRole.UserRole:
+                return teacher.id if teacher else None
+            if teacher is None:
+                return None
+            room = self.school.rooms.get(self.timetable.get_room(index.row(), index.column()))
+            tip = f"{teacher.name} ({self.school.lesson_of(code)[1]})"
+            return f"{tip} in {room.name}" if room else tip
+        if role == Qt.ItemDataRole.TextAlignmentRole:
+            return Qt.AlignmentFlag.AlignCenter
+        return None
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            return self.timetable.school.days[section]
+        return f"P{section+1}"
+
+    def refresh_cell(self, row, col):
+        index = self.index(row, col)
+        self.dataChanged.emit(index, index)
+
+
+class TimetableDelegate(QStyledItemDelegate):
+    def __init__(self, palette, parent=None):
+        super().__init__(parent)
+        self.palette = palette
+
+    def paint(self, painter, option, index):
+        style = self.palette.style(index.data(Qt.ItemDataRole.UserRole))
+        if style is None or option.state & QStyle.StateFlag.State_Selected:
+            super().paint(painter, option, index)
+            return
+        background, font = style
+        painter.save()
+        painter.fillRect(option.rect, background)
+        painter.setFont(font)
+        painter.setPen(Qt.GlobalColor.white)
+        painter.drawText(option.rect, Qt.AlignmentFlag.AlignCenter, index.data())
+        painter.restore()
+
+
+class TimetableTable(QTableView):
+    def __init__(self, timetable, delegate, history):
+        super().__init__()
+        self.class_name = timetable.class_name
+        self.timetable = timetable
+        self.school = timetable.school
+        self.history = history
+        self.setModel(TimetableModel(timetable, self))
+        self.setItemDelegate(delegate)
         self.setAcceptDrops(True)
-        self.setHorizontalHeaderLabels(['Mon', 'Tue', 'Wed', 'Thu', 'Fri'])
-        self.setVerticalHeaderLabels([f'P{i+1}' for i in range(8)])
-        self.init_table()
         self.setMinimumSize(QSize(480, 320))
-        self.cellDoubleClicked.connect(self.cell_double_clicked)
-        self.setStyleSheet("""
-            QTableWidget {
-                background-color: #1f1f1f;
-                gridline-color: #444;
-                font-family: "Segoe UI";
-                font-size: 12pt;
-                color: white;
-                border-radius: 8px;
-            }
-            QHeaderView::section {
-                background-color: #3a3a3a;
-                color: white;
-                padding: 4px;
-                border: none;
-            }
-            QTableWidget::item:selected {
-                background-color: #5a9bd8;
-                color: white;
-            }
-        """)
+        self.doubleClicked.connect(lambda index: self.cell_double_clicked(index.row(), index.column()))
 
-    def init_table(self):
-        for r in range(8):
-            for c in range(5):
-                cell = TimetableCell()
-                cell.setData(Qt.ItemDataRole.UserRole, None)
-                self.setItem(r, c, cell)
+    def refresh_cell(self, row, col):
+        self.model().refresh_cell(row, col)
 
     def dragEnterEvent(self, event):
         if event.mimeData().hasText():
@@ -226,73 +454,345 @@ class TimetableTable(QTableWidget):
         if event.mimeData().hasText():
             event.acceptProposedAction()
 
+    @timetable_perf.instrument("drop")
     def dropEvent(self, event):
-        key = event.mimeData().text()
-        if not key or '|' not in key:
+        # The drag carries a lesson code (teacher ID and subject), see TeacherList.startDrag.
+        text = event.mimeData().text()
+        code = int(text) if text.isdigit() else 0
+        if not code or not self.school.known_code(code):
             return
-        name, subject = key.split("|", 1)
+        teacher = self.school.teacher_of(code)
+        name = teacher.name
         idx = self.indexAt(event.position().toPoint())
         if idx.row() == -1 or idx.column() == -1:
             return
 
-        # Check conflicts in all tables in all grades
-        for grade_info in self.all_tables_ref.values():
-            for tab in grade_info["tables"].values():
-                cell = tab.item(idx.row(), idx.column())
-                if cell.text():
-                    existing_key = cell.data(Qt.ItemDataRole.UserRole)
-                    if existing_key:
-                        existing_name, _ = existing_key.split("|", 1)
-                        if existing_name == name:
-                            QMessageBox.warning(self, "Conflict", f"Teacher {name} is already assigned at this time slot in another class.")
-                            return
-
-        cell = self.item(idx.row(), idx.column())
-        teacher = self.teachers.get(key)
-        cell.setText(name if teacher else "")
-        if teacher:
-            cell.setBackground(QBrush(teacher.color))
-            cell.setForeground(QBrush(Qt.GlobalColor.white))
-            cell.setFont(QFont("Segoe UI", 11, QFont.Weight.Bold))
-        else:
-            cell.setBackground(QBrush(Qt.GlobalColor.transparent))
-            cell.setForeground(QBrush(Qt.GlobalColor.black))
-            cell.setFont(QFont())
-        cell.setData(Qt.ItemDataRole.UserRole, key)
+        # Check conflicts in all classes of the school
+        if self.school.is_booked(teacher.id, idx.row(), idx.column()):
+            QMessageBox.warning(self, "Conflict", f"Teacher {name} is already assigned at this time slot in another class.")
+            return
+        if self.school.is_unavailable(teacher.id, idx.row(), idx.column()):
+            QMessageBox.warning(self, "Unavailable", f"Teacher {name} is not available at this time slot.")
+            return
+        problem = self.school.limit_problem(self.timetable, idx.row(), idx.column(), code)
+        if problem:
+            QMessageBox.warning(self, "Limit Reached", problem)
+            return
+        # Subjects with rooms of their own (labs, gyms) take one that has a place left.
+        subject = self.school.lesson_of(code)[1]
+        room_id = None
+        if self.school.rooms_for(subject):
+            room_id = self.school.free_room(subject, idx.row(), idx.column(),
+                                            self.timetable.get_room(idx.row(), idx.column()))
+            if room_id is None:
+                QMessageBox.warning(self, "No Room", f"Every room for {subject} is in use at this time slot.")
+                return
+
+        with self.history.transaction("Drop Lesson"):
+            self.timetable.set_id(idx.row(), idx.column(), code)
+            if room_id is not None:
+                self.timetable.set_room(idx.row(), idx.column(), room_id)
         event.acceptProposedAction()
 
+    @timetable_perf.instrument("clear")
     def cell_double_clicked(self, row, col):
-        cell = self.item(row, col)
-        if cell.text():
-            cell.setText("")
-            cell.setBackground(QBrush(Qt.GlobalColor.transparent))
-            cell.setForeground(QBrush(Qt.GlobalColor.black))
-            cell.setFont(QFont())
-            cell.setData(Qt.ItemDataRole.UserRole, None)
+        if self.timetable.get_id(row, col):
+            with self.history.transaction("Clear Lesson"):
+                self.timetable.clear(row, col)
 
     def get_data(self):
-        return [[self.item(r, c).data(Qt.ItemDataRole.UserRole) or "" for c in range(5)] for r in range(8)]
+        return self.timetable.to_rows()
 
     def set_data(self, data):
-        for r in range(8):
-            for c in range(5):
-                key = data[r][c]
-                cell = self.item(r, c)
-                if key:
-                    name, subject = key.split("|", 1)
-                    teacher = self.teachers.get(key)
-                    if teacher:
-                        cell.setText(name)
-                        cell.setBackground(QBrush(teacher.color))
-                        cell.setForeground(QBrush(Qt.GlobalColor.white))
-                        cell.setFont(QFont("Segoe UI", 11, QFont.Weight.Bold))
-                        cell.setData(Qt.ItemDataRole.UserRole, key)
-                    else:
-                        cell.setText("")
-                        cell.setData(Qt.ItemDataRole.UserRole, None)
-                else:
-                    cell.setText("")
-                    cell.setData(Qt.ItemDataRole.UserRole, None)
+        self.timetable.load_rows(data)
+
+
+def class_sort_key(timetable):
+    grade = timetable.grade
+    return (not grade.isdigit(), int(grade) if grade.isdigit() else 0, grade, timetable.class_name)
+
+
+class OverviewModel(QAbstractListModel):
+    """One row per class of the school; a row changes whenever one of its cells does."""
+
+    def __init__(self, school, parent=None):
+        super().__init__(parent)
+        self.school = school
+        self.classes = []
+        self.rows = {}
+        self.reload_pending = False
+        school.listeners.append(self.on_cell_changed)
+        school.hooks.append(self.on_change)
+        self.reload()
+
+    def reload(self):
+        self.reload_pending = False
+        self.beginResetModel()
+        self.classes = sorted(self.school.timetables(), key=class_sort_key)
+        self.rows = {timetable: row for row, timetable in enumerate(self.classes)}
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.classes)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.UserRole:
+            return self.classes[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return self.classes[index.row()].class_name
+        return None
+
+    def on_cell_changed(self, timetable, row, col, old_id, new_id):
+        at = self.rows.get(timetable)
+        if at is not None:
+            index = self.index(at)
+            self.dataChanged.emit(index, index)
+
+    def on_change(self, change):
+        # A load adds classes one by one; reload once they are all in.
+        if change[0] == "class" and not self.reload_pending:
+            self.reload_pending = True
+            QTimer.singleShot(0, self.reload)
+
+
+class OverviewDelegate(QStyledItemDelegate):
+    """Paints a whole class week into its list item; only items in view are ever painted."""
+
+    CELL_W, CELL_H, TITLE_H, MARGIN = 64, 20, 24, 8
+
+    def __init__(self, palette, parent=None):
+        super().__init__(parent)
+        self.palette = palette
+        self.title_font = QFont("Segoe UI", 10, QFont.Weight.Bold)
+        self.cell_font = QFont("Segoe UI", 8)
+        self.cell_metrics = QFontMetrics(self.cell_font)
+        self.labels = {}
+
+    def block_size(self, timetable):
+        return QSize(self.CELL_W * timetable.cols + 2 * self.MARGIN,
+                     self.TITLE_H + self.CELL_H * timetable.rows + 2 * self.MARGIN)
+
+    def sizeHint(self, option, index):
+        return self.block_size(index.data(Qt.ItemDataRole.UserRole))
+
+    def paint(self, painter, option, index):
+        timetable = index.data(Qt.ItemDataRole.UserRole)
+        teacher_of = timetable.school.teacher_of
+        cols, rows = timetable.cols, timetable.rows
+        x0, y0 = option.rect.x() + self.MARGIN, option.rect.y() + self.MARGIN
+        painter.save()
+        painter.setPen(Qt.GlobalColor.white)
+        painter.setFont(self.title_font)
+        painter.drawText(QRect(x0, y0, self.CELL_W * cols, self.TITLE_H),
+                         Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter, timetable.class_name)
+        painter.setFont(self.cell_font)
+        y0 += self.TITLE_H
+        for r in range(rows):
+            for c in range(cols):
+                teacher = teacher_of(timetable.get_id(r, c))
+                if teacher is not None:
+                    rect = QRect(x0 + c * self.CELL_W, y0 + r * self.CELL_H, self.CELL_W, self.CELL_H)
+                    painter.fillRect(rect, self.palette.style(teacher.id)[0])
+                    painter.drawText(rect, Qt.AlignmentFlag.AlignCenter, self.label(teacher.name))
+        # Grid lines once per block rather than an outline per cell.
+        painter.setPen(QColor("#444444"))
+        for r in range(rows + 1):
+            painter.drawLine(x0, y0 + r * self.CELL_H, x0 + cols * self.CELL_W, y0 + r * self.CELL_H)
+        for c in range(cols + 1):
+            painter.drawLine(x0 + c * self.CELL_W, y0, x0 + c * self.CELL_W, y0 + rows * self.CELL_H)
+        painter.restore()
+
+    def label(self, name):
+        text = self.labels.get(name)
+        if text is None:
+            text = self.labels[name] = self.cell_metrics.elidedText(name, Qt.TextElideMode.ElideRight, self.CELL_W - 4)
+        return text
+
+
+class OverviewWindow(QDialog):
+    """Every class of the school on one scrollable surface, for spotting gaps at a glance."""
+
+    def __init__(self, school, palette, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("School Overview (double-click a class to open it)")
+        self.setStyleSheet("color: white; background-color: #1f1f1f; font-family: 'Segoe UI';")
+        self.resize(1200, 800)
+        self.model = OverviewModel(school, self)
+        self.delegate = OverviewDelegate(palette, self)
+
+        self.view = QListView()
+        self.view.setViewMode(QListView.ViewMode.IconMode)
+        self.view.setFlow(QListView.Flow.LeftToRight)
+        self.view.setWrapping(True)
+        self.view.setResizeMode(QListView.ResizeMode.Adjust)
+        self.view.setMovement(QListView.Movement.Static)
+        # Same-sized items let the view place them arithmetically instead of measuring each one.
+        self.view.setUniformItemSizes(True)
+        self.view.setSpacing(4)
+        self.view.setSelectionMode(QListView.SelectionMode.NoSelection)
+        self.view.setModel(self.model)
+        self.view.setItemDelegate(self.delegate)
+        self.view.doubleClicked.connect(self.open_class)
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.view)
+
+    def reload(self):
+        self.model.reload()
+
+    def open_class(self, index):
+        self.parent().show_class(index.data(Qt.ItemDataRole.UserRole))
+
+
+class TeacherWeekModel(QAbstractTableModel):
+    """One teacher's week, kept from the school's reverse index and patched per edit."""
+
+    def __init__(self, school, teacher_id, parent=None):
+        super().__init__(parent)
+        self.school = school
+        self.teacher_id = teacher_id
+        self.name = school.teachers[teacher_id].name
+        self.grid = school.teacher_week(teacher_id)
+        school.listeners.append(self.on_cell_changed)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.grid)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.school.days)
+
+    def cell_text(self, row, col):
+        lessons = self.grid[row][col]
+        subjects = {subject for _, subject in lessons}
+        if len(subjects) > 1:
+            return "\n".join(f"{class_name} ({subject})" for class_name, subject in lessons)
+        return ", ".join(class_name for class_name, _ in lessons)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole:
+            return self.cell_text(index.row(), index.column())
+        if role == Qt.ItemDataRole.BackgroundRole and len(self.grid[index.row()][index.column()]) > 1:
+            return QBrush(QColor("#c0392b"))
+        if role == Qt.ItemDataRole.TextAlignmentRole:
+            return Qt.AlignmentFlag.AlignCenter
+        return None
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            return self.school.days[section]
+        return f"P{section+1}"
+
+    def on_cell_changed(self, timetable, row, col, old_id, new_id):
+        school = self.school
+        tid = self.teacher_id
+        if (old_id and school.lesson_of(old_id)[0] == tid) or (new_id and school.lesson_of(new_id)[0] == tid):
+            # Only this teacher's lessons are walked, never the whole school.
+            self.grid = school.teacher_week(tid)
+            index = self.index(row, col)
+            self.dataChanged.emit(index, index)
+
+    def reload(self):
+        """Rebuild the grid after a load or a change of week shape, which no cell edit reports."""
+        self.beginResetModel()
+        teacher = self.school.teachers.get(self.teacher_id)
+        if teacher is not None:
+            self.name = teacher.name
+        self.grid = self.school.teacher_week(self.teacher_id)
+        self.endResetModel()
+
+    def close(self):
+        self.school.listeners.remove(self.on_cell_changed)
+
+    def to_html(self):
+        days = self.school.days
+        lines = [f"<h2>{escape(self.name)}</h2>",
+                 "<table border='1' cellspacing='0' cellpadding='6'>",
+                 "<tr><th></th>" + "".join(f"<th>{escape(day)}</th>" for day in days) + "</tr>"]
+        for row in range(len(self.grid)):
+            cells = "".join(f"<td align='center'>{escape(self.cell_text(row, col)).replace(chr(10), '<br>')}</td>"
+                            for col in range(len(days)))
+            lines.append(f"<tr><th>P{row+1}</th>{cells}</tr>")
+        lessons = sum(len(lessons) for grid_row in self.grid for lessons in grid_row)
+        lines.append(f"</table><p>{lessons} periods per week.</p>")
+        return "\n".join(lines)
+
+
+class TeacherWeekDialog(QDialog):
+    def __init__(self, school, teacher_id, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(f"Week of {school.teachers[teacher_id].name}")
+        self.setStyleSheet("color: white; background-color: #2c3e50; font-family: 'Segoe UI';")
+        self.resize(760, 420)
+        self.setAttribute(Qt.WidgetAttribute.WA_DeleteOnClose)
+        self.model = TeacherWeekModel(school, teacher_id, self)
+
+        layout = QVBoxLayout(self)
+        self.view = QTableView()
+        self.view.setModel(self.model)
+        self.view.setStyleSheet(TABLE_STYLE)
+        self.view.horizontalHeader().setSectionResizeMode(self.view.horizontalHeader().ResizeMode.Stretch)
+        self.view.verticalHeader().setSectionResizeMode(self.view.verticalHeader().ResizeMode.ResizeToContents)
+        layout.addWidget(self.view)
+
+        btn_layout = QHBoxLayout()
+        btn_layout.addStretch()
+        export_btn = QPushButton("Export...")
+        export_btn.setFixedSize(120, 36)
+        export_btn.clicked.connect(self.export)
+        btn_layout.addWidget(export_btn)
+        layout.addLayout(btn_layout)
+        self.finished.connect(lambda _: self.model.close())
+
+    def reload(self):
+        # After a load the ID may belong to someone else, or to nobody.
+        if self.model.teacher_id not in self.model.school.teachers:
+            self.close()
+            return
+        self.model.reload()
+        self.setWindowTitle(f"Week of {self.model.name}")
+
+    def export(self):
+        filename, selected_filter = QFileDialog.getSaveFileName(
+            self, "Export Teacher Week", f"{self.model.name}.pdf", "PDF (*.pdf);;HTML (*.html)")
+        if not filename:
+            return
+        html = self.model.to_html()
+        try:
+            if filename.lower().endswith(".html") or "HTML" in selected_filter:
+                with open(filename, "w", encoding="utf-8") as f:
+                    f.write(f"<html><body>{html}</body></html>")
+            else:
+                writer = QPdfWriter(filename)
+                document = QTextDocument()
+                document.setHtml(html)
+                document.print(writer)
+        except Exception as e:
+            QMessageBox.critical(self, "Export Error", str(e))
+
+
+# Set once on each grade page rather than parsed again for every table.
+TABLE_STYLE = """
+    QTableView {
+        background-color: #1f1f1f;
+        gridline-color: #444;
+        font-family: "Segoe UI";
+        font-size: 12pt;
+        color: white;
+        border-radius: 8px;
+    }
+    QHeaderView::section {
+        background-color: #3a3a3a;
+        color: white;
+        padding: 4px;
+        border: none;
+    }
+    QTableView::item:selected {
+        background-color: #5a9bd8;
+        color: white;
+    }
+"""
 
 
 def normalize_class_name(name):
@@ -320,14 +820,14 @@ from PyQt6.QtCore import Qt
 
 
 class AbsentTeacherDialog(QDialog):
-    def __init__(self, teachers, all_tables, parent=None):
+    def __init__(self, school, parent=None):
         super().__init__(parent)
         self.setWindowTitle("Absent Teacher Analysis")
         self.setStyleSheet("color: white; background-color: #2c3e50; font-family: 'Segoe UI';")
         self.setFixedSize(650, 470)
 
-        self.teachers = teachers
-        self.all_tables = all_tables
+        self.school = school
+        self.teachers = school.teachers
 
         layout = QVBoxLayout(self)
         layout.setSpacing(15)
@@ -354,7 +854,7 @@ class AbsentTeacherDialog(QDialog):
         input_row.addWidget(day_label)
 
         self.day_combo = QComboBox()
-        self.day_combo.addItems(["Any", "Mon", "Tue", "Wed", "Thu", "Fri"])
+        self.day_combo.addItems(["Any"] + school.days)
         self.day_combo.setFixedSize(120, 30)
         input_row.addWidget(self.day_combo)
 
@@ -383,6 +883,13 @@ class AbsentTeacherDialog(QDialog):
         self.analyze_btn.clicked.connect(self.analyze_absent_teacher)
         btn_layout.addWidget(self.analyze_btn)
 
+        self.plan_btn = QPushButton("Plan Cover")
+        self.plan_btn.setFixedSize(120, 36)
+        self.plan_btn.setStyleSheet(self._button_style("#27ae60", "#1e8449", "#196f3d"))
+        self.plan_btn.setToolTip("Balanced cover for one day; separate several absent teachers with commas.")
+        self.plan_btn.clicked.connect(self.plan_day_cover)
+        btn_layout.addWidget(self.plan_btn)
+
         self.clear_btn = QPushButton("Clear")
         self.clear_btn.setFixedSize(120, 36)
         self.clear_btn.setStyleSheet(self._button_style("#e67e22", "#d35400", "#b34700"))
@@ -425,57 +932,80 @@ class AbsentTeacherDialog(QDialog):
             QMessageBox.warning(self, "Input Error", "Please enter the absent teacher's name.")
             return
 
-        matched_key = None
-        subject = None
+        matched = self.school.teachers_named(name_input)
+        if not matched:
+            QMessageBox.warning(self, "Not Found", f"No teacher named '{name_input}' found.")
+            return
+        absent_ids = {teacher.id for teacher in matched}
+
+        with timetable_perf.timed("absent_analysis"):
+            result_lines = []
+            days = self.school.days
+            cols = range(len(days)) if selected_day == "Any" else [days.index(selected_day)]
+            # Per subject taught: teachers x days x periods, True where free; one mask for the whole week.
+            masks = {}
+
+            for teacher in matched:
+                for timetable, r, c in self.school.slots_of(teacher.id, cols):
+                    subject = timetable.get(r, c)[1]
+                    if len(teacher.subjects) > 1:
+                        result_lines.append(f"📌 {timetable.class_name} - {days[c]} P{r+1} ({subject}):")
+                    else:
+                        result_lines.append(f"📌 {timetable.class_name} - {days[c]} P{r+1}:")
 
-        for key, teacher in self.teachers.items():
-            if teacher.name == name_input:
-                matched_key = key
-                subject = teacher.subject
-                break
+                    if subject not in masks:
+                        masks[subject] = self.school.availability(subject)
+                    ids, free = masks[subject]
+                    replacements = [self.teachers[ids[i]].name for i in np.flatnonzero(free[:, c, r])
+                                    if ids[i] not in absent_ids]
 
-        if not matched_key:
-            QMessageBox.warning(self, "Not Found", f"No teacher named '{name_input}' found.")
+                    if replacements:
+                        result_lines.append("   🔁 Replacements: " + ", ".join(replacements))
+                    else:
+                        result_lines.append("   ⚠️ No replacements available.")
+
+            if not result_lines:
+                self.result_box.setText("✅ No assigned periods found for this teacher on selected day.")
+            else:
+                self.result_box.setText("\n".join(result_lines))
+
+    def plan_day_cover(self):
+        names = [name.strip().title() for name in self.name_input.text().split(",") if name.strip()]
+        selected_day = self.day_combo.currentText()
+
+        if not names:
+            QMessageBox.warning(self, "Input Error", "Please enter the absent teachers' names.")
+            return
+        if selected_day == "Any":
+            QMessageBox.warning(self, "Input Error", "Please select the day of the absence.")
+            return
+        missing = [name for name in names if not self.school.teachers_named(name)]
+        if missing:
+            QMessageBox.warning(self, "Not Found", f"No teacher named {', '.join(missing)} found.")
+            return
+        absent_ids = [teacher.id for name in names for teacher in self.school.teachers_named(name)]
+
+        with timetable_perf.timed("cover_plan"):
+            covers = plan_cover(self.school, absent_ids, self.school.days.index(selected_day))
+        if not covers:
+            self.result_box.setText("✅ No assigned periods found for these teachers on selected day.")
             return
 
         result_lines = []
-        day_map = ["Mon", "Tue", "Wed", "Thu", "Fri"]
-
-        for grade, data in self.all_tables.items():
-            for class_name, table in data["tables"].items():
-                for r in range(8):
-                    for c in range(5):
-                        if selected_day != "Any" and day_map[c] != selected_day:
-                            continue
-                        cell = table.item(r, c)
-                        if cell and cell.data(Qt.ItemDataRole.UserRole) == matched_key:
-                            result_lines.append(f"📌 {class_name} - {day_map[c]} P{r+1}:")
-
-                            replacements = []
-                            for alt_key, alt_teacher in self.teachers.items():
-                                if alt_key == matched_key or alt_teacher.subject != subject:
-                                    continue
-                                busy = False
-                                for g in self.all_tables.values():
-                                    for t in g["tables"].values():
-                                        other_cell = t.item(r, c)
-                                        if other_cell and other_cell.data(Qt.ItemDataRole.UserRole) == alt_key:
-                                            busy = True
-                                            break
-                                    if busy:
-                                        break
-                                if not busy:
-                                    replacements.append(alt_teacher.name)
-
-                            if replacements:
-                                result_lines.append("   🔁 Replacements: " + ", ".join(replacements))
-                            else:
-                                result_lines.append("   ⚠️ No replacements available.")
-
-        if not result_lines:
-            self.result_box.setText("✅ No assigned periods found for this teacher on selected day.")
-        else:
-            self.result_box.setText("\n".join(result_lines))
+        for cover in covers:
+            absent = self.teachers[cover.absent_id].name
+            line = f"📌 {cover.timetable.class_name} - {selected_day} P{cover.row+1} ({absent}, {cover.subject}): "
+            if cover.substitute_id is None:
+                line += "⚠️ No replacement available."
+            else:
+                substitute = self.teachers[cover.substitute_id]
+                line += f"🔁 {substitute.name}"
+                if cover.cross_subject:
+                    line += f" ({', '.join(substitute.subjects)}, cross-subject)"
+            result_lines.append(line)
+        covered = sum(1 for cover in covers if cover.substitute_id is not None)
+        result_lines.append(f"\n{covered} of {len(covers)} lessons covered.")
+        self.result_box.setText("\n".join(result_lines))
 
     def clear_data(self):
         self.name_input.clear()
@@ -488,14 +1018,14 @@ class AbsentTeacherDialog(QDialog):
 
 
 class FilterDialog(QDialog):
-    def __init__(self, teachers, all_tables, parent=None):
+    def __init__(self, school, parent=None):
         super().__init__(parent)
         self.setWindowTitle("Filter Teachers")
         self.setFixedSize(420, 580)
         self.setStyleSheet("color: white; background-color: #2c3e50; font-family: 'Segoe UI';")
 
-        self.teachers = teachers
-        self.all_tables = all_tables
+        self.school = school
+        self.teachers = school.teachers
 
         layout = QVBoxLayout(self)
         layout.setContentsMargins(20, 20, 20, 20)
@@ -518,7 +1048,7 @@ class FilterDialog(QDialog):
 
         self.subject_combo = QComboBox()
         self.subject_combo.addItem("Any")
-        subjects = sorted(set(t.subject for t in self.teachers.values()))
+        subjects = sorted({subject for t in self.teachers.values() for subject in t.subjects})
         self.subject_combo.addItems(subjects)
         self.subject_combo.setFixedSize(170, 30)
         self.subject_combo.setStyleSheet(self._combo_style())
@@ -530,7 +1060,7 @@ class FilterDialog(QDialog):
         form_layout.addWidget(day_label, 1, 0)
 
         self.day_combo = QComboBox()
-        self.day_combo.addItems(["Any", "Mon", "Tue", "Wed", "Thu", "Fri"])
+        self.day_combo.addItems(["Any"] + school.days)
         self.day_combo.setFixedSize(170, 30)
         self.day_combo.setStyleSheet(self._combo_style())
         form_layout.addWidget(self.day_combo, 1, 1)
@@ -541,7 +1071,7 @@ class FilterDialog(QDialog):
         form_layout.addWidget(period_label, 2, 0)
 
         self.period_combo = QComboBox()
-        self.period_combo.addItems(["Any"] + [f"P{i}" for i in range(1, 9)])
+        self.period_combo.addItems(["Any"] + [f"P{i}" for i in range(1, school.periods + 1)])
         self.period_combo.setFixedSize(170, 30)
         self.period_combo.setStyleSheet(self._combo_style())
         form_layout.addWidget(self.period_combo, 2, 1)
@@ -627,14 +1157,14 @@ class FilterDialog(QDialog):
         day = self.day_combo.currentText()
         period = self.period_combo.currentText()
 
-        day_to_col = {"Mon": 0, "Tue": 1, "Wed": 2, "Thu": 3, "Fri": 4}
-        cols = range(5) if day == "Any" else [day_to_col.get(day, -1)]
+        day_to_col = {d: i for i, d in enumerate(self.school.days)}
+        cols = range(len(self.school.days)) if day == "Any" else [day_to_col.get(day, -1)]
         if -1 in cols:
             QMessageBox.warning(self, "Error", "Invalid day selected.")
             return
 
         if period == "Any":
-            rows = range(8)
+            rows = range(self.school.periods)
         else:
             try:
                 rows = [int(period[1:]) - 1]
@@ -642,28 +1172,25 @@ class FilterDialog(QDialog):
                 QMessageBox.warning(self, "Error", "Invalid period selected.")
                 return
 
-        busy_keys = set()
-        for grade_data in self.all_tables.values():
-            for table in grade_data["tables"].values():
-                for row in rows:
-                    for col in cols:
-                        cell = table.item(row, col)
-                        if cell:
-                            key = cell.data(Qt.ItemDataRole.UserRole)
-                            if key:
-                                busy_keys.add(key)
+        with timetable_perf.timed("filter_dialog"):
+            free_ids = self.school.free_teachers(rows, cols, None if subject == "Any" else subject)
+            free_rooms = self.school.free_rooms(rows, cols, None if subject == "Any" else subject)
+
+        if subject != "Any" and self.school.rooms_for(subject) and not free_rooms:
+            self.result_box.setText(f"No {subject} room is free for selected filters.")
+            return
 
         filtered_teachers = []
-        for key, teacher in self.teachers.items():
-            if subject != "Any" and teacher.subject != subject:
-                continue
-            if key in busy_keys:
-                continue
-            filtered_teachers.append(f"{teacher.name} ({teacher.subject})")
+        for teacher_id in free_ids:
+            teacher = self.teachers[teacher_id]
+            filtered_teachers.append(f"{teacher.name} ({', '.join(teacher.subjects)})")
 
         if not filtered_teachers:
             self.result_box.setText("No available teachers found for selected filters.")
         else:
+            if free_rooms:
+                rooms = self.school.rooms
+                filtered_teachers.append("\nFree rooms: " + ", ".join(rooms[room_id].name for room_id in free_rooms))
             self.result_box.setText("\n".join(filtered_teachers))
 
     def clear_filters(self):
@@ -680,6 +1207,484 @@ class FilterDialog(QDialog):
 
 
 
+class GenerateDialog(QDialog):
+    def __init__(self, school, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Generate Timetable")
+        self.resize(820, 620)
+        self.setStyleSheet("color: white; background-color: #2c3e50; font-family: 'Segoe UI';")
+
+        self.school = school
+        self.class_names = school.class_names()
+        self.subjects = sorted({subject for t in school.teachers.values() for subject in t.subjects})
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(20, 20, 20, 20)
+        layout.setSpacing(15)
+
+        hint = QLabel("Periods per week for each class and subject:")
+        hint.setStyleSheet("font-size: 10pt; font-weight: bold;")
+        layout.addWidget(hint)
+
+        # Quota grid: one row per class, one column per subject
+        self.quota_table = QTableWidget(len(self.class_names), len(self.subjects))
+        self.quota_table.setHorizontalHeaderLabels(self.subjects)
+        self.quota_table.setVerticalHeaderLabels(self.class_names)
+        self.quota_table.setStyleSheet("""
+            QTableWidget {
+                background-color: #34495e;
+                gridline-color: #555;
+                font-size: 10pt;
+            }
+            QHeaderView::section {
+                background-color: #3a3a3a;
+                color: white;
+                padding: 4px;
+                border: none;
+            }
+        """)
+        for r, class_name in enumerate(self.class_names):
+            quota = school.subject_quotas.get(class_name, {})
+            for c, subject in enumerate(self.subjects):
+                item = QTableWidgetItem(str(quota.get(subject, 0)))
+                item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
+                self.quota_table.setItem(r, c, item)
+        layout.addWidget(self.quota_table)
+
+        options_row = QHBoxLayout()
+        self.keep_check = QCheckBox("Keep existing assignments")
+        self.keep_check.setChecked(True)
+        options_row.addWidget(self.keep_check)
+        options_row.addStretch()
+
+        # Restarts > 1 run seeded searches in parallel and keep the best week
+        restarts_label = QLabel("Restarts:")
+        options_row.addWidget(restarts_label)
+        self.restarts_spin = QSpinBox()
+        self.restarts_spin.setRange(1, 64)
+        self.restarts_spin.setValue(min(8, os.cpu_count() or 1))
+        options_row.addWidget(self.restarts_spin)
+        layout.addLayout(options_row)
+
+        self.run = None
+        self.run_problem = None
+        self.run_command = None
+        self.poll_timer = QTimer(self)
+        self.poll_timer.setInterval(100)
+        self.poll_timer.timeout.connect(self.poll_run)
+
+        self.result_box = QTextEdit()
+        self.result_box.setReadOnly(True)
+        self.result_box.setFixedHeight(140)
+        self.result_box.setStyleSheet("""
+            background-color: #34495e;
+            border-radius: 6px;
+            font-size: 10pt;
+            padding: 6px;
+        """)
+        layout.addWidget(self.result_box)
+
+        btn_layout = QHBoxLayout()
+        btn_layout.setAlignment(Qt.AlignmentFlag.AlignCenter)
+
+        self.copy_btn = QPushButton("Copy Row to Grade")
+        self.copy_btn.setStyleSheet(self._button_style("#8e44ad", "#6c3483", "#5b2c6f"))
+        self.copy_btn.clicked.connect(self.copy_row_to_grade)
+        btn_layout.addWidget(self.copy_btn)
+
+        self.generate_btn = QPushButton("Generate")
+        self.generate_btn.setStyleSheet(self._button_style("#27ae60", "#1e8449", "#196f3d"))
+        self.generate_btn.clicked.connect(self.generate)
+        btn_layout.addWidget(self.generate_btn)
+
+        self.cancel_btn = QPushButton("Cancel Run")
+        self.cancel_btn.setStyleSheet(self._button_style("#e67e22", "#d35400", "#b34700"))
+        self.cancel_btn.clicked.connect(self.cancel_run)
+        self.cancel_btn.setEnabled(False)
+        btn_layout.addWidget(self.cancel_btn)
+
+        self.close_btn = QPushButton("Close")
+        self.close_btn.setStyleSheet(self._button_style("#c0392b", "#e74c3c", "#922b21"))
+        self.close_btn.clicked.connect(self.accept)
+        btn_layout.addWidget(self.close_btn)
+
+        layout.addLayout(btn_layout)
+
+    def _button_style(self, bg_color, hover_color, pressed_color):
+        return f"""
+            QPushButton {{
+                font-size: 10pt;
+                font-weight: bold;
+                padding: 6px 16px;
+                background-color: {bg_color};
+                color: white;
+                border-radius: 5px;
+            }}
+            QPushButton:hover {{
+                background-color: {hover_color};
+            }}
+            QPushButton:pressed {{
+                background-color: {pressed_color};
+            }}
+        """
+
+    def copy_row_to_grade(self):
+        row = self.quota_table.currentRow()
+        if row < 0:
+            QMessageBox.warning(self, "No Class Selected", "Select a class row to copy first.")
+            return
+        grade = self.school.timetable(self.class_names[row]).grade
+        values = [self.quota_table.item(row, c).text() for c in range(len(self.subjects))]
+        for r, class_name in enumerate(self.class_names):
+            if self.school.timetable(class_name).grade == grade:
+                for c, value in enumerate(values):
+                    self.quota_table.item(r, c).setText(value)
+
+    def read_quotas(self):
+        quotas = {}
+        for r, class_name in enumerate(self.class_names):
+            quota = {}
+            for c, subject in enumerate(self.subjects):
+                text = self.quota_table.item(r, c).text().strip() or "0"
+                if not text.isdigit():
+                    QMessageBox.warning(self, "Input Error", f"{class_name} / {subject}: '{text}' is not a number of periods.")
+                    return None
+                if int(text):
+                    quota[subject] = int(text)
+            quotas[class_name] = quota
+        return quotas
+
+    def generate(self):
+        quotas = self.read_quotas()
+        if quotas is None:
+            return
+        # Recorded like any edit; the lessons applied when the run ends join this step.
+        with self.parent().history.transaction("Generate") as self.run_command:
+            for class_name, quota in quotas.items():
+                self.school.set_quota(class_name, quota or None)
+        problem = snapshot(self.school, self.keep_check.isChecked())
+        problems = check(problem)
+        if problems:
+            self.result_box.setText("⚠️ Quotas cannot be met:\n" + "\n".join(problems))
+            return
+        restarts = self.restarts_spin.value()
+        # Even a single run goes to a worker process, so the window stays responsive and cancellable.
+        self.run = RestartRun(problem, restarts)
+        self.run_problem = problem
+        self.generate_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(True)
+        self.result_box.setText(f"⏳ Running {restarts} restarts..." if restarts > 1 else "⏳ Generating...")
+        self.poll_timer.start()
+
+    def poll_run(self):
+        run = self.run
+        if not run.poll():
+            if run.restarts > 1:
+                self.result_box.setText(f"⏳ Running restarts: {run.finished}/{run.restarts} done...")
+            return
+        self.finish_run()
+        if run.best is not None:
+            self.show_solution(self.run_problem, run.best)
+            if run.restarts > 1:
+                self.result_box.append(f"Best of {run.restarts} restarts (seed {run.best.seed}).")
+        elif run.failure is not None:
+            self.show_solution(self.run_problem, run.failure)
+        else:
+            self.result_box.setText("⚠️ No restart produced a timetable.")
+
+    def cancel_run(self):
+        if self.run is None:
+            return
+        self.run.cancel()
+        self.finish_run()
+        self.result_box.setText("Run cancelled; the timetable was not changed.")
+
+    def finish_run(self):
+        self.poll_timer.stop()
+        self.run = None
+        self.generate_btn.setEnabled(True)
+        self.cancel_btn.setEnabled(False)
+
+    def done(self, result):
+        self.cancel_run()
+        super().done(result)
+
+    def show_solution(self, problem, solution):
+        if solution.problems:
+            self.result_box.setText("⚠️ Quotas cannot be met:\n" + "\n".join(solution.problems))
+            return
+        with timetable_perf.timed("apply_solution"), self.parent().history.transaction("Generate", self.run_command):
+            apply_solution(self.school, problem, solution)
+        placed = sum(1 for c, row in enumerate(solution.grid) for slot, t in enumerate(row)
+                     if t != FREE and problem.fixed[c][slot] == FREE)
+        lines = [f"✅ Placed {placed} lessons across {len(problem.classes)} classes."]
+        if solution.unplaced:
+            lines.append(f"⚠️ {len(solution.unplaced)} lessons could not be placed without a clash:")
+            for c, t in solution.unplaced:
+                lines.append(f"   {problem.classes[c][1]}: {problem.teacher_label(t)}")
+        roomless = len(self.school.roomless_lessons())
+        if roomless:
+            lines.append(f"⚠️ {roomless} lessons are without a room; see Schedule Health.")
+        self.result_box.setText("\n".join(lines))
+
+
+class WeekDialog(QDialog):
+    def __init__(self, school, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Week Settings")
+        layout = QFormLayout(self)
+
+        self.days_spin = QSpinBox()
+        self.days_spin.setRange(1, len(WEEKDAYS))
+        self.days_spin.setValue(len(school.days))
+        self.periods_spin = QSpinBox()
+        self.periods_spin.setRange(1, 16)
+        self.periods_spin.setValue(school.periods)
+
+        layout.addRow("Days per week:", self.days_spin)
+        layout.addRow("Periods per day:", self.periods_spin)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+
+
+class RoomsDialog(QDialog):
+    """Labs, gyms and other shared rooms: one row each, with the subjects taught there."""
+
+    def __init__(self, school, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Rooms")
+        self.resize(560, 360)
+        layout = QVBoxLayout(self)
+
+        hint = QLabel("Lessons of a room's subjects are booked into it on drop. Capacity is classes at once.")
+        hint.setWordWrap(True)
+        layout.addWidget(hint)
+
+        self.table = QTableWidget(0, 3)
+        self.table.setHorizontalHeaderLabels(["Name", "Subjects (comma-separated)", "Capacity"])
+        self.table.horizontalHeader().setSectionResizeMode(1, self.table.horizontalHeader().ResizeMode.Stretch)
+        for room in school.rooms.values():
+            self.add_row(room)
+        layout.addWidget(self.table)
+
+        row_buttons = QHBoxLayout()
+        add_btn = QPushButton("Add Room")
+        add_btn.clicked.connect(lambda: self.add_row())
+        remove_btn = QPushButton("Remove Room")
+        remove_btn.clicked.connect(self.remove_row)
+        row_buttons.addWidget(add_btn)
+        row_buttons.addWidget(remove_btn)
+        row_buttons.addStretch()
+        layout.addLayout(row_buttons)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+
+    def add_row(self, room=None):
+        row = self.table.rowCount()
+        self.table.insertRow(row)
+        name = QTableWidgetItem(room.name if room else "")
+        name.setData(Qt.ItemDataRole.UserRole, room.id if room else None)
+        self.table.setItem(row, 0, name)
+        self.table.setItem(row, 1, QTableWidgetItem(", ".join(room.subjects) if room else ""))
+        capacity = QSpinBox()
+        capacity.setRange(1, 50)
+        capacity.setValue(room.capacity if room else 1)
+        self.table.setCellWidget(row, 2, capacity)
+        if room is None:
+            self.table.editItem(name)
+
+    def remove_row(self):
+        row = self.table.currentRow()
+        if row >= 0:
+            self.table.removeRow(row)
+
+    def rooms(self):
+        """Room per row with a name, carrying its ID when it already existed."""
+        rooms = []
+        for row in range(self.table.rowCount()):
+            name = self.table.item(row, 0).text().strip()
+            if name:
+                rooms.append(Room(name, parse_subjects(self.table.item(row, 1).text()),
+                                  self.table.cellWidget(row, 2).value(),
+                                  self.table.item(row, 0).data(Qt.ItemDataRole.UserRole)))
+        return rooms
+
+
+class HealthPanel(QDialog):
+    """Non-modal dashboard; redraws from the running counters only when they changed."""
+
+    def __init__(self, health, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Schedule Health")
+        self.setStyleSheet("color: white; background-color: #2c3e50; font-family: 'Segoe UI';")
+        self.resize(560, 640)
+        self.health = health
+        self.shown_version = None
+
+        layout = QVBoxLayout(self)
+        self.summary_label = QLabel()
+        self.summary_label.setStyleSheet("font-size: 11pt; font-weight: bold;")
+        layout.addWidget(self.summary_label)
+        self.report_box = QTextEdit()
+        self.report_box.setReadOnly(True)
+        self.report_box.setStyleSheet("""
+            background-color: #34495e;
+            border-radius: 6px;
+            font-size: 10pt;
+            padding: 8px;
+        """)
+        layout.addWidget(self.report_box)
+
+        # Edits only bump a version number; drawing happens at most a few times a second.
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setInterval(300)
+        self.refresh_timer.timeout.connect(self.refresh)
+        self.refresh_timer.start()
+        self.refresh()
+
+    def refresh(self):
+        health = self.health
+        if health.version == self.shown_version or (not self.isVisible() and self.shown_version is not None):
+            return
+        self.shown_version = health.version
+        days = health.school.days
+        teachers = health.school.teachers
+
+        def name(teacher_id):
+            teacher = teachers.get(teacher_id)
+            return teacher.name if teacher is not None else f"#{teacher_id}"
+
+        clashes = health.double_bookings()
+        loads = health.loads()
+        mismatches = health.quota_mismatches()
+        room_clashes = health.room_clashes()
+        gaps = sum(row[2] for row in loads.values())
+        self.summary_label.setText(f"{'⚠️' if clashes or room_clashes else '✅'} {len(clashes)} double-bookings · "
+                                   f"{len(room_clashes)} room clashes · "
+                                   f"{len(mismatches)} quota mismatches · {gaps} idle gaps")
+
+        lines = ["Double-bookings:"]
+        for teacher_id, row, col, classes in clashes:
+            lines.append(f"   ⚠️ {name(teacher_id)} - {days[col]} P{row+1}: {', '.join(classes)}")
+        if not clashes:
+            lines.append("   ✅ None")
+        lines.append("")
+        lines.append("Subject periods vs. quotas:")
+        for class_name, subject, have, want in mismatches:
+            lines.append(f"   {class_name} {subject}: {have} of {want}")
+        if not mismatches:
+            lines.append("   ✅ All classes match their quotas")
+        lines.append("")
+        breaches = health.limit_breaches()
+        lines.append("Teachers over their load limits:")
+        for teacher_id, what, have, limit in breaches:
+            lines.append(f"   ⚠️ {name(teacher_id)} ({what}): {have} periods, limit {limit}")
+        if not breaches:
+            lines.append("   ✅ None")
+        lines.append("")
+        unavailable = health.unavailable_lessons()
+        lines.append("Lessons when the teacher is unavailable:")
+        for teacher_id, row, col in unavailable:
+            lines.append(f"   ⚠️ {name(teacher_id)} - {days[col]} P{row+1}")
+        if not unavailable:
+            lines.append("   ✅ None")
+        lines.append("")
+        rooms = health.school.rooms
+        lines.append("Rooms holding more classes than they fit:")
+        for room_id, row, col, classes in room_clashes:
+            lines.append(f"   ⚠️ {rooms[room_id].name} - {days[col]} P{row+1}: {', '.join(classes)}")
+        if not room_clashes:
+            lines.append("   ✅ None")
+        roomless = health.roomless_lessons()
+        if roomless:
+            lines.append("Lessons still without a room:")
+            for class_name, row, col, subject in roomless:
+                lines.append(f"   ⚠️ {class_name} {subject} - {days[col]} P{row+1}")
+        lines.append("")
+        lines.append("Teacher load (week: " + " / ".join(days) + ", idle gaps):")
+        for teacher_id, (week, per_day, idle) in loads.items():
+            lines.append(f"   {name(teacher_id)}: {week} ({' / '.join(map(str, per_day))}), {idle} gaps")
+        self.report_box.setPlainText("\n".join(lines))
+
+
+class StatsPanel(QDialog):
+    """Timing totals per operation and the recent slow ones (see timetable_perf)."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Performance Stats")
+        self.setStyleSheet("color: white; background-color: #2c3e50; font-family: 'Segoe UI';")
+        self.resize(620, 560)
+        recorder = timetable_perf.recorder
+
+        layout = QVBoxLayout(self)
+        controls = QHBoxLayout()
+        self.enabled_check = QCheckBox("Record timings")
+        self.enabled_check.setChecked(recorder.enabled)
+        self.enabled_check.toggled.connect(self.set_enabled)
+        controls.addWidget(self.enabled_check)
+        controls.addStretch()
+        controls.addWidget(QLabel("Log operations slower than (ms):"))
+        self.threshold_spin = QSpinBox()
+        self.threshold_spin.setRange(0, 60000)
+        self.threshold_spin.setValue(int(recorder.threshold * 1000))
+        self.threshold_spin.valueChanged.connect(self.set_threshold)
+        controls.addWidget(self.threshold_spin)
+        layout.addLayout(controls)
+
+        self.stats_table = QTableWidget(0, 4)
+        self.stats_table.setHorizontalHeaderLabels(["Operation", "Calls", "Mean (ms)", "Slowest (ms)"])
+        self.stats_table.horizontalHeader().setSectionResizeMode(self.stats_table.horizontalHeader().ResizeMode.Stretch)
+        self.stats_table.setStyleSheet(TABLE_STYLE)
+        layout.addWidget(self.stats_table)
+
+        layout.addWidget(QLabel(f"Slow operations (also written to {recorder.log_path}):"))
+        self.recent_box = QTextEdit()
+        self.recent_box.setReadOnly(True)
+        self.recent_box.setStyleSheet("background-color: #34495e; border-radius: 6px; font-size: 9pt;")
+        layout.addWidget(self.recent_box)
+
+        reset_btn = QPushButton("Reset")
+        reset_btn.clicked.connect(self.reset)
+        layout.addWidget(reset_btn, alignment=Qt.AlignmentFlag.AlignRight)
+
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setInterval(1000)
+        self.refresh_timer.timeout.connect(self.refresh)
+        self.refresh_timer.start()
+        self.refresh()
+
+    def set_enabled(self, enabled):
+        timetable_perf.recorder.enabled = enabled
+
+    def set_threshold(self, ms):
+        timetable_perf.recorder.threshold = ms / 1000
+
+    def reset(self):
+        timetable_perf.recorder.reset()
+        self.refresh()
+
+    def refresh(self):
+        if not self.isVisible():
+            return
+        recorder = timetable_perf.recorder
+        rows = sorted(recorder.stats.items(), key=lambda item: -item[1][1])
+        self.stats_table.setRowCount(len(rows))
+        for r, (name, (calls, total, slowest)) in enumerate(rows):
+            for c, text in enumerate((name, str(calls), f"{total / calls * 1000:.2f}", f"{slowest * 1000:.2f}")):
+                self.stats_table.setItem(r, c, QTableWidgetItem(text))
+        self.recent_box.setPlainText("\n".join(
+            f"{entry['time']}  {entry['op']}: {entry['seconds'] * 1000:.1f} ms, {entry['cells']} cells"
+            + (f", {entry['classes']} classes / {entry['teachers']} teachers" if "classes" in entry else "")
+            for entry in reversed(recorder.recent)))
+
+
 class ScrollableGradeWidget(QWidget):
     def __init__(self):
         super().__init__()
@@ -687,6 +1692,7 @@ class ScrollableGradeWidget(QWidget):
         self.grid_layout.setSpacing(15)
         self.grid_layout.setContentsMargins(10, 10, 10, 10)
         self.setLayout(self.grid_layout)
+        self.setStyleSheet(TABLE_STYLE)
 
     def add_class_widget(self, widget):
         count = self.grid_layout.count()
@@ -696,6 +1702,9 @@ class ScrollableGradeWidget(QWidget):
 
 
 class MainWindow(QWidget):
+    # (file name, exception or None), emitted from the autosave thread once a save is written.
+    save_finished = pyqtSignal(str, object, float)
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("SmartSched(v1.5)")
@@ -703,7 +1712,28 @@ class MainWindow(QWidget):
         self.resize(1400, 820)
         self.setStyleSheet("background-color: #222222; color: white; font-family: 'Segoe UI';")
 
-        self.teachers = {}
+        self.school = School()
+        self.school.listeners.append(self.on_cell_changed)
+        self.history = History(self.school)
+        self.history.replayed.append(self.on_history_replayed)
+        self.health = Health(self.school)
+        self.teacher_index = TeacherIndex(self.school)
+        self.palette = TeacherPalette(self.school)
+        self.delegate = TimetableDelegate(self.palette, self)
+        self.overview = None
+        self.week_dialogs = set()
+        self.stats_panel = None
+        timetable_perf.recorder.school = self.school
+        self.health_panel = None
+        # Unsaved edits are journaled every few seconds for crash recovery.
+        self.autosave = Autosave(self.school)
+        self.autosave_timer = QTimer(self)
+        self.autosave_timer.setInterval(3000)
+        self.autosave_timer.timeout.connect(self.autosave_tick)
+        self.autosave_timer.start()
+        self.save_finished.connect(self.on_save_finished)
+        self.last_load_seconds = None
+        self.teachers = self.school.teachers
         self.teacher_list = TeacherList(self.teachers, self)
         self.all_tables = {}
 
@@ -715,10 +1745,17 @@ class MainWindow(QWidget):
         self.teacher_name_input.setMaximumWidth(400)
 
         self.teacher_subject_input = QLineEdit()
-        self.teacher_subject_input.setPlaceholderText("Subject")
+        self.teacher_subject_input.setPlaceholderText("Subjects (comma-separated)")
         self.teacher_subject_input.setFixedHeight(40)
         self.teacher_subject_input.setMaximumWidth(400)
 
+        # Filters the list on every keystroke through the prebuilt name/subject index.
+        self.teacher_search = QLineEdit()
+        self.teacher_search.setPlaceholderText("Search Teachers or Subjects")
+        self.teacher_search.setClearButtonEnabled(True)
+        self.teacher_search.setFixedHeight(32)
+        self.teacher_search.textChanged.connect(self.teacher_list.search)
+
         self.color_btn = QPushButton("Pick Subject Color")
         self.color_btn.setFixedSize(310, 30)   # fixed size permanently set
         self.color_btn.setStyleSheet("""
@@ -813,8 +1850,117 @@ class MainWindow(QWidget):
         self.delete_class_btn.clicked.connect(self.delete_class)
         self.delete_class_btn.setMaximumWidth(100)
 
+        self.generate_btn = QPushButton("Generate Timetable")
+        self.generate_btn.setFixedWidth(310)
+        self.generate_btn.setStyleSheet("""
+        QPushButton {
+            background-color: #27ae60;
+            color: white;
+            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+            font-weight: bold;
+            font-size: 9pt;
+            padding: 8px 16px;
+            border-radius: 5px;
+        }
+        QPushButton:hover {
+            background-color: #1e8449;
+        }
+        """)
+        self.generate_btn.clicked.connect(self.show_generate_dialog)
+
+        self.week_btn = QPushButton("Week Settings")
+        self.week_btn.setFixedWidth(310)
+        self.week_btn.setStyleSheet("""
+        QPushButton {
+            background-color: #2980b9;
+            color: white;
+            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+            font-weight: bold;
+            font-size: 9pt;
+            padding: 8px 16px;
+            border-radius: 5px;
+        }
+        QPushButton:hover {
+            background-color: #1c5980;
+        }
+        """)
+        self.week_btn.clicked.connect(self.show_week_dialog)
+
+        self.health_btn = QPushButton("Schedule Health")
+        self.health_btn.setFixedWidth(310)
+        self.health_btn.setStyleSheet("""
+        QPushButton {
+            background-color: #8e44ad;
+            color: white;
+            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+            font-weight: bold;
+            font-size: 9pt;
+            padding: 8px 16px;
+            border-radius: 5px;
+        }
+        QPushButton:hover {
+            background-color: #6c3483;
+        }
+        """)
+        self.health_btn.clicked.connect(self.show_health_panel)
+
+        self.overview_btn = QPushButton("School Overview")
+        self.overview_btn.setFixedWidth(310)
+        self.overview_btn.setStyleSheet("""
+        QPushButton {
+            background-color: #2980b9;
+            color: white;
+            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+            font-weight: bold;
+            font-size: 9pt;
+            padding: 8px 16px;
+            border-radius: 5px;
+        }
+        QPushButton:hover {
+            background-color: #1c5980;
+        }
+        """)
+        self.overview_btn.clicked.connect(self.show_overview)
+
+        self.rooms_btn = QPushButton("Rooms")
+        self.rooms_btn.setFixedWidth(310)
+        self.rooms_btn.setStyleSheet("""
+        QPushButton {
+            background-color: #2980b9;
+            color: white;
+            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+            font-weight: bold;
+            font-size: 9pt;
+            padding: 8px 16px;
+            border-radius: 5px;
+        }
+        QPushButton:hover {
+            background-color: #1c5980;
+        }
+        """)
+        self.rooms_btn.clicked.connect(self.show_rooms_dialog)
+
+        self.stats_btn = QPushButton("Performance Stats")
+        self.stats_btn.setFixedWidth(310)
+        self.stats_btn.setStyleSheet("""
+        QPushButton {
+            background-color: #7f8c8d;
+            color: white;
+            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+            font-weight: bold;
+            font-size: 9pt;
+            padding: 8px 16px;
+            border-radius: 5px;
+        }
+        QPushButton:hover {
+            background-color: #626d6e;
+        }
+        """)
+        self.stats_btn.clicked.connect(self.show_stats_panel)
+
         self.tab_widget = QTabWidget()
         self.tab_widget.tabBar().setMovable(True)
+        self.tab_widget.currentChanged.connect(self.on_tab_changed)
         self.tab_widget.setStyleSheet("""
             QTabBar::tab {
                 background: #333333;
@@ -862,6 +2008,7 @@ class MainWindow(QWidget):
         teachers_label.setStyleSheet("font-size: 10pt; font-weight: bold; font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;")
         teacher_list_layout.addWidget(teachers_label)
 
+        teacher_list_layout.addWidget(self.teacher_search)
         teacher_list_layout.addWidget(self.teacher_list)
 
         filter_btn_container = QWidget()
@@ -906,6 +2053,22 @@ class MainWindow(QWidget):
         self.filter_btn.clicked.connect(self.show_filter_dialog)
         filter_btn_layout.addWidget(self.filter_btn)
 
+        self.week_view_btn = QPushButton("Teacher Week")
+        self.week_view_btn.setStyleSheet("""
+            QPushButton {
+                background-color: #2980b9;
+                color: white;
+                font-weight: bold;
+                padding: 6px 12px;
+                border-radius: 5px;
+            }
+            QPushButton:hover {
+                background-color: #1c5980;
+            }
+        """)
+        self.week_view_btn.clicked.connect(self.show_teacher_week)
+        filter_btn_layout.addWidget(self.week_view_btn)
+
 
         teacher_list_layout.addWidget(filter_btn_container)
 
@@ -932,6 +2095,13 @@ class MainWindow(QWidget):
         delete_layout.addWidget(self.delete_class_combo)
         delete_layout.addWidget(self.delete_class_btn)
         class_controls_layout.addLayout(delete_layout)
+        class_controls_layout.addSpacing(10)
+        class_controls_layout.addWidget(self.generate_btn)
+        class_controls_layout.addWidget(self.week_btn)
+        class_controls_layout.addWidget(self.rooms_btn)
+        class_controls_layout.addWidget(self.health_btn)
+        class_controls_layout.addWidget(self.overview_btn)
+        class_controls_layout.addWidget(self.stats_btn)
 
         # Save / Load buttons box with max width
         save_load_box = QWidget()
@@ -962,6 +2132,35 @@ class MainWindow(QWidget):
         save_load_layout.addWidget(load_btn)
         save_load_box.setMaximumWidth(310)
 
+        undo_redo_box = QWidget()
+        undo_redo_layout = QHBoxLayout(undo_redo_box)
+        undo_redo_layout.setContentsMargins(0, 0, 0, 0)
+        undo_redo_layout.setSpacing(50)
+        self.undo_btn = QPushButton("Undo")
+        self.redo_btn = QPushButton("Redo")
+        self.undo_btn.clicked.connect(self.undo)
+        self.redo_btn.clicked.connect(self.redo)
+        for btn in (self.undo_btn, self.redo_btn):
+            btn.setStyleSheet("""
+                QPushButton {
+                    background-color: #7f8c8d;
+                    border-radius: 5px;
+                    padding: 8px;
+                    font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+                    font-weight: bold;
+                    font-size: 9pt;
+                    color: white;
+                    min-width: 80px;
+                }
+                QPushButton:hover {
+                    background-color: #626d6e;
+                }
+            """)
+            undo_redo_layout.addWidget(btn)
+        undo_redo_box.setMaximumWidth(310)
+        QShortcut(QKeySequence.StandardKey.Undo, self, activated=self.undo)
+        QShortcut(QKeySequence.StandardKey.Redo, self, activated=self.redo)
+
         left_layout = QVBoxLayout()
         left_layout.setContentsMargins(10, 10, 10, 10)
         left_layout.setSpacing(15)
@@ -970,6 +2169,7 @@ class MainWindow(QWidget):
         left_layout.addWidget(teacher_list_box)
         left_layout.addWidget(class_controls_box)
         left_layout.addWidget(save_load_box)
+        left_layout.addWidget(undo_redo_box)
         left_layout.addStretch()
 
         right_layout = QVBoxLayout()
@@ -1013,6 +2213,7 @@ class MainWindow(QWidget):
         self.setLayout(main_layout)
 
         self.update_delete_class_combo()
+        QTimer.singleShot(0, self.offer_startup_recovery)
 
     def pick_color(self):
         color = QColorDialog.getColor(initial=self.subject_color, parent=self)
@@ -1029,16 +2230,24 @@ class MainWindow(QWidget):
 
     def add_teacher(self):
         name = self.teacher_name_input.text().strip().title()
-        subject = self.teacher_subject_input.text().strip().title()
-        if not name or not subject:
+        subjects = parse_subjects(self.teacher_subject_input.text())
+        if not name or not subjects:
             QMessageBox.warning(self, "Input Error", "Please enter both teacher name and subject.")
             return
-        key = f"{name}|{subject}"
-        if key in self.teachers:
-            QMessageBox.warning(self, "Duplicate Teacher", f"Teacher {name} ({subject}) already exists.")
-            return
-        teacher = Teacher(name, subject, self.subject_color)
-        self.teacher_list.add_teacher(teacher)
+        existing = self.school.teachers_named(name)
+        if existing:
+            # The same person taking on more subjects keeps their ID, colour and lessons.
+            teacher = existing[0]
+            added = [subject for subject in subjects if subject not in teacher.subjects]
+            if not added:
+                QMessageBox.warning(self, "Duplicate Teacher", f"Teacher {name} ({', '.join(subjects)}) already exists.")
+                return
+            with self.history.transaction("Edit Teacher"):
+                self.school.update_teacher(Teacher(name, teacher.subjects + added, teacher.color, teacher.id))
+            self.teacher_list.sync([teacher.id])
+        else:
+            teacher = Teacher(name, subjects, self.subject_color)
+            self.teacher_list.add_teacher(teacher)
         self.teacher_name_input.clear()
         self.teacher_subject_input.clear()
 
@@ -1050,41 +2259,82 @@ class MainWindow(QWidget):
         grade_number = int(re.match(r"(\d+)", class_name).group(1))
         grade_key = str(grade_number)
 
+        if self.school.timetable(class_name, grade_key) is not None:
+            QMessageBox.warning(self, "Duplicate Class", f"Class {class_name} already exists.")
+            return
+
+        with self.history.transaction("Add Class"):
+            timetable = self.school.add_class(class_name, grade_key)
         if grade_key not in self.all_tables:
-            container = QWidget()
-            container.setLayout(QVBoxLayout())
-            scroll_area = QScrollArea()
-            scroll_area.setWidgetResizable(True)
-            layout_widget = ScrollableGradeWidget()
-            scroll_area.setWidget(layout_widget)
-            container.layout().addWidget(scroll_area)
-            self.tab_widget.addTab(container, grade_key)
-            self.all_tables[grade_key] = {
-                "tables": {},
-                "container": container,
-                "scroll_area": scroll_area,
-                "layout_widget": layout_widget
-            }
+            # A new grade's tab stays empty until shown (addTab shows the first one at once).
+            self.add_grade_tab(grade_key)
+        elif self.all_tables[grade_key]["layout_widget"] is not None:
+            self.add_class_table(timetable)
+        self.update_delete_class_combo()
+        self.class_input.clear()
 
-        if class_name in self.all_tables[grade_key]["tables"]:
-            QMessageBox.warning(self, "Duplicate Class", f"Class {class_name} already exists.")
+    def add_grade_tab(self, grade_key):
+        # Only an empty container for now; materialize_grade fills it when the tab is shown.
+        container = QWidget()
+        container.setLayout(QVBoxLayout())
+        self.all_tables[grade_key] = {
+            "tables": {},
+            "container": container,
+            "scroll_area": None,
+            "layout_widget": None
+        }
+        self.tab_widget.addTab(container, grade_key)
+
+    def materialize_grade(self, grade_key):
+        grade_data = self.all_tables[grade_key]
+        if grade_data["layout_widget"] is not None:
             return
+        scroll_area = QScrollArea()
+        scroll_area.setWidgetResizable(True)
+        layout_widget = ScrollableGradeWidget()
+        grade_data["scroll_area"] = scroll_area
+        grade_data["layout_widget"] = layout_widget
+        layout_widget.setUpdatesEnabled(False)
+        for timetable in self.school.grades.get(grade_key, {}).values():
+            self.add_class_table(timetable)
+        layout_widget.setUpdatesEnabled(True)
+        scroll_area.setWidget(layout_widget)
+        grade_data["container"].layout().addWidget(scroll_area)
+
+    def on_tab_changed(self, index):
+        container = self.tab_widget.widget(index)
+        for grade_key, grade_data in self.all_tables.items():
+            if grade_data["container"] is container:
+                self.materialize_grade(grade_key)
+                break
 
+    def add_class_table(self, timetable):
         table_widget = QWidget()
         layout = QVBoxLayout()
         layout.setContentsMargins(5, 5, 5, 5)
-        label = QLabel(class_name)
+        label = QLabel(timetable.class_name)
         label.setStyleSheet("font-size: 18pt; font-weight: bold; padding: 4px; color: white;")
         layout.addWidget(label)
 
-        timetable = TimetableTable(class_name, self.all_tables, self.teachers)
-        layout.addWidget(timetable)
+        table = TimetableTable(timetable, self.delegate, self.history)
+        layout.addWidget(table)
         table_widget.setLayout(layout)
 
-        self.all_tables[grade_key]["tables"][class_name] = timetable
-        self.all_tables[grade_key]["layout_widget"].add_class_widget(table_widget)
-        self.update_delete_class_combo()
-        self.class_input.clear()
+        self.all_tables[timetable.grade]["tables"][timetable.class_name] = table
+        self.all_tables[timetable.grade]["layout_widget"].add_class_widget(table_widget)
+        return table
+
+    def table_for(self, timetable):
+        grade_data = self.all_tables.get(timetable.grade)
+        return grade_data["tables"].get(timetable.class_name) if grade_data else None
+
+    def refresh_cell(self, timetable, row, col):
+        table = self.table_for(timetable)
+        if table:
+            table.refresh_cell(row, col)
+
+    def on_cell_changed(self, timetable, row, col, old_id, new_id):
+        self.refresh_cell(timetable, row, col)
 
     def delete_class(self):
         class_name = self.delete_class_combo.currentText()
@@ -1093,16 +2343,18 @@ class MainWindow(QWidget):
         grade_number = int(re.match(r"(\d+)", class_name).group(1))
         grade_key = str(grade_number)
 
-        if grade_key not in self.all_tables or class_name not in self.all_tables[grade_key]["tables"]:
+        if grade_key not in self.all_tables or self.school.timetable(class_name, grade_key) is None:
             QMessageBox.warning(self, "Delete Error", "Class not found.")
             return
-        timetable = self.all_tables[grade_key]["tables"].pop(class_name)
-        parent_widget = timetable.parentWidget()
+        timetable = self.all_tables[grade_key]["tables"].pop(class_name, None)
+        with self.history.transaction("Delete Class"):
+            self.school.remove_class(class_name, grade_key)
+        parent_widget = timetable.parentWidget() if timetable else None
         if parent_widget:
             self.all_tables[grade_key]["layout_widget"].grid_layout.removeWidget(parent_widget)
             parent_widget.deleteLater()
 
-        if not self.all_tables[grade_key]["tables"]:
+        if grade_key not in self.school.grades:
             idx = self.tab_widget.indexOf(self.all_tables[grade_key]["container"])
             if idx >= 0:
                 self.tab_widget.removeTab(idx)
@@ -1110,113 +2362,227 @@ class MainWindow(QWidget):
 
         self.update_delete_class_combo()
 
+    def undo(self):
+        self.history.undo()
+
+    def redo(self):
+        self.history.redo()
+
+    def on_history_replayed(self, command, undone):
+        if command.changes_classes():
+            self.rebuild_grade_tabs()
+        teacher_ids = command.teacher_ids()
+        if teacher_ids:
+            self.teacher_list.sync(teacher_ids)
+            # Cells may have been restored before their teacher entry came back.
+            for teacher_id in teacher_ids:
+                for timetable, row, col in self.school.slots_of(teacher_id):
+                    self.refresh_cell(timetable, row, col)
+
     def update_delete_class_combo(self):
         self.delete_class_combo.clear()
-        all_classes = []
-        for grade_data in self.all_tables.values():
-            all_classes.extend(grade_data["tables"].keys())
-        all_classes.sort()
-        self.delete_class_combo.addItems(all_classes)
+        self.delete_class_combo.addItems(self.school.class_names())
 
     def save_data(self):
-        filename, _ = QFileDialog.getSaveFileName(self, "Save Timetable Data", "", "JSON Files (*.json)")
+        filename, selected_filter = QFileDialog.getSaveFileName(
+            self, "Save Timetable Data", "", f"JSON Files (*.json);;SmartShed Binary (*{timetable_store.BINARY_SUFFIX})")
         if not filename:
             return
-        data = {
-            "teachers": {},
-            "timetables": {}
-        }
-        for key, teacher in self.teachers.items():
-            data["teachers"][key] = {
-                "name": teacher.name,
-                "subject": teacher.subject,
-                "color": teacher.color.name()
-            }
-        for grade, grade_data in self.all_tables.items():
-            data["timetables"][grade] = {}
-            for class_name, table in grade_data["tables"].items():
-                data["timetables"][grade][class_name] = table.get_data()
-        try:
-            with open(filename, "w") as f:
-                json.dump(data, f, indent=4)
+        if "Binary" in selected_filter and not filename.lower().endswith(timetable_store.BINARY_SUFFIX):
+            filename += timetable_store.BINARY_SUFFIX
+        # Only the snapshot is taken here; encoding and writing happen on the autosave thread
+        # and are timed, up to the file being on disk, as "save_write".
+        with timetable_perf.timed("save"):
+            started = time.perf_counter()
+            self.autosave.save(filename, self.school.to_dict(),
+                               lambda error: self.save_finished.emit(filename, error, time.perf_counter() - started))
+
+    def on_save_finished(self, filename, error, seconds):
+        timetable_perf.record("save_write", seconds)
+        if error is not None:
+            # What follows is journaled against a file that is not there; snapshot it all.
+            self.autosave.mark_dirty()
+            QMessageBox.critical(self, "Save Error", f"Failed to save {filename}:\n{error}")
+        else:
             QMessageBox.information(self, "Success", "Data saved successfully.")
-        except Exception as e:
-            QMessageBox.critical(self, "Save Error", str(e))
 
     def load_data(self):
-        filename, _ = QFileDialog.getOpenFileName(self, "Load Timetable Data", "", "JSON Files (*.json)")
+        filename, _ = QFileDialog.getOpenFileName(
+            self, "Load Timetable Data", "", f"Timetable Files (*.json *{timetable_store.BINARY_SUFFIX});;All Files (*)")
         if not filename:
             return
         try:
-            with open(filename, "r") as f:
-                data = json.load(f)
+            data = timetable_store.load(filename)
         except Exception as e:
             QMessageBox.critical(self, "Load Error", f"Failed to load file:\n{e}")
             return
 
-        self.teachers.clear()
-        self.teacher_list.clear()
-        self.all_tables.clear()
-        self.tab_widget.clear()
+        recovered = self.ask_recovery(filename)
+        if recovered is not None:
+            data = recovered
 
-        for key, tdata in data.get("teachers", {}).items():
-            color = QColor(tdata.get("color", "#3498db"))
-            teacher = Teacher(tdata["name"], tdata["subject"], color)
-            self.teachers[key] = teacher
-            self.teacher_list.add_teacher(teacher)
+        started = time.perf_counter()
+        if not self.load_school_data(data):
+            return
+        self.autosave.reset(filename, keep=recovered is not None)
+        self.last_load_seconds = time.perf_counter() - started
 
-        for grade, classes in data.get("timetables", {}).items():
-            if grade not in self.all_tables:
-                self.all_tables[grade] = {
-                    "tables": {},
-                    "container": QWidget(),
-                    "scroll_area": QScrollArea(),
-                    "layout_widget": ScrollableGradeWidget()
-                }
-                self.all_tables[grade]["container"].setLayout(QVBoxLayout())
-                scroll_area = self.all_tables[grade]["scroll_area"]
-                scroll_area.setWidgetResizable(True)
-                scroll_area.setWidget(self.all_tables[grade]["layout_widget"])
-                self.all_tables[grade]["container"].layout().addWidget(scroll_area)
-                self.tab_widget.addTab(self.all_tables[grade]["container"], grade)
-
-            for class_name, timetable_data in classes.items():
-                table_widget = QWidget()
-                layout = QVBoxLayout()
-                layout.setContentsMargins(5, 5, 5, 5)
-                label = QLabel(class_name)
-                label.setStyleSheet("font-size: 18pt; font-weight: bold; padding: 4px; color: white;")
-                layout.addWidget(label)
-
-                timetable = TimetableTable(class_name, self.all_tables, self.teachers)
-                timetable.set_data(timetable_data)
-                layout.addWidget(timetable)
-                table_widget.setLayout(layout)
-
-                self.all_tables[grade]["tables"][class_name] = timetable
-                self.all_tables[grade]["layout_widget"].add_class_widget(table_widget)
+        class_count = sum(len(classes) for classes in self.school.grades.values())
+        QMessageBox.information(self, "Success", f"Data loaded successfully: {class_count} classes, "
+                                f"{len(self.teachers)} teachers in {self.last_load_seconds:.2f} s.")
+
+    def load_school_data(self, data):
+        """set_school_data, or False once the user is told why *data* cannot be loaded.
 
+        A file from a newer version is turned away before anything changes; a
+        failure part-way through the load puts the previous school back.
+        """
+        try:
+            data = current_format(data)
+        except Exception as e:
+            QMessageBox.critical(self, "Load Error", f"Failed to load file:\n{e}")
+            return False
+        previous = self.school.to_dict()
+        try:
+            self.set_school_data(data)
+        except Exception as e:
+            self.set_school_data(previous)
+            QMessageBox.critical(self, "Load Error", f"Failed to load file:\n{e}")
+            return False
+        return True
+
+    @timetable_perf.instrument("load")
+    def set_school_data(self, data):
+        # Bulk path: no repaints or tab-change signals until everything is in place,
+        # and grade tabs get their class tables only when first shown.
+        self.setUpdatesEnabled(False)
+        try:
+            self.school.load_dict(data, QColor)
+            # Teacher IDs start at 1 in every file, so cached colours would belong to someone else.
+            self.palette.clear()
+            self.teacher_index.rebuild()
+            self.teacher_list.reload()
+        finally:
+            self.setUpdatesEnabled(True)
+        self.rebuild_grade_tabs()
+        self.history.clear()
+        self.health.rebuild()
+
+    def ask_recovery(self, filename):
+        """The recovered data for *filename* if the user wants it, else None (the journal is dropped)."""
+        if not timetable_autosave.has_recovery(filename):
+            return None
+        confirm = QMessageBox.question(self, "Recover Changes", "Unsaved changes from a previous session were found. Recover them?", QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+        if confirm == QMessageBox.StandardButton.Yes:
+            try:
+                return timetable_autosave.recover(filename)
+            except Exception as e:
+                QMessageBox.critical(self, "Recovery Error", f"Failed to recover changes:\n{e}")
+        timetable_autosave.discard(filename)
+        return None
+
+    def offer_recovery(self, filename):
+        data = self.ask_recovery(filename)
+        if data is not None and self.load_school_data(data):
+            self.autosave.reset(filename, keep=True)
+
+    def offer_startup_recovery(self):
+        # After a crash, whichever file was open then, named or untitled.
+        filename = timetable_autosave.pending_recovery()
+        if filename is not None:
+            self.offer_recovery(filename)
+
+    def autosave_tick(self):
+        self.autosave.flush()
+        error = self.autosave.take_error()
+        if error is not None:
+            QMessageBox.warning(self, "Autosave Error", f"Changes could not be journaled:\n{error}")
+
+    def closeEvent(self, event):
+        # A clean exit needs no recovery; only a crash leaves the journal behind.
+        self.autosave_timer.stop()
+        self.autosave.close()
+        super().closeEvent(event)
+
+    def rebuild_grade_tabs(self):
+        if self.overview is not None:
+            self.overview.reload()
+        for dialog in list(self.week_dialogs):
+            dialog.reload()
+        # After a change of week the old tables no longer match their grids; they are
+        # detached first, or the teardown would ask them for headers that are gone.
+        for grade_data in self.all_tables.values():
+            for table in grade_data["tables"].values():
+                table.setModel(None)
+        self.setUpdatesEnabled(False)
+        self.tab_widget.blockSignals(True)
+        try:
+            self.all_tables.clear()
+            self.tab_widget.clear()
+            for grade in self.school.grades:
+                self.add_grade_tab(grade)
+        finally:
+            self.tab_widget.blockSignals(False)
+            self.setUpdatesEnabled(True)
+        if self.tab_widget.count():
+            self.on_tab_changed(self.tab_widget.currentIndex())
         self.update_delete_class_combo()
-        QMessageBox.information(self, "Success", "Data loaded successfully.")
-    
+
+    def show_week_dialog(self):
+        dialog = WeekDialog(self.school, self)
+        if not dialog.exec():
+            return
+        days = WEEKDAYS[:dialog.days_spin.value()]
+        periods = dialog.periods_spin.value()
+        if days == self.school.days and periods == self.school.periods:
+            return
+        lost = sum(1 for timetable in self.school.timetables()
+                   for r in range(timetable.rows) for c in range(timetable.cols)
+                   if timetable.get_id(r, c) and (r >= periods or c >= len(days)))
+        if lost:
+            confirm = QMessageBox.question(self, "Shrink Week", f"{lost} assigned periods fall outside the new week and will be removed. Continue?", QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+            if confirm != QMessageBox.StandardButton.Yes:
+                return
+        self.school.set_week(days, periods)
+        self.history.clear()
+        self.health.rebuild()
+        self.autosave.mark_dirty()
+        self.rebuild_grade_tabs()
+
+    def show_rooms_dialog(self):
+        dialog = RoomsDialog(self.school, self)
+        if not dialog.exec():
+            return
+        rooms = dialog.rooms()
+        kept = {room.id for room in rooms if room.id is not None}
+        with timetable_perf.timed("rooms_edit"), self.history.transaction("Edit Rooms"):
+            for room_id in [room_id for room_id in self.school.rooms if room_id not in kept]:
+                self.school.remove_room(room_id)
+            for room in rooms:
+                if room.id is None:
+                    self.school.add_room(room)
+                else:
+                    old = self.school.rooms[room.id]
+                    if (old.name, old.subjects, old.capacity) != (room.name, room.subjects, room.capacity):
+                        self.school.update_room(room)
 
     def show_filter_dialog(self):
-        dialog = FilterDialog(self.teachers, self.all_tables, self)
+        dialog = FilterDialog(self.school, self)
         dialog.exec()
         # Removed analyze_absent_teacher() here, because now it's triggered by the dialog's Analyze button.
 
 
     def filter_teachers(self, subject, day, period):
-        day_to_col = {"Mon": 0, "Tue": 1, "Wed": 2, "Thu": 3, "Fri": 4}
+        day_to_col = {d: i for i, d in enumerate(self.school.days)}
 
         # Calculate columns and rows to check:
-        cols = range(5) if day == "Any" else [day_to_col.get(day, -1)]
+        cols = range(len(self.school.days)) if day == "Any" else [day_to_col.get(day, -1)]
         if -1 in cols:
             QMessageBox.warning(self, "Error", "Invalid day selected.")
             return
 
         if period == "Any":
-            rows = range(8)
+            rows = range(self.school.periods)
         else:
             try:
                 rows = [int(period[1:]) - 1]
@@ -1224,47 +2590,87 @@ class MainWindow(QWidget):
                 QMessageBox.warning(self, "Error", "Invalid period selected.")
                 return
 
-        busy_keys = set()
-        for grade_data in self.all_tables.values():
-            for table in grade_data["tables"].values():
-                for row in rows:
-                    for col in cols:
-                        cell = table.item(row, col)
-                        if cell:
-                            key = cell.data(Qt.ItemDataRole.UserRole)
-                            if key:
-                                busy_keys.add(key)
-
-        # Filter teachers by subject and availability
-        filtered_teachers = {}
-        for k, t in self.teachers.items():
-            if subject != "Any" and t.subject.lower() != subject.lower():
-                continue
-            if k in busy_keys:
-                continue
-            filtered_teachers[k] = t
-
-        # Clear and repopulate teacher list with filtered teachers
-        self.teacher_list.clear()
-        for teacher in filtered_teachers.values():
-            self.teacher_list.add_teacher(teacher)
+        with timetable_perf.timed("filter_list"):
+            # Filter teachers by subject and availability
+            # A subject taught in special rooms is only offered while one of them is free.
+            room_subjects = {s for room in self.school.rooms.values() for s in room.subjects}
+            roomless = {s for s in room_subjects if not self.school.free_rooms(rows, cols, s)}
+            allowed = set()
+            for teacher_id in self.school.free_teachers(rows, cols):
+                t = self.teachers[teacher_id]
+                allowed.update(self.school.code_of(teacher_id, s) for s in t.subjects
+                               if (subject == "Any" or s.lower() == subject.lower()) and s not in roomless)
+
+            # Hide the rest of the list rather than rebuilding it
+            self.teacher_list.set_allowed(allowed)
 
     def reset_teacher_filter(self):
-        self.teacher_list.clear()
-        for teacher in self.teachers.values():
-            self.teacher_list.add_teacher(teacher)
+        self.teacher_list.set_allowed(None)
 
     def show_absent_teacher_dialog(self):
-        dialog = AbsentTeacherDialog(self.teachers, self.all_tables, self)
+        dialog = AbsentTeacherDialog(self.school, self)
         dialog.exec()
 
     def show_filter_dialog(self):
-        dialog = FilterDialog(self.teachers, self.all_tables, self)
+        dialog = FilterDialog(self.school, self)
+        dialog.exec()
+
+    def show_health_panel(self):
+        if self.health_panel is None:
+            self.health_panel = HealthPanel(self.health, self)
+        self.health_panel.show()
+        self.health_panel.raise_()
+        self.health_panel.refresh()
+
+    def show_teacher_week(self):
+        code = self.teacher_list.current_code()
+        teacher = self.school.teacher_of(code) if code else None
+        if teacher is None:
+            QMessageBox.warning(self, "No Teacher Selected", "Select a teacher in the list first.")
+            return
+        dialog = TeacherWeekDialog(self.school, teacher.id, self)
+        self.week_dialogs.add(dialog)
+        dialog.finished.connect(lambda _: self.week_dialogs.discard(dialog))
+        dialog.show()
+
+    def show_stats_panel(self):
+        if self.stats_panel is None:
+            self.stats_panel = StatsPanel(self)
+        self.stats_panel.show()
+        self.stats_panel.raise_()
+        self.stats_panel.refresh()
+
+    def show_overview(self):
+        if self.overview is None:
+            self.overview = OverviewWindow(self.school, self.palette, self)
+        self.overview.show()
+        self.overview.raise_()
+
+    def show_class(self, timetable):
+        grade_data = self.all_tables.get(timetable.grade)
+        if grade_data is None:
+            return
+        self.tab_widget.setCurrentWidget(grade_data["container"])
+        self.materialize_grade(timetable.grade)
+        table = grade_data["tables"].get(timetable.class_name)
+        if table is not None:
+            grade_data["scroll_area"].ensureWidgetVisible(table.parentWidget())
+        self.raise_()
+        self.activateWindow()
+
+    def show_generate_dialog(self):
+        if not self.school.grades or not self.teachers:
+            QMessageBox.warning(self, "Nothing to Generate", "Add teachers and classes first.")
+            return
+        dialog = GenerateDialog(self.school, self)
         dialog.exec()
 
-    
 
 if __name__ == "__main__":
+    if sys.argv[1:2] == ["validate"]:
+        # Headless batch mode; see timetable_cli.py
+        from timetable_cli import main
+        sys.exit(main(sys.argv[1:]))
     app = QApplication(sys.argv)
     window = MainWindow()
     window.showMaximized()
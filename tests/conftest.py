@@ -0,0 +1,46 @@
+import copy
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from timetable_model import Room, School, Teacher  # noqa: E402
+
+
+@pytest.fixture
+def school():
+    """Two teachers (one with two subjects), a lab, and two classes with a few lessons."""
+    school = School()
+    school.add_teacher(Teacher("Ann", ["Math", "Science"], "#ff0000"))
+    school.add_teacher(Teacher("Bob", ["English"], "#00ff00"))
+    school.add_room(Room("Lab 1", ["Science"]))
+    a = school.add_class("6-A")
+    b = school.add_class("6-B")
+    a.set(0, 0, (1, "Math"))
+    a.set(1, 0, (1, "Science"))
+    a.set_room(1, 0, 1)
+    b.set(0, 1, (1, "Math"))
+    b.set(0, 0, (2, "English"))
+    school.subject_quotas["6-A"] = {"Math": 3, "Science": 2}
+    return school
+
+
+def indexes(school):
+    """Every derived index of *school*, keyed by class name rather than Timetable object."""
+    def cell(c):
+        return (c[0].class_name, c[1], c[2])
+    return copy.deepcopy({
+        "slot_teachers": school.slot_teachers,
+        "teacher_slots": {tid: slots for tid, slots in school.teacher_slots.items() if slots},
+        "occupancy": {tid: school.occupancy[tid].tolist() for tid in range(len(school.occupancy))
+                      if school.occupancy[tid].any()},
+        "day_load": {tid: school.day_load[tid].tolist() for tid in range(len(school.day_load))
+                     if school.day_load[tid].any()},
+        "subject_counts": {t.class_name: {s: n for s, n in counts.items() if n}
+                           for t, counts in school.subject_counts.items()},
+        "cells_of": {code: sorted(map(cell, cells)) for code, cells in school.cells_of.items() if cells},
+        "slot_rooms": school.slot_rooms,
+        "room_cells": {rid: sorted(map(cell, cells)) for rid, cells in school.room_cells.items() if cells},
+    })
@@ -0,0 +1,153 @@
+"""The journal and snapshot reproduce the school after a crash."""
+
+import json
+import os
+
+import pytest
+
+import timetable_autosave
+import timetable_store
+from timetable_autosave import Autosave, journal_path, recover, snapshot_path
+from timetable_model import School, Teacher
+
+
+@pytest.fixture
+def path(school, tmp_path):
+    path = str(tmp_path / "school.json")
+    timetable_store.save(path, school.to_dict())
+    return path
+
+
+@pytest.fixture
+def autosave(school, path):
+    autosave = Autosave(school, path)
+    yield autosave
+    autosave.close(discard_files=False)
+
+
+def wait(autosave):
+    autosave._pool.submit(lambda: 0).result()
+
+
+def cells(school):
+    return {(t.class_name, row, col): (t.get(row, col), t.get_room(row, col))
+            for t in school.timetables() for row in range(t.rows) for col in range(t.cols)}
+
+
+def recovered(path):
+    school = School()
+    school.load_dict(recover(path))
+    return school
+
+
+def test_journal_replays_cell_and_room_edits(school, path, autosave):
+    a = school.timetable("6-A")
+    a.set(2, 2, (2, "English"))
+    autosave.flush()
+    a.clear(0, 0)
+    a.set_room(1, 0, 0)
+    school.timetable("6-B").set(1, 0, (1, "Science"))
+    school.timetable("6-B").set_room(1, 0, 1)
+    autosave.flush()
+    wait(autosave)
+    assert not os.path.exists(snapshot_path(path))
+    with open(journal_path(path)) as f:
+        assert len(f.read().splitlines()) == 2
+    assert cells(recovered(path)) == cells(school)
+
+
+def test_torn_last_line_is_ignored(school, path, autosave):
+    a = school.timetable("6-A")
+    a.set(2, 2, (2, "English"))
+    autosave.flush()
+    wait(autosave)
+    expected = cells(school)
+    with open(journal_path(path), "a") as f:
+        f.write('[["", "6-A", 3, 3, [2, "Eng')
+    assert cells(recovered(path)) == expected
+
+
+def test_entries_without_a_room_still_replay(school, path):
+    grade = school.timetable("6-A").grade
+    with open(journal_path(path), "w") as f:
+        f.write(json.dumps([[grade, "6-A", 2, 2, [2, "English"]], [grade, "6-A", 1, 0, 0]]) + "\n")
+    a = recovered(path).timetable("6-A")
+    assert a.get(2, 2) == (2, "English")
+    assert a.get(1, 0) is None and a.get_room(1, 0) == 0
+
+
+def test_teacher_change_compacts_into_a_snapshot(school, path, autosave):
+    school.timetable("6-A").set(2, 2, (2, "English"))
+    autosave.flush()
+    school.add_teacher(Teacher("Cid", ["Art"], "#0000ff"))
+    school.timetable("6-B").set(3, 3, (3, "Art"))
+    autosave.flush()
+    wait(autosave)
+    assert os.path.exists(snapshot_path(path))
+    assert not os.path.exists(journal_path(path))
+    school_back = recovered(path)
+    assert school_back.teachers[3].name == "Cid"
+    assert cells(school_back) == cells(school)
+
+
+def test_long_journal_compacts(school, path):
+    autosave = Autosave(school, path, threshold=3)
+    a = school.timetable("6-A")
+    for col in range(4):
+        a.set(4, col, (2, "English"))
+        autosave.flush()
+    autosave.close(discard_files=False)
+    assert os.path.exists(snapshot_path(path))
+    assert cells(recovered(path)) == cells(school)
+
+
+def test_save_writes_the_file_and_drops_recovery(school, path, autosave, tmp_path):
+    school.timetable("6-A").set(2, 2, (2, "English"))
+    autosave.flush()
+    wait(autosave)
+    target = str(tmp_path / "copy.smtt")
+    errors = []
+    autosave.save(target, school.to_dict(), errors.append)
+    wait(autosave)
+    assert errors == [None]
+    assert autosave.path == target
+    assert not timetable_autosave.has_recovery(path)
+    saved = School()
+    saved.load_dict(timetable_store.load(target))
+    assert cells(saved) == cells(school)
+
+
+def test_failed_save_keeps_recovery(school, path, autosave, tmp_path):
+    school.timetable("6-A").set(2, 2, (2, "English"))
+    autosave.flush()
+    wait(autosave)
+    errors = []
+    autosave.save(str(tmp_path / "missing" / "school.json"), school.to_dict(), errors.append)
+    wait(autosave)
+    assert isinstance(errors[0], OSError)
+    assert os.path.exists(journal_path(path))
+
+
+def test_pending_recovery_finds_the_last_file_followed(school, path, tmp_path, monkeypatch):
+    monkeypatch.setattr(timetable_autosave, "UNTITLED", str(tmp_path / "untitled.json"))
+    monkeypatch.setattr(timetable_autosave, "LAST_FILE", str(tmp_path / "last_file"))
+    autosave = Autosave(school)
+    autosave.reset(path)
+    school.timetable("6-A").set(2, 2, (2, "English"))
+    autosave.flush()
+    autosave.close(discard_files=False)   # a crash leaves the journal behind
+    assert timetable_autosave.pending_recovery() == path
+    timetable_autosave.discard(path)
+    assert timetable_autosave.pending_recovery() is None
+
+
+def test_pending_recovery_falls_back_to_untitled(school, tmp_path, monkeypatch):
+    untitled = str(tmp_path / "untitled.json")
+    monkeypatch.setattr(timetable_autosave, "UNTITLED", untitled)
+    monkeypatch.setattr(timetable_autosave, "LAST_FILE", str(tmp_path / "last_file"))
+    timetable_autosave.remember(str(tmp_path / "closed_cleanly.json"))
+    autosave = Autosave(school)
+    school.timetable("6-A").set(2, 2, (2, "English"))
+    autosave.flush()
+    autosave.close(discard_files=False)
+    assert timetable_autosave.pending_recovery() == untitled
@@ -0,0 +1,165 @@
+"""Undo and redo restore the school exactly, indexes included."""
+
+import pytest
+
+from conftest import indexes
+from timetable_history import History
+from timetable_model import Room, School, Teacher
+
+
+@pytest.fixture
+def history(school):
+    return History(school, coalesce_seconds=0)
+
+
+def state(school):
+    return school.to_dict(), indexes(school)
+
+
+def check_undo_redo(school, history, edit, label="Edit"):
+    before = state(school)
+    with history.transaction(label):
+        edit()
+    after = state(school)
+    assert after != before
+    history.undo()
+    assert state(school) == before
+    history.redo()
+    assert state(school) == after
+
+
+def test_cell_edits(school, history):
+    a = school.timetable("6-A")
+    def edit():
+        a.set(2, 2, (2, "English"))
+        a.set(2, 2, (1, "Math"))         # one delta per cell, however often it changes
+        a.clear(0, 0)
+    check_undo_redo(school, history, edit)
+    assert len(history.undo_stack[-1]) == 2
+
+
+def test_teacher_edit_with_limits_and_availability(school, history):
+    def edit():
+        school.set_limits(1, {"day": 2})
+        school.set_unavailable(1, 0b110)
+        school.update_teacher(Teacher("Anna", ["Math"], "#ff0000", 1))   # clears the Science lesson
+    check_undo_redo(school, history, edit, "Edit Teacher")
+    assert history.undo_stack[-1].teacher_ids() == {1}
+
+
+def test_remove_teacher(school, history):
+    check_undo_redo(school, history, lambda: school.remove_teacher(1), "Delete Teacher")
+
+
+def test_delete_class_restores_its_quota(school, history):
+    check_undo_redo(school, history, lambda: school.remove_class("6-A"), "Delete Class")
+    history.undo()
+    assert school.subject_quotas["6-A"] == {"Math": 3, "Science": 2}
+
+
+def test_undone_class_delete_keeps_its_place():
+    school = School()
+    for name in ("6-A", "6-B", "7-A", "8-A"):
+        school.add_class(name)
+    history = History(school, coalesce_seconds=0)
+    order = [(t.grade, t.class_name) for t in school.timetables()]
+    for name in ("6-A", "7-A"):
+        with history.transaction("Delete Class"):
+            school.remove_class(name)
+    history.undo()
+    history.undo()
+    assert [(t.grade, t.class_name) for t in school.timetables()] == order
+    history.redo()
+    history.redo()
+    assert [t.class_name for t in school.timetables()] == ["6-B", "8-A"]
+
+
+def test_rooms_and_room_bookings(school, history):
+    def edit():
+        school.add_room(Room("Lab 2", ["Science"]))
+        school.timetable("6-B").set(1, 0, (1, "Science"))
+        school.timetable("6-B").set_room(1, 0, 2)
+        school.update_room(Room("Lab One", ["Science"], 2, 1))
+    check_undo_redo(school, history, edit, "Rooms")
+
+
+def test_separate_edits_undo_one_at_a_time(school, history):
+    a = school.timetable("6-A")
+    a.set(3, 3, (2, "English"))
+    a.set(4, 4, (2, "English"))
+    history.undo()
+    assert a.get(3, 3) == (2, "English") and a.get(4, 4) is None
+    a.set(5, 0, (2, "English"))
+    assert not history.can_redo
+
+
+def test_quick_edits_with_one_label_coalesce(school):
+    history = History(school, coalesce_seconds=60)
+    a = school.timetable("6-A")
+    a.set(3, 3, (2, "English"))
+    a.set(4, 4, (2, "English"))
+    assert len(history.undo_stack) == 1
+
+
+def test_step_budget_drops_the_oldest(school):
+    history = History(school, max_steps=3, coalesce_seconds=0)
+    a = school.timetable("6-A")
+    for col in range(5):
+        a.set(6, col, (2, "English"))
+    assert history.steps <= 3
+    while history.undo():
+        pass
+    assert a.get(6, 0) == (2, "English")
+    assert a.get(6, 4) is None
+
+
+def test_undo_of_a_new_school_restores_emptiness():
+    school = School()
+    history = History(school, coalesce_seconds=0)
+    before = state(school)
+    with history.transaction("Setup"):
+        school.add_teacher(Teacher("Ann", ["Math"], "#ff0000"))
+        school.add_class("6-A").set(0, 0, (1, "Math"))
+    history.undo()
+    assert school.timetable("6-A") is None and 1 not in school.teachers
+    assert indexes(school) == before[1]
+
+
+def test_resumed_transaction_undoes_with_its_start(school, history):
+    before = state(school)
+    with history.transaction("Generate") as started:
+        school.set_quota("6-B", {"English": 2})
+    with history.transaction("Generate", started):
+        school.timetable("6-B").set(2, 2, (2, "English"))
+    assert len(history.undo_stack) == 1
+    history.undo()
+    assert state(school) == before
+
+
+def test_resume_after_an_undo_starts_a_new_command(school, history):
+    with history.transaction("Generate") as started:
+        school.set_quota("6-B", {"English": 2})
+    history.undo()
+    with history.transaction("Generate", started):
+        school.timetable("6-B").set(2, 2, (2, "English"))
+    assert history.undo_stack[-1] is not started
+    assert "6-B" not in school.subject_quotas
+
+
+def test_only_lesson_edits_coalesce(school):
+    history = History(school, coalesce_seconds=60)
+    for name in ("Cid", "Dee"):
+        with history.transaction("Add Teacher"):
+            school.add_teacher(Teacher(name, ["Art"], "#0000ff"))
+    school.add_teacher(Teacher("Eve", ["Art"], "#0000ff"))
+    school.add_teacher(Teacher("Fay", ["Art"], "#0000ff"))
+    with history.transaction("Drop Lesson"):
+        school.timetable("6-B").set(3, 3, (3, "Art"))
+    with history.transaction("Drop Lesson"):
+        school.timetable("6-B").set(4, 4, (4, "Art"))
+    assert [command.label for command in history.undo_stack] == [
+        "Add Teacher", "Add Teacher", "Edit", "Edit", "Drop Lesson"]
+    history.undo()
+    assert school.timetable("6-B").get(3, 3) is None
+    history.undo()
+    assert 6 not in school.teachers and 5 in school.teachers
@@ -0,0 +1,118 @@
+"""School and Timetable edits, and the indexes kept alongside them; no Qt involved."""
+
+import sys
+
+from conftest import indexes
+from timetable_model import EMPTY, School, Teacher
+
+
+def test_model_imports_without_qt():
+    assert not any(name.startswith(("PyQt5", "PyQt6")) for name in sys.modules)
+
+
+def test_cells_hold_lesson_codes(school):
+    a = school.timetable("6-A")
+    assert a.get(0, 0) == (1, "Math")
+    assert school.teacher_of(a.get_id(0, 0)).name == "Ann"
+    assert a.get(2, 2) is None
+    assert a.get_id(2, 2) == EMPTY
+
+
+def test_indexes_match_a_fresh_load_after_edits(school):
+    a, b = school.timetable("6-A"), school.timetable("6-B")
+    a.set(0, 0, (2, "English"))          # replace
+    b.clear(0, 1)                        # clear
+    a.set(3, 4, (1, "Math"))
+    b.set(3, 4, (1, "Math"))             # double-booking is recorded, not refused
+    school.add_teacher(Teacher("Cy", ["Art"], "#0000ff"))
+    a.set(5, 2, (3, "Art"))
+    assert indexes(school) == indexes(School.from_dict(school.to_dict()))
+
+
+def test_booking_queries(school):
+    assert school.is_booked(1, 0, 0)
+    assert school.is_booked(1, 0, 1)
+    assert not school.is_booked(2, 0, 1)
+    assert school.slots_of(1) == sorted(school.slots_of(1), key=lambda c: (c[0].order, c[1], c[2]))
+    assert {(t.class_name, r, c) for t, r, c in school.slots_of(1)} == {("6-A", 0, 0), ("6-A", 1, 0), ("6-B", 0, 1)}
+    assert 1 not in school.free_teachers([0], [0])
+    assert 2 in school.free_teachers([1], [0])
+
+
+def test_update_teacher_clears_only_dropped_subjects(school):
+    cells = school.update_teacher(Teacher("Anna", ["Math"], "#ff0000", 1))
+    a = school.timetable("6-A")
+    assert a.get(0, 0) == (1, "Math")
+    assert a.get(1, 0) is None
+    assert a.get_room(1, 0) == EMPTY
+    assert {(t.class_name, r, c) for t, r, c in cells} == {("6-A", 0, 0), ("6-B", 0, 1)}
+    assert indexes(school) == indexes(School.from_dict(school.to_dict()))
+
+
+def test_remove_teacher_clears_their_cells(school):
+    school.remove_teacher(1)
+    assert 1 not in school.teachers
+    assert school.slots_of(1) == []
+    assert school.timetable("6-B").get(0, 0) == (2, "English")
+    assert indexes(school) == indexes(School.from_dict(school.to_dict()))
+
+
+def test_rooms_are_booked_and_follow_their_lesson(school):
+    a = school.timetable("6-A")
+    assert school.free_room("Science", 1, 0) is None
+    assert school.free_room("Science", 2, 0) == 1
+    a.set(1, 0, (1, "Math"))
+    assert a.get_room(1, 0) == EMPTY
+    assert school.free_room("Science", 1, 0) == 1
+
+
+def test_limit_problem_reports_quota_and_limits(school):
+    a = school.timetable("6-A")
+    a.set(2, 0, (1, "Science"))
+    assert "quota" in school.limit_problem(a, 3, 0, school.code_of(1, "Science"))
+    school.set_limits(2, {"day": 1})
+    assert "daily limit" in school.limit_problem(a, 4, 0, school.code_of(2, "English"))
+    assert school.limit_problem(a, 4, 1, school.code_of(2, "English")) is None
+
+
+def test_remove_class_drops_its_cells_and_quota(school):
+    school.remove_class("6-A")
+    assert school.timetable("6-A") is None
+    assert "6-A" not in school.subject_quotas
+    assert {(t.class_name, r, c) for t, r, c in school.slots_of(1)} == {("6-B", 0, 1)}
+    assert indexes(school) == indexes(School.from_dict(school.to_dict()))
+
+
+def test_load_skips_limits_and_availability_of_unknown_teachers(school):
+    data = school.to_dict()
+    data["limits"] = {"1": {"day": 3}, "9": {"week": 10}}
+    data["unavailable"] = {"2": 1, "9": 1}
+    loaded = School.from_dict(data)
+    assert loaded.teacher_limits == {1: {"day": 3}}
+    assert loaded.unavailable == {2: 1}
+
+
+def test_set_week_keeps_the_cells_that_fit(school):
+    school.set_unavailable(2, 1 << school.slot(0, 4))
+    school.timetable("6-A").set(7, 4, (2, "English"))
+    school.set_week(["Mon", "Tue", "Wed"], 6)
+    a = school.timetable("6-A")
+    assert (a.rows, a.cols) == (6, 3)
+    assert a.get(0, 0) == (1, "Math")
+    assert school.unavailable == {}
+    assert indexes(school) == indexes(School.from_dict(school.to_dict()))
+
+
+def test_listeners_and_hooks_see_every_change(school):
+    cells, changes = [], []
+    school.listeners.append(lambda *change: cells.append(change[1:]))
+    school.hooks.append(lambda change: changes.append(change[0]))
+    a = school.timetable("6-A")
+    a.set(2, 2, (2, "English"))
+    a.set(2, 2, (2, "English"))          # no-op
+    school.set_quota("6-B", {"English": 1})
+    school.set_limits(1, {"week": 20})
+    school.set_unavailable(1, 1)
+    school.update_teacher(Teacher("Ann", ["Math", "Science"], "#123456", 1))
+    assert cells == [(2, 2, EMPTY, school.code_of(2, "English"))]
+    assert changes == ["quota", "limits", "unavailable", "teacher"]
@@ -0,0 +1,133 @@
+"""The generator: what check() refuses, and the invariants of an applied solution."""
+
+from collections import Counter
+
+import pytest
+
+from timetable_model import Room, School, Teacher
+from timetable_solver import FREE, apply_solution, check, snapshot, solve
+
+
+MIX = {"Math": 8, "English": 7, "Science": 6, "Art": 4, "Pe": 5}
+
+
+def make_school(sections=4):
+    school = School()
+    for subject, periods in MIX.items():
+        for i in range(-(-periods * sections * 2 // 30)):
+            school.add_teacher(Teacher(f"{subject}{i + 1}", [subject], "#336699"))
+    school.add_teacher(Teacher("Flex", ["Math", "Art"], "#996633"))
+    school.add_room(Room("Lab", ["Science"]))
+    school.add_room(Room("Lab 2", ["Science"]))
+    school.add_room(Room("Gym", ["Pe"], capacity=2))
+    for grade in ("6", "7"):
+        for x in range(sections):
+            name = f"{grade}-{chr(65 + x)}"
+            school.add_class(name)
+            school.set_quota(name, dict(MIX))
+    return school
+
+
+def tid(school, name):
+    return school.teachers_named(name)[0].id
+
+
+def test_check_names_what_cannot_be_met():
+    school = make_school(1)
+    school.set_quota("6-A", {"Math": 8, "Latin": 2})
+    school.set_quota("7-A", {"Math": 41})
+    problems = check(snapshot(school))
+    assert any("no teacher teaches Latin" in p for p in problems)
+    assert any("7-A needs 41 more periods" in p for p in problems)
+
+
+def test_check_reports_locked_double_bookings():
+    school = make_school(1)
+    math = tid(school, "Math1")
+    school.timetable("6-A").set(0, 0, (math, "Math"))
+    school.timetable("7-A").set(0, 0, (math, "Math"))
+    assert any("double-booked" in p for p in check(snapshot(school)))
+
+
+def test_solve_refuses_an_impossible_problem():
+    school = make_school(1)
+    school.set_quota("6-A", {"Latin": 1})
+    solution = solve(snapshot(school), seed=1, time_limit=1.0)
+    assert not solution.ok and solution.problems
+
+
+@pytest.mark.parametrize("seed", [1, 2])
+def test_applied_solution_keeps_every_invariant(seed):
+    school = make_school()
+    limited, part_timer, english = tid(school, "Flex"), tid(school, "Math2"), tid(school, "English1")
+    school.set_limits(limited, {"day": 5, "week": 20})
+    school.set_unavailable(part_timer, (1 << 10) - 1)
+    locked = school.timetable("6-A")
+    locked.set(7, 4, (english, "English"))
+    problem = snapshot(school)
+    assert check(problem) == []
+    solution = solve(problem, seed=seed, time_limit=5.0)
+    assert solution.ok
+    apply_solution(school, problem, solution)
+
+    # Locked lessons stay where they were.
+    assert locked.get(7, 4) == (english, "English")
+    # Nobody is in two places at once, or teaching when unavailable.
+    assert all(count == 1 for booked in school.slot_teachers for count in booked.values())
+    assert all(not school.is_unavailable(part_timer, row, col) for row, col in school.booked_slots(part_timer))
+    # Day and week limits hold.
+    assert max(school.day_load[limited]) <= 5
+    assert sum(school.day_load[limited]) <= 20
+    # Every class gets its quota, less whatever could not be placed.
+    unplaced = Counter((problem.classes[c][1], problem.teachers[t][2]) for c, t in solution.unplaced)
+    for timetable in school.timetables():
+        given = Counter(school.lesson_of(code)[1] for code in timetable.cells if code)
+        for subject, periods in MIX.items():
+            assert given[subject] + unplaced[timetable.class_name, subject] == periods
+    # Rooms are never over capacity, and every lesson that needs one has one.
+    assert school.room_clashes() == []
+    assert school.roomless_lessons() == []
+    # The grid in the solution is what the school now holds.
+    for c, (grade, class_name) in enumerate(problem.classes):
+        timetable = school.timetable(class_name, grade)
+        for slot, t in enumerate(solution.grid[c]):
+            code = timetable.cells[slot]
+            assert code == (problem.teachers[t][0] if t != FREE else 0)
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_daily_limit_holds(seed):
+    school = School()
+    math = school.add_teacher(Teacher("Ann", ["Math"], "#ff0000"))
+    school.set_limits(math.id, {"day": 2})
+    for name in ("6-A", "6-B"):
+        school.add_class(name)
+    school.set_quota("6-A", {"Math": 6})
+    school.set_quota("6-B", {"Math": 4})
+    school.timetable("6-A").set(0, 0, (math.id, "Math"))
+    problem = snapshot(school)
+    assert check(problem) == []
+    solution = solve(problem, seed=seed, time_limit=2.0)
+    assert solution.ok and not solution.unplaced
+    apply_solution(school, problem, solution)
+    assert school.day_load[math.id].tolist() == [2] * len(school.days)
+
+
+def test_check_counts_daily_limits():
+    school = School()
+    math = school.add_teacher(Teacher("Ann", ["Math"], "#ff0000"))
+    school.set_limits(math.id, {"day": 1})
+    school.add_class("6-A")
+    school.set_quota("6-A", {"Math": len(school.days) + 1})
+    assert any("Math:" in p for p in check(snapshot(school)))
+    school.set_quota("6-A", None)
+    school.timetable("6-A").set(0, 0, (math.id, "Math"))
+    school.timetable("6-A").set(1, 0, (math.id, "Math"))
+    assert any("daily limit" in p for p in check(snapshot(school)))
+
+
+def test_keep_existing_false_ignores_current_cells():
+    school = make_school(1)
+    school.timetable("6-A").set(0, 0, (tid(school, "Math1"), "Math"))
+    problem = snapshot(school, keep_existing=False)
+    assert all(t == FREE for row in problem.fixed for t in row)
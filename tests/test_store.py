@@ -0,0 +1,100 @@
+"""Save files: lossless JSON and binary round trips, and files from before teacher IDs."""
+
+import json
+import struct
+
+import pytest
+
+import timetable_store
+from conftest import indexes
+from timetable_model import FORMAT, School, Teacher
+
+
+def filled(school):
+    school.set_limits(1, {"day": 4, "week": 20})
+    school.set_unavailable(2, 0b1011)
+    school.set_quota("6-B", {"English": 5})
+    school.add_teacher(Teacher("Zoë Ünal", ["Français"], "#abcdef"))
+    school.timetable("6-B").set(7, 4, (3, "Français"))
+    return school
+
+
+@pytest.mark.parametrize("suffix", [".json", timetable_store.BINARY_SUFFIX])
+def test_round_trip_is_lossless(school, tmp_path, suffix):
+    data = filled(school).to_dict()
+    path = str(tmp_path / ("school" + suffix))
+    timetable_store.save(path, data)
+    loaded = timetable_store.load(path)
+    assert loaded == json.loads(json.dumps(data))
+    again = School.from_dict(loaded)
+    assert again.to_dict() == data
+    assert indexes(again) == indexes(school)
+    assert not (tmp_path / ("school" + suffix + ".tmp")).exists()
+
+
+def test_binary_is_detected_by_content_not_name(school, tmp_path):
+    data = school.to_dict()
+    path = tmp_path / "school.json"
+    path.write_bytes(timetable_store.dumps_binary(data))
+    assert timetable_store.load(str(path)) == json.loads(json.dumps(data))
+
+
+def test_many_lessons_widen_the_packed_cells():
+    data = {"format": FORMAT, "teachers": {}, "lessons": [[1, "Math"]] * 70000,
+            "timetables": {"6": {"6-A": [[69999, 0], [1, 2]]}}}
+    assert timetable_store.loads_binary(timetable_store.dumps_binary(data))["timetables"] == data["timetables"]
+
+
+def test_newer_binary_version_is_refused(school):
+    blob = bytearray(timetable_store.dumps_binary(school.to_dict()))
+    struct.pack_into("<H", blob, 4, timetable_store.VERSION + 1)
+    with pytest.raises(ValueError):
+        timetable_store.loads_binary(bytes(blob))
+
+
+LEGACY = {
+    "teachers": {
+        "Ann|Math": {"name": "Ann", "subject": "Math", "color": "#ff0000"},
+        "Ann|Science": {"name": "Ann", "subject": "Science", "color": "#ff0000"},
+        "Bob|English": {"name": "Bob", "subject": "English", "color": "#00ff00"},
+    },
+    "timetables": {"6": {"6-A": [["Ann|Math", "", "Gone|Art", "", ""]] + [[""] * 5] * 6
+                               + [["", "", "", "Bob|English", "Ann|Science"]]}},
+    "limits": {"Bob": {"day": 2}},
+}
+
+
+def check_legacy(school):
+    assert {t.name: t.subjects for t in school.teachers.values()} == {"Ann": ["Math", "Science"], "Bob": ["English"]}
+    a = school.timetable("6-A")
+    assert a.get(0, 0) == (1, "Math")
+    assert a.get(0, 2) is None              # unknown keys were always dropped
+    assert a.get(7, 3) == (2, "English")
+    assert a.get(7, 4) == (1, "Science")
+
+
+def test_legacy_json_is_upgraded():
+    school = School.from_dict(json.loads(json.dumps(LEGACY)))
+    check_legacy(school)
+    assert school.teacher_limits == {2: {"day": 2}}
+
+
+def test_version_1_binary_is_upgraded():
+    keys = list(LEGACY["teachers"])
+    extra = ["Gone|Art"]
+    index = {key: i for i, key in enumerate([""] + keys + extra)}
+    rows = LEGACY["timetables"]["6"]["6-A"]
+    header = {"teachers": LEGACY["teachers"],
+              "_grids": {"grades": ["6"], "classes": [["6", "6-A", [len(row) for row in rows]]],
+                         "typecode": "H", "extra_keys": extra}}
+    meta = json.dumps(header).encode("utf-8")
+    cells = [index[key] for row in rows for key in row]
+    blob = struct.pack("<4sHI", timetable_store.MAGIC, 1, len(meta)) + meta + struct.pack(f"<{len(cells)}H", *cells)
+    check_legacy(School.from_dict(timetable_store.loads_binary(blob)))
+
+
+def test_newer_format_leaves_the_school_untouched(school):
+    before = school.to_dict()
+    with pytest.raises(ValueError):
+        school.load_dict({"format": FORMAT + 1, "week": {"days": ["Mon"], "periods": 1}})
+    assert school.to_dict() == before
@@ -0,0 +1,249 @@
+"""Crash recovery for SmartShed: an append-only journal next to the save file.
+
+For a main file ``school.json`` two companions are kept while there are
+unsaved changes:
+
+* ``school.json.journal`` -- one JSON line per flush, listing the cells
+  changed since the previous line as ``[grade, class, row, col, lesson,
+  room]``, where lesson is ``[teacher id, subject]`` or 0 for a cleared
+  cell, and room the ID of the room booked for it or 0.
+* ``school.json.autosave.smtt`` -- a full binary snapshot.  Teacher, room,
+  class and week changes, or a journal longer than ``threshold`` cells,
+  compact the journal into a new snapshot.
+
+Recovery loads the snapshot (or the main file when there is none) and
+replays the journal on top.  The file being followed is noted in
+``LAST_FILE``, so after a crash ``pending_recovery`` finds its journal at
+the next start, whatever file it was.  Files are encoded and written on a single
+background thread, and snapshots are replaced atomically, so a crash in
+the middle of a write leaves the previous state readable.  Explicit saves
+go through the same thread (``Autosave.save``), so they are ordered with
+the journal writes and never hold up the caller.
+"""
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import timetable_store
+from timetable_model import upgrade
+
+
+JOURNAL_SUFFIX = ".journal"
+SNAPSHOT_SUFFIX = ".autosave" + timetable_store.BINARY_SUFFIX
+UNTITLED = os.path.join(os.path.expanduser("~"), ".smartshed", "untitled.json")
+LAST_FILE = os.path.join(os.path.expanduser("~"), ".smartshed", "last_file")
+
+
+def journal_path(path):
+    return path + JOURNAL_SUFFIX
+
+
+def snapshot_path(path):
+    return path + SNAPSHOT_SUFFIX
+
+
+def has_recovery(path):
+    return os.path.exists(journal_path(path)) or os.path.exists(snapshot_path(path))
+
+
+def remember(path):
+    """Note *path* as the file being followed, for ``pending_recovery``."""
+    os.makedirs(os.path.dirname(LAST_FILE), exist_ok=True)
+    with open(LAST_FILE, "w", encoding="utf-8") as f:
+        f.write(path)
+
+
+def pending_recovery():
+    """The file a crashed session left recovery files for, or None.
+
+    That is the last file followed, or ``UNTITLED`` for changes made before
+    any file was loaded or saved.
+    """
+    try:
+        with open(LAST_FILE, encoding="utf-8") as f:
+            last = f.read().strip()
+    except OSError:
+        last = None
+    for path in (last, UNTITLED):
+        if path and has_recovery(path):
+            return path
+    return None
+
+
+def discard(path):
+    for name in (journal_path(path), snapshot_path(path)):
+        try:
+            os.remove(name)
+        except FileNotFoundError:
+            pass
+
+
+def recover(path):
+    """The school dict for *path* with its snapshot and journal applied."""
+    if os.path.exists(snapshot_path(path)):
+        data = timetable_store.load(snapshot_path(path))
+    elif os.path.exists(path):
+        data = timetable_store.load(path)
+    else:
+        data = {}
+    if data and "format" not in data:
+        data = upgrade(data)
+    timetables = data.get("timetables", {})
+    lessons = data.setdefault("lessons", [])
+    codes = {tuple(lesson): code for code, lesson in enumerate(lessons, 1)}
+    room_cells = data.setdefault("room_cells", {})
+    try:
+        with open(journal_path(path), encoding="utf-8") as f:
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        lines = []
+    for line in lines:
+        try:
+            cells = json.loads(line)
+        except ValueError:
+            break  # torn final line from a crash mid-append
+        for grade, class_name, row, col, lesson, *room in cells:
+            rows = timetables.get(grade, {}).get(class_name)
+            if rows is None or row >= len(rows) or col >= len(rows[row]):
+                continue
+            rooms = room_cells.get(grade, {}).get(class_name)
+            if rooms is None and room and room[0]:
+                rooms = room_cells.setdefault(grade, {})[class_name] = [[0] * len(r) for r in rows]
+            if rooms is not None:
+                rooms[row][col] = room[0] if room else 0
+            if lesson:
+                lesson = tuple(lesson)
+                if lesson not in codes:
+                    lessons.append(list(lesson))
+                    codes[lesson] = len(lessons)
+                rows[row][col] = codes[lesson]
+            else:
+                rows[row][col] = 0
+    return data
+
+
+def _append(path, line):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(line + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _save(old_path, path, data):
+    timetable_store.save(path, data)
+    # The recovery files are only spent once the file itself is written.
+    if old_path != path:
+        discard(old_path)
+    discard(path)
+
+
+def _compact(path, data):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    timetable_store.save(snapshot_path(path), data)
+    # Only once the snapshot is in place may the journal it covers go.
+    try:
+        os.remove(journal_path(path))
+    except FileNotFoundError:
+        pass
+
+
+class Autosave:
+    def __init__(self, school, path=None, threshold=5000):
+        self.school = school
+        self.path = path or UNTITLED
+        self.threshold = threshold
+        self.pending = {}
+        self.journaled = 0
+        self.needs_snapshot = False
+        self.error = None
+        self._pool = ThreadPoolExecutor(max_workers=1)
+        school.listeners.append(self._on_cell)
+        school.hooks.append(self._on_change)
+
+    def _on_cell(self, timetable, row, col, old_id, new_id):
+        self.pending[(timetable, row, col)] = new_id
+
+    def _on_change(self, change):
+        if change[0] == "room_cell":
+            # Journaled with its cell, like a lesson edit.
+            _, timetable, row, col, _, _ = change
+            self.pending[(timetable, row, col)] = timetable.get_id(row, col)
+        else:
+            self.needs_snapshot = True
+
+    def mark_dirty(self):
+        """Snapshot everything on the next flush (after loads and week changes)."""
+        self.needs_snapshot = True
+
+    @property
+    def dirty(self):
+        return self.needs_snapshot or bool(self.pending)
+
+    def flush(self):
+        """Queue the changes since the last flush; the writing happens off this thread."""
+        if not self.dirty:
+            return
+        if self.needs_snapshot or self.journaled + len(self.pending) > self.threshold:
+            data = self.school.to_dict()
+            self.pending.clear()
+            self.needs_snapshot = False
+            self.journaled = 0
+            self._submit(_compact, self.path, data)
+            return
+        lesson_of = self.school.lesson_of
+        cells = [[timetable.grade, timetable.class_name, row, col, list(lesson_of(code)) if code else 0,
+                  timetable.get_room(row, col)]
+                 for (timetable, row, col), code in self.pending.items()]
+        self.pending.clear()
+        self.journaled += len(cells)
+        self._submit(_append, journal_path(self.path), json.dumps(cells, separators=(",", ":")))
+
+    def _submit(self, fn, *args):
+        self._pool.submit(fn, *args).add_done_callback(self._done)
+
+    def _done(self, future):
+        if future.exception() is not None:
+            self.error = future.exception()
+
+    def take_error(self):
+        error, self.error = self.error, None
+        return error
+
+    def save(self, path, data, done=None):
+        """Write *data* to *path* on the background thread and follow *path* from now on.
+
+        *data* must be a snapshot the caller no longer changes.  *done* is
+        called on the background thread with None, or the exception when the
+        file could not be written; the recovery files are kept in that case.
+        """
+        self.pending.clear()
+        self.journaled = 0
+        self.needs_snapshot = False
+        future = self._pool.submit(_save, self.path, path, data)
+        if done is not None:
+            future.add_done_callback(lambda future: done(future.exception()))
+        self._follow(path)
+
+    def reset(self, path, keep=False):
+        """Follow *path* from now on; its recovery files are dropped unless *keep* is set."""
+        self.pending.clear()
+        self.journaled = 0
+        self.needs_snapshot = keep
+        # Queued behind any write still in flight, so nothing is recreated afterwards.
+        if path != self.path:
+            self._pool.submit(discard, self.path)
+        if not keep:
+            self._pool.submit(discard, path)
+        self._follow(path)
+
+    def _follow(self, path):
+        if path != self.path:
+            self._submit(remember, path)
+        self.path = path
+
+    def close(self, discard_files=True):
+        self._pool.shutdown(wait=True)
+        if discard_files:
+            discard(self.path)
@@ -0,0 +1,305 @@
+"""Benchmarks for SmartShed's hot paths on synthetic schools.
+
+    python timetable_bench.py --grades 10 --sections 15 --output bench.json
+    python timetable_bench.py --compare bench.json --max-regression 1.5
+
+A school of N grades x M sections is generated with a realistic subject
+mix and rooms, filled by the generator, and the operations users wait on
+are timed through the real widgets: loading, drops with their conflict
+and room checks, the Filter and Absent dialogs, the teacher search box,
+teacher renames, and saving. Qt runs on the offscreen platform unless ``QT_QPA_PLATFORM`` says
+otherwise, so this works on headless machines. Results are written as JSON, and with
+``--compare`` each timing is set against an earlier run.
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import timetable_autosave
+import timetable_store
+from timetable_model import Room, School, Teacher
+from timetable_solver import apply_solution, snapshot, solve
+
+
+# Periods per week for each class; teachers are shared out in the same proportions.
+SUBJECT_MIX = {
+    "Math": 7, "English": 6, "Science": 6, "History": 4, "Geography": 3,
+    "Art": 2, "Music": 2, "Pe": 3, "Computing": 3, "French": 4,
+}
+
+# Subjects taught in special rooms, with the room name and the classes one room holds at once.
+ROOM_MIX = {"Science": ("Lab", 1), "Pe": ("Gym", 2), "Computing": ("ICT", 1)}
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def synthetic_school(grades, sections, teachers=None, seed=1):
+    """A filled School of *grades* x *sections* classes and about *teachers* teachers.
+
+    By default there are just enough teachers for every quota, each teaching
+    up to 38 periods a week, and a few more rooms than the lessons in
+    ``ROOM_MIX`` need.
+    """
+    rnd = random.Random(seed)
+    school = School()
+    classes = grades * sections
+    demand = {subject: periods * classes for subject, periods in SUBJECT_MIX.items()}
+    capacity = max(1, school.periods * len(school.days) - 2)
+    if teachers is None:
+        counts = {subject: -(-need // capacity) for subject, need in demand.items()}
+    else:
+        total = sum(demand.values())
+        counts = {subject: max(1, round(teachers * need / total)) for subject, need in demand.items()}
+    for subject, count in counts.items():
+        for i in range(count):
+            color = "#%02x%02x%02x" % (rnd.randrange(40, 200), rnd.randrange(40, 200), rnd.randrange(40, 200))
+            school.add_teacher(Teacher(f"{subject[:3]}{i + 1}", [subject], color))
+    slots = school.periods * len(school.days)
+    for subject, (name, holds) in ROOM_MIX.items():
+        for i in range(-(-demand[subject] // (slots * holds)) + 1):
+            school.add_room(Room(f"{name} {i + 1}", [subject], holds))
+    for g in range(1, grades + 1):
+        for x in range(sections):
+            class_name = f"{g}-{chr(65 + x % 26)}{x // 26 or ''}"
+            school.add_class(class_name)
+            school.subject_quotas[class_name] = dict(SUBJECT_MIX)
+    problem = snapshot(school, keep_existing=False)
+    apply_solution(school, problem, solve(problem, seed=seed, time_limit=5.0))
+    return school
+
+
+def load_gui(scratch):
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    # Keep the benchmark window away from the user's own crash-recovery files.
+    timetable_autosave.UNTITLED = os.path.join(scratch, "untitled.json")
+    timetable_autosave.LAST_FILE = os.path.join(scratch, "last_file")
+    spec = importlib.util.spec_from_file_location("smartshed", os.path.join(HERE, "SmartShed(v1.6).py"))
+    gui = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(gui)
+    app = gui.QApplication.instance() or gui.QApplication(sys.argv[:1])
+    # Conflict warnings and the like would block on a modal box.
+    for name in ("information", "warning", "critical"):
+        setattr(gui.QMessageBox, name, staticmethod(lambda *args, **kwargs: None))
+    gui.QMessageBox.question = staticmethod(lambda *args, **kwargs: gui.QMessageBox.StandardButton.No)
+    return gui, app
+
+
+def timed(fn, repeat, setup=None):
+    """Min and median seconds of *repeat* calls of *fn*, each after an untimed *setup*."""
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return {"runs": repeat, "min": min(times), "median": statistics.median(times)}
+
+
+def run(grades=10, sections=15, teachers=None, repeat=5, seed=1):
+    rnd = random.Random(seed)
+    started = time.perf_counter()
+    school = synthetic_school(grades, sections, teachers, seed)
+    data = school.to_dict()
+    results = {"generate_school": {"runs": 1, "min": time.perf_counter() - started,
+                                   "median": time.perf_counter() - started}}
+    results["model_load"] = timed(lambda: School.from_dict(data), repeat)
+
+    scratch = tempfile.mkdtemp(prefix="smartshed-bench-")
+    gui, app = load_gui(scratch)
+    from PyQt6.QtCore import QMimeData, QPointF
+    from PyQt6.QtGui import QDropEvent
+    window = gui.MainWindow()
+    window.autosave_timer.stop()
+    window.show()
+
+    def gui_load():
+        window.set_school_data(data)
+        app.processEvents()
+    results["gui_load"] = timed(gui_load, repeat)
+
+    # Drops: real QDropEvents onto shown tables. The generated school is full to its quotas,
+    # so a few classes are emptied and freed of quotas before each run, and every drop is
+    # planned to pass the checks: what is timed is accepted drops and their listeners.
+    school = window.school
+    first_grade = next(iter(window.all_tables))
+    window.materialize_grade(first_grade)
+    app.processEvents()
+    tables = list(window.all_tables[first_grade]["tables"].values())[:5]
+    saved = [(table.timetable, table.timetable.to_rows(), table.timetable.room_rows(),
+              school.subject_quotas.get(table.timetable.class_name)) for table in tables]
+
+    def empty_tables():
+        for timetable, _, _, _ in saved:
+            school.set_quota(timetable.class_name, None)
+            for row in range(timetable.rows):
+                for col in range(timetable.cols):
+                    timetable.clear(row, col)
+    empty_tables()
+    roomless = [school.code_of(tid, subject) for tid, teacher in window.teachers.items()
+                for subject in teacher.subjects if not school.rooms_for(subject)]
+    drops = []
+    for table in tables:
+        for row in range(table.timetable.rows):
+            for col in range(table.timetable.cols):
+                taken = {school.lesson_of(code)[0] for t, r, c, code in drops if (r, c) == (row, col)}
+                free = [code for code in roomless if not school.is_booked(school.lesson_of(code)[0], row, col)
+                        and school.lesson_of(code)[0] not in taken]
+                if free:
+                    drops.append((table, row, col, rnd.choice(free)))
+    events = []
+    for table, row, col, code in drops:
+        mime = QMimeData()
+        mime.setText(str(code))
+        pos = QPointF(table.visualRect(table.model().index(row, col)).center())
+        event = QDropEvent(pos, gui.Qt.DropAction.CopyAction, mime,
+                           gui.Qt.MouseButton.LeftButton, gui.Qt.KeyboardModifier.NoModifier)
+        events.append((table, event, mime))  # the event does not keep its mime data alive
+
+    def drop_all():
+        for table, event, _ in events:
+            table.dropEvent(event)
+    results["drop_200"] = timed(drop_all, repeat, empty_tables)
+    results["drop_200"]["accepted"] = sum(1 for timetable, _, _, _ in saved for code in timetable.cells if code)
+    empty_tables()
+    for timetable, rows, rooms, quota in saved:
+        timetable.load_rows(rows)
+        timetable.load_room_rows(rooms)
+        school.set_quota(timetable.class_name, quota)
+
+    filter_dialog = gui.FilterDialog(window.school, window)
+    def filter_all():
+        for subject in ("Any", "Math"):
+            for day in ("Any", window.school.days[0]):
+                for period in ("Any", "P3"):
+                    filter_dialog.subject_combo.setCurrentText(subject)
+                    filter_dialog.day_combo.setCurrentText(day)
+                    filter_dialog.period_combo.setCurrentText(period)
+                    filter_dialog.filter_teachers()
+    results["filter_dialog_8"] = timed(filter_all, repeat)
+
+    # The search box, typed into as a user would, with a typo at the end.
+    queries = ["m", "ma", "mat", "mat1", "sc", "scince", ""]
+    def search_all():
+        for query in queries:
+            window.teacher_search.setText(query)
+    results["teacher_search_7"] = timed(search_all, repeat)
+
+    absent_dialog = gui.AbsentTeacherDialog(window.school, window)
+    names = sorted({teacher.name for teacher in window.teachers.values()})[:10]
+    def absent_all():
+        for name in names:
+            absent_dialog.name_input.setText(name)
+            absent_dialog.day_combo.setCurrentText("Any")
+            absent_dialog.analyze_absent_teacher()
+    results["absent_analysis_10"] = timed(absent_all, repeat)
+
+    # Renames through the teacher list's edit dialog, for a teacher with lessons on screen,
+    # so the history, hooks and repaint of their cells are all timed.
+    code = next(code for code in tables[0].timetable.cells if code)
+    teacher = window.school.teacher_of(code)
+    teacher_list = window.teacher_list
+    index = next(teacher_list.model().index(row, 0) for row in range(teacher_list.model().rowCount())
+                 if teacher_list.model().index(row, 0).data(gui.Qt.ItemDataRole.UserRole) == code)
+    name = teacher.name
+
+    def rename_in_dialog(dialog):
+        dialog.name_input.setText(name + "x" if dialog.name_input.text() == name else name)
+        dialog.action = "modify"
+        return True
+    gui.TeacherEditDialog.exec = rename_in_dialog
+    def rename_twice():
+        for _ in range(2):
+            teacher_list.edit_teacher_dialog(index)
+            app.processEvents()
+    results["rename_teacher_2"] = timed(rename_twice, repeat)
+
+    # Saves through the menu action: the snapshot on the UI thread, then the write on the
+    # autosave thread, waited for here.
+    for suffix in (".json", timetable_store.BINARY_SUFFIX):
+        filename = os.path.join(scratch, "bench" + suffix)
+        gui.QFileDialog.getSaveFileName = staticmethod(lambda *args, filename=filename: (filename, ""))
+        def save():
+            window.save_data()
+            window.autosave._pool.submit(lambda: None).result()
+            app.processEvents()
+        results["save" + suffix.replace(".", "_")] = timed(save, repeat)
+        results["load" + suffix.replace(".", "_")] = timed(lambda: timetable_store.load(filename), repeat)
+
+    window.close()
+    shutil.rmtree(scratch, ignore_errors=True)
+    return results
+
+
+def revision():
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], cwd=HERE,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    """Median ratio new / old per benchmark present in both runs."""
+    old = baseline.get("results", {})
+    return {name: result["median"] / old[name]["median"]
+            for name, result in results.items() if old.get(name, {}).get("median")}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="timetable_bench", description="Time SmartShed's hot paths.")
+    parser.add_argument("--grades", type=int, default=10)
+    parser.add_argument("--sections", type=int, default=15)
+    parser.add_argument("--teachers", type=int, default=None, help="default: just enough for the quotas")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the JSON results here")
+    parser.add_argument("--compare", help="earlier results to compare against")
+    parser.add_argument("--max-regression", type=float, default=None,
+                        help="exit with status 1 if any median is this many times slower than --compare")
+    args = parser.parse_args(argv)
+
+    results = run(args.grades, args.sections, args.teachers, args.repeat, args.seed)
+    report = {
+        "revision": revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {"grades": args.grades, "sections": args.sections, "teachers": args.teachers,
+                   "repeat": args.repeat, "seed": args.seed},
+        "results": results
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=4)
+
+    ratios = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get("params") != report["params"]:
+            print(f"Note: {args.compare} was run with {baseline.get('params')}.", file=sys.stderr)
+        ratios = compare(results, baseline)
+    for name, result in results.items():
+        line = f"{name:<20} median {result['median'] * 1000:9.2f} ms   min {result['min'] * 1000:9.2f} ms"
+        if name in ratios:
+            line += f"   x{ratios[name]:.2f}"
+        print(line)
+
+    if args.max_regression and any(ratio > args.max_regression for ratio in ratios.values()):
+        print("Regression over the allowed limit.", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""Headless batch validation of SmartShed save files.
+
+Loads files written by ``MainWindow.save_data`` (JSON or binary) into the
+Qt-free ``School`` model, in parallel, and prints one machine-readable
+report per file::
+
+    python timetable_cli.py validate saves/*.json --jobs 8 > report.jsonl
+
+The exit status is 0 when every file is clean, 1 when any file has
+double-bookings (of teachers or rooms), cells naming an unknown teacher
+or could not be read.
+"""
+
+import argparse
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import timetable_store
+from timetable_model import DAYS, School
+
+
+def unknown_keys(data):
+    """Cells naming a teacher missing from the file's teacher list (loading drops these).
+
+    Cells are lesson codes, or "Name|Subject" keys in files from before teacher IDs.
+    """
+    teachers = data.get("teachers", {})
+    if "format" in data:
+        lessons = data.get("lessons", [])
+
+        def known(code):
+            if not 0 < code <= len(lessons):
+                return False
+            tid, subject = lessons[code - 1]
+            return subject in teachers.get(str(tid), {}).get("subjects", ())
+    else:
+        known = teachers.__contains__
+    days = data.get("week", {}).get("days", DAYS)
+    found = []
+    for grade, classes in data.get("timetables", {}).items():
+        for class_name, rows in classes.items():
+            for r, row in enumerate(rows):
+                for c, key in enumerate(row):
+                    if key and not known(key):
+                        found.append({"class": class_name, "day": days[c] if c < len(days) else c,
+                                      "period": r + 1, "key": key})
+    return found
+
+
+def validate_file(filename):
+    report = {"file": filename}
+    try:
+        data = timetable_store.load(filename)
+        school = School.from_dict(data)
+    except Exception as e:
+        report["error"] = f"{type(e).__name__}: {e}"
+        report["ok"] = False
+        return report
+
+    report["classes"] = sum(len(classes) for classes in school.grades.values())
+    report["teachers"] = len(school.teachers)
+    report["double_bookings"] = [
+        {"teacher": school.teachers[tid].name, "day": school.days[col], "period": row + 1, "classes": classes}
+        for tid, row, col, classes in school.double_bookings()
+    ]
+    report["room_clashes"] = [
+        {"room": school.rooms[rid].name, "day": school.days[col], "period": row + 1, "classes": classes}
+        for rid, row, col, classes in school.room_clashes()
+    ]
+    report["unknown_keys"] = unknown_keys(data)
+    loads = {}
+    for tid, teacher in school.teachers.items():
+        per_day = [int(n) for n in school.day_load[tid]]
+        loads[str(tid)] = {"name": teacher.name, "week": sum(per_day), "days": per_day}
+    report["teacher_loads"] = loads
+    report["ok"] = not report["double_bookings"] and not report["room_clashes"] and not report["unknown_keys"]
+    return report
+
+
+def validate(filenames, jobs=None):
+    if jobs == 1 or len(filenames) < 2:
+        return [validate_file(filename) for filename in filenames]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(validate_file, filenames, chunksize=4))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="timetable_cli", description="Headless SmartShed tools.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    check = commands.add_parser("validate", help="check saved timetables for clashes and unknown teachers")
+    check.add_argument("files", nargs="+")
+    check.add_argument("--jobs", type=int, default=None, help="worker processes (default: one per CPU)")
+    check.add_argument("--format", choices=["jsonl", "json"], default="jsonl")
+    check.add_argument("--output", help="write the report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    reports = validate(args.files, args.jobs)
+    out = open(args.output, "w") if args.output else sys.stdout
+    try:
+        if args.format == "json":
+            json.dump(reports, out, indent=4)
+            out.write("\n")
+        else:
+            for report in reports:
+                out.write(json.dumps(report) + "\n")
+    finally:
+        if args.output:
+            out.close()
+
+    failed = sum(1 for report in reports if not report["ok"])
+    print(f"{len(reports)} files checked, {failed} with problems.", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
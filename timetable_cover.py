@@ -0,0 +1,140 @@
+"""Cover planning for a day on which one or more teachers are absent.
+
+Every lesson of the absent teachers on that day is matched to a present
+teacher who is free in its period, as one min-cost flow over the whole
+day rather than period by period:
+
+    source -> lesson -> (substitute, period) -> substitute -> sink
+
+A substitute takes at most one lesson per period, and the k-th cover
+they are given costs their existing lessons that day plus k, so extra
+work is spread over the least loaded staff.  Cover by someone who does
+not teach the lesson's subject costs more than any same-subject choice,
+and leaving a lesson uncovered costs more than anything else.  The
+result is maximum cover first, then same-subject cover, then balance.
+"""
+
+from collections import deque
+
+import timetable_perf
+
+
+CROSS_SUBJECT = 1_000
+UNCOVERED = 1_000_000
+
+
+class Cover:
+    def __init__(self, timetable, row, absent_id, subject, substitute_id=None, cross_subject=False):
+        self.timetable = timetable
+        self.row = row
+        self.absent_id = absent_id
+        self.subject = subject
+        self.substitute_id = substitute_id      # None when nobody is free
+        self.cross_subject = cross_subject
+
+
+class _Flow:
+    """Successive shortest paths (SPFA) min-cost flow on small unit-capacity graphs."""
+
+    def __init__(self, nodes):
+        self.adj = [[] for _ in range(nodes)]
+        # Edge i: to, capacity, cost; edge i ^ 1 is its reverse.
+        self.to, self.cap, self.cost = [], [], []
+
+    def add(self, u, v, cap, cost):
+        self.adj[u].append(len(self.to))
+        self.to += [v, u]
+        self.cap += [cap, 0]
+        self.cost += [cost, -cost]
+        self.adj[v].append(len(self.to) - 1)
+
+    def run(self, source, sink):
+        to, cap, cost, adj = self.to, self.cap, self.cost, self.adj
+        while True:
+            dist = [None] * len(adj)
+            via = [-1] * len(adj)
+            queued = [False] * len(adj)
+            dist[source] = 0
+            queue = deque([source])
+            while queue:
+                u = queue.popleft()
+                queued[u] = False
+                for e in adj[u]:
+                    if cap[e] and (dist[to[e]] is None or dist[u] + cost[e] < dist[to[e]]):
+                        dist[to[e]] = dist[u] + cost[e]
+                        via[to[e]] = e
+                        if not queued[to[e]]:
+                            queued[to[e]] = True
+                            queue.append(to[e])
+            if dist[sink] is None:
+                return
+            v = sink
+            while v != source:
+                e = via[v]
+                cap[e] -= 1
+                cap[e ^ 1] += 1
+                v = to[e ^ 1]
+
+
+def plan_cover(school, absent_ids, col):
+    """A ``Cover`` for every lesson the teachers *absent_ids* give on day *col*."""
+    absent_ids = set(absent_ids)
+    lessons = []
+    for tid in absent_ids:
+        lessons.extend((timetable, row, tid, timetable.get(row, col)[1])
+                       for timetable, row, _ in school.slots_of(tid, [col]))
+    if not lessons:
+        return []
+
+    substitutes = [teacher for tid, teacher in school.teachers.items() if tid not in absent_ids]
+    day = school.occupancy[:, col, :]
+    load = [int(day[teacher.id].sum()) for teacher in substitutes]
+    busy = (day > 0) | school.blocked[:, col, :]
+    rows = sorted({row for _, row, _, _ in lessons})
+
+    # Node layout: source, sink, lessons, (substitute, period) pairs, substitutes.
+    source, sink = 0, 1
+    first_pair = 2 + len(lessons)
+    pair = {}
+    for s, teacher in enumerate(substitutes):
+        for row in rows:
+            if not busy[teacher.id, row]:
+                pair[s, row] = first_pair + len(pair)
+    first_sub = first_pair + len(pair)
+    flow = _Flow(first_sub + len(substitutes))
+
+    lesson_edges = []
+    for l, (timetable, row, _, subject) in enumerate(lessons):
+        flow.add(source, 2 + l, 1, 0)
+        edges = []
+        for s, teacher in enumerate(substitutes):
+            node = pair.get((s, row))
+            if node is not None:
+                edges.append((len(flow.to), s))
+                flow.add(2 + l, node, 1, 0 if subject in teacher.subjects else CROSS_SUBJECT)
+        flow.add(2 + l, sink, 1, UNCOVERED)
+        lesson_edges.append(edges)
+    for (s, row), node in pair.items():
+        flow.add(node, first_sub + s, 1, 0)
+    # Convex cost per extra cover: one parallel edge per possible cover.
+    periods_free = {}
+    for s, _ in pair:
+        periods_free[s] = periods_free.get(s, 0) + 1
+    for s, count in periods_free.items():
+        for k in range(1, count + 1):
+            flow.add(first_sub + s, sink, 1, load[s] + k)
+
+    timetable_perf.count(len(flow.to) // 2)
+    flow.run(source, sink)
+
+    covers = []
+    for (timetable, row, tid, subject), edges in zip(lessons, lesson_edges):
+        cover = Cover(timetable, row, tid, subject)
+        for e, s in edges:
+            if not flow.cap[e]:
+                cover.substitute_id = substitutes[s].id
+                cover.cross_subject = subject not in substitutes[s].subjects
+                break
+        covers.append(cover)
+    covers.sort(key=lambda cover: (cover.row, cover.timetable.order))
+    return covers
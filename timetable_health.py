@@ -0,0 +1,158 @@
+"""Running schedule-health counters for the SmartShed dashboard.
+
+``Health`` listens to a ``School`` and keeps, per edit and without
+rescanning the week:
+
+* the (teacher id, slot) pairs that are double-booked,
+* every teacher's lessons per day,
+* every class's periods per subject, to compare with its quota (these
+  counts are the school's own ``School.subject_counts``),
+* every teacher's idle gaps per day (free periods between their first
+  and last lesson).
+
+Room clashes and lessons still waiting for a room are read from the
+school's own per-slot room index when asked for.  A teacher edit
+recounts just that teacher, so renames and limit changes show at once.
+
+``version`` increases with every change so views can redraw lazily.
+"""
+
+import numpy as np
+
+
+class Health:
+    def __init__(self, school):
+        self.school = school
+        school.listeners.append(self._on_cell)
+        school.hooks.append(self._on_change)
+        self.version = 0
+        self.rebuild()
+
+    def rebuild(self):
+        """Recount from scratch; needed after a load or a change of week shape."""
+        school = self.school
+        self.clashes = set()
+        self.day_load = {}
+        self.gaps = {}
+        self.cols = len(school.days)
+        for timetable in school.timetables():
+            for idx, tid in enumerate(timetable.cells):
+                if tid:
+                    self._day(school.lesson_of(tid)[0])[idx % timetable.cols] += 1
+        for tid in self.day_load:
+            for col in range(len(school.days)):
+                self._update_gaps(tid, col)
+        for slot, booked in enumerate(school.slot_teachers):
+            self.clashes.update((tid, slot) for tid, count in booked.items() if count > 1)
+        self.version += 1
+
+    def _day(self, tid):
+        load = self.day_load.get(tid)
+        if load is None:
+            load = self.day_load[tid] = [0] * len(self.school.days)
+            self.gaps[tid] = [0] * len(self.school.days)
+        return load
+
+    def _update_gaps(self, tid, col):
+        taught = np.flatnonzero(self.school.occupancy[tid, col])
+        self.gaps[tid][col] = int(taught[-1] - taught[0] + 1 - len(taught)) if len(taught) else 0
+
+    def _on_cell(self, timetable, row, col, old_id, new_id):
+        school = self.school
+        if len(school.days) != self.cols:
+            # Mid-reshape (School.set_week); the owner rebuilds once it is done.
+            return
+        slot = row * len(school.days) + col
+        for code, delta in ((old_id, -1), (new_id, 1)):
+            if not code:
+                continue
+            tid = school.lesson_of(code)[0]
+            self._day(tid)[col] += delta
+            self._update_gaps(tid, col)
+            if school.slot_teachers[slot].get(tid, 0) > 1:
+                self.clashes.add((tid, slot))
+            else:
+                self.clashes.discard((tid, slot))
+        self.version += 1
+
+    def _on_change(self, change):
+        if change[0] == "teacher":
+            self._recount(change[1])
+        if change[0] in ("teacher", "class", "room", "room_cell", "quota", "limits", "unavailable"):
+            self.version += 1
+
+    def _recount(self, tid):
+        """Recount one teacher from the school's indexes after they were edited, removed or restored."""
+        school = self.school
+        if len(school.days) != self.cols:
+            return
+        self.day_load.pop(tid, None)
+        self.gaps.pop(tid, None)
+        self.clashes = {clash for clash in self.clashes if clash[0] != tid}
+        slots = school.teacher_slots.get(tid)
+        if not slots:
+            return
+        load = self._day(tid)
+        for col in range(self.cols):
+            load[col] = int(school.occupancy[tid, col].sum())
+            self._update_gaps(tid, col)
+        self.clashes.update((tid, slot) for slot, count in slots.items() if count > 1)
+
+    # -- reports ----------------------------------------------------------------
+
+    def double_bookings(self):
+        """(teacher id, row, col, class names) for every double-booked slot."""
+        school = self.school
+        found = []
+        for tid, slot in sorted(self.clashes, key=lambda clash: (clash[1], clash[0])):
+            row, col = divmod(slot, len(school.days))
+            classes = [t.class_name for t in school.timetables()
+                       if t.get_id(row, col) and school.lesson_of(t.get_id(row, col))[0] == tid]
+            found.append((tid, row, col, classes))
+        return found
+
+    def loads(self):
+        """teacher id -> (lessons per week, lessons per day, idle gaps per week), busiest first."""
+        rows = {tid: (sum(days), list(days), sum(self.gaps[tid]))
+                for tid, days in self.day_load.items() if any(days)}
+        return dict(sorted(rows.items(), key=lambda item: -item[1][0]))
+
+    def limit_breaches(self):
+        """(teacher id, what, periods given, limit) for teachers over a limit in ``School.teacher_limits``."""
+        found = []
+        for tid, limits in sorted(self.school.teacher_limits.items()):
+            days = self.day_load.get(tid)
+            if not days:
+                continue
+            if limits.get("week") is not None and sum(days) > limits["week"]:
+                found.append((tid, "week", sum(days), limits["week"]))
+            if limits.get("day") is not None:
+                found.extend((tid, self.school.days[col], n, limits["day"])
+                             for col, n in enumerate(days) if n > limits["day"])
+        return found
+
+    def unavailable_lessons(self):
+        """(teacher id, row, col) for lessons booked in a slot their teacher is marked unavailable in."""
+        school = self.school
+        return [(tid, row, col) for tid, mask in sorted(school.unavailable.items())
+                for row, col in school.booked_slots(tid) if mask >> school.slot(row, col) & 1]
+
+    def room_clashes(self):
+        """(room id, row, col, class names) for every slot where a room holds more classes than it fits."""
+        return self.school.room_clashes()
+
+    def roomless_lessons(self):
+        """(class name, row, col, subject) for lessons in a subject that needs a room but have none."""
+        return [(timetable.class_name, row, col, timetable.get(row, col)[1])
+                for timetable, row, col in self.school.roomless_lessons()]
+
+    def quota_mismatches(self):
+        """(class name, subject, periods given, periods wanted) where a class is off its quota."""
+        found = []
+        for timetable, counts in self.school.subject_counts.items():
+            quota = self.school.subject_quotas.get(timetable.class_name, {})
+            for subject in sorted(set(quota) | {s for s, n in counts.items() if n and quota}):
+                if counts.get(subject, 0) != quota.get(subject, 0):
+                    found.append((timetable.class_name, subject, counts.get(subject, 0), quota.get(subject, 0)))
+        found.sort(key=lambda row: row[0])
+        return found
@@ -0,0 +1,216 @@
+"""Undo/redo for the SmartShed model.
+
+``History`` listens to a ``School`` and records what changed, not
+snapshots of the school: one ``(timetable, row, col, old_id, new_id)``
+delta per edited cell, plus the teacher, room booking, class, quota,
+load limit and availability changes reported through ``School.hooks``.
+Undoing walks a command's steps backwards, so its cost is proportional
+to the cells it touched, however large the school is.
+
+Edits made outside ``transaction`` become one command each.  Consecutive
+lesson edits with the same label that arrive within ``coalesce_seconds``
+merge, so a burst of drops undoes in one step; commands that change
+anything besides cells and their rooms (a teacher added, a class deleted)
+always stay steps of their own.  The total number of recorded
+steps is capped by ``max_steps``; the oldest commands are dropped first.
+"""
+
+import time
+from contextlib import contextmanager
+
+
+class Command:
+    def __init__(self, label):
+        self.label = label
+        self.steps = []
+        # (timetable, row, col) -> index into steps, so a cell edited twice keeps one delta
+        self._cells = {}
+        self.stamp = time.monotonic()
+
+    def __len__(self):
+        return len(self.steps)
+
+    def add_cell(self, timetable, row, col, old_id, new_id):
+        at = self._cells.get((timetable, row, col))
+        if at is not None:
+            step = self.steps[at]
+            self.steps[at] = (step[0], timetable, row, col, step[4], new_id)
+        else:
+            self._cells[(timetable, row, col)] = len(self.steps)
+            self.steps.append(("cell", timetable, row, col, old_id, new_id))
+
+    def add(self, change):
+        self.steps.append(change)
+
+    def merge(self, other):
+        for step in other.steps:
+            if step[0] == "cell":
+                self.add_cell(*step[1:])
+            else:
+                self.add(step)
+        self.stamp = other.stamp
+
+    def cells_only(self):
+        return all(step[0] in ("cell", "room_cell") for step in self.steps)
+
+    def teacher_ids(self):
+        return {step[1] for step in self.steps if step[0] == "teacher"}
+
+    def changes_classes(self):
+        return any(step[0] == "class" for step in self.steps)
+
+
+class History:
+    def __init__(self, school, max_steps=200_000, max_commands=500, coalesce_seconds=1.0):
+        self.school = school
+        self.max_steps = max_steps
+        self.max_commands = max_commands
+        self.coalesce_seconds = coalesce_seconds
+        self.undo_stack = []
+        self.redo_stack = []
+        self.steps = 0
+        # Called with (command, undone) after every undo or redo.
+        self.replayed = []
+        self._open = None
+        self._depth = 0
+        self._replaying = False
+        school.listeners.append(self._on_cell)
+        school.hooks.append(self._on_change)
+
+    # -- recording -----------------------------------------------------------
+
+    @contextmanager
+    def transaction(self, label, resume=None):
+        """Record every change made inside the block as one command.
+
+        *resume* is a command an earlier transaction yielded; while it is
+        still the newest on the undo stack the block adds to it instead, so
+        work finished later (a generator run) undoes together with its start.
+        """
+        if self._depth == 0:
+            if resume is not None and self.undo_stack and self.undo_stack[-1] is resume:
+                self.undo_stack.pop()
+                self.steps -= len(resume)
+                self._open = resume
+            else:
+                self._open = Command(label)
+        self._depth += 1
+        try:
+            yield self._open
+        finally:
+            self._depth -= 1
+            if self._depth == 0:
+                command, self._open = self._open, None
+                self._push(command)
+
+    def _on_cell(self, timetable, row, col, old_id, new_id):
+        if self._replaying:
+            return
+        if self._open is not None:
+            self._open.add_cell(timetable, row, col, old_id, new_id)
+        else:
+            command = Command("Edit")
+            command.add_cell(timetable, row, col, old_id, new_id)
+            self._push(command)
+
+    def _on_change(self, change):
+        if self._replaying:
+            return
+        if self._open is not None:
+            self._open.add(change)
+        else:
+            command = Command("Edit")
+            command.add(change)
+            self._push(command)
+
+    def _push(self, command):
+        if not command.steps:
+            return
+        self._drop(self.redo_stack)
+        last = self.undo_stack[-1] if self.undo_stack else None
+        if (last is not None and last.label == command.label and last.cells_only() and command.cells_only()
+                and command.stamp - last.stamp <= self.coalesce_seconds):
+            self.steps -= len(last)
+            last.merge(command)
+            self.steps += len(last)
+        else:
+            self.undo_stack.append(command)
+            self.steps += len(command)
+        # The newest command always stays, even if it alone is over budget.
+        while len(self.undo_stack) > 1 and (self.steps > self.max_steps
+                                            or len(self.undo_stack) > self.max_commands):
+            self.steps -= len(self.undo_stack.pop(0))
+
+    def _drop(self, stack):
+        self.steps -= sum(len(command) for command in stack)
+        stack.clear()
+
+    def clear(self):
+        self._drop(self.undo_stack)
+        self._drop(self.redo_stack)
+
+    # -- replay ----------------------------------------------------------------
+
+    @property
+    def can_undo(self):
+        return bool(self.undo_stack)
+
+    @property
+    def can_redo(self):
+        return bool(self.redo_stack)
+
+    def undo(self):
+        if not self.undo_stack:
+            return None
+        command = self.undo_stack.pop()
+        self._replay(reversed(command.steps), undo=True)
+        self.redo_stack.append(command)
+        for callback in self.replayed:
+            callback(command, True)
+        return command
+
+    def redo(self):
+        if not self.redo_stack:
+            return None
+        command = self.redo_stack.pop()
+        self._replay(command.steps, undo=False)
+        self.undo_stack.append(command)
+        for callback in self.replayed:
+            callback(command, False)
+        return command
+
+    def _replay(self, steps, undo):
+        school = self.school
+        self._replaying = True
+        try:
+            for step in steps:
+                kind = step[0]
+                if kind == "cell":
+                    _, timetable, row, col, old_id, new_id = step
+                    timetable.set_id(row, col, old_id if undo else new_id)
+                elif kind == "teacher":
+                    _, teacher_id, before, after = step
+                    school.put_teacher(teacher_id, before if undo else after)
+                elif kind == "room":
+                    _, room_id, before, after = step
+                    school.put_room(room_id, before if undo else after)
+                elif kind == "room_cell":
+                    _, timetable, row, col, old_room, new_room = step
+                    timetable.set_room(row, col, old_room if undo else new_room)
+                elif kind == "quota":
+                    _, class_name, before, after = step
+                    school.set_quota(class_name, before if undo else after)
+                elif kind == "limits":
+                    _, teacher_id, before, after = step
+                    school.set_limits(teacher_id, before if undo else after)
+                elif kind == "unavailable":
+                    _, teacher_id, before, after = step
+                    school.set_unavailable(teacher_id, before if undo else after)
+                else:
+                    _, timetable, added, position = step
+                    if added == undo:
+                        school.detach(timetable)
+                    else:
+                        school.attach(timetable, position)
+        finally:
+            self._replaying = False
@@ -0,0 +1,820 @@
+"""Qt-free timetable data model used by SmartShed.
+
+The widgets in ``SmartShed(v1.6).py`` are views over this model: every
+query (conflict checks, filters, absent analysis, saving) reads from the
+compact arrays kept here instead of walking ``QTableWidgetItem`` cells.
+
+A teacher is one person with a stable integer ``id`` and any number of
+subjects.  A cell holds a lesson code, an interned ``(teacher id, subject)``
+pair, so renaming a teacher or giving them another subject never touches
+the grids, and every index below is keyed by teacher ID.
+
+Rooms (labs, gyms) take lessons of given subjects, up to ``capacity``
+classes at once.  A cell may book one next to its lesson; bookings are
+indexed per slot the same way as teachers, so a room check on a drop is
+a dictionary lookup.
+"""
+
+import re
+from array import array
+from collections import Counter
+
+import numpy as np
+
+import timetable_perf
+
+
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+# Default week shape; each School can use its own (School.set_week).
+DAYS = WEEKDAYS[:5]
+PERIODS = 8
+
+EMPTY = 0
+# Save files before teacher IDs keyed teachers and cells by "Name|Subject" and had no "format".
+FORMAT = 2
+
+
+class Teacher:
+    def __init__(self, name, subjects, color, id=None):
+        self.id = id    # set by School.add_teacher; never changes afterwards
+        self.name = name
+        self.subjects = list(subjects)
+        self.color = color
+
+
+class Room:
+    def __init__(self, name, subjects, capacity=1, id=None):
+        self.id = id    # set by School.add_room
+        self.name = name
+        self.subjects = list(subjects)  # lessons of these subjects need one of the rooms that take them
+        self.capacity = capacity        # classes it holds at once
+
+
+def split_key(key):
+    name, subject = key.split("|", 1)
+    return name, subject
+
+
+def grade_of(class_name):
+    match = re.match(r"(\d+)", class_name)
+    return str(int(match.group(1))) if match else class_name
+
+
+def color_name(color):
+    # Teachers created by the GUI carry a QColor, headless ones a "#rrggbb" string.
+    return color if isinstance(color, str) else color.name()
+
+
+def upgrade(data):
+    """The save dict *data*, written before teacher IDs, in the current format.
+
+    Keys sharing a name become one teacher with all their subjects, in
+    file order; cells naming an unknown key are left empty, as they
+    always were on load.
+    """
+    ids, teachers, lessons, codes = {}, {}, [], {}
+    for key, tdata in data.get("teachers", {}).items():
+        name = tdata.get("name") or split_key(key)[0]
+        subject = tdata.get("subject") or split_key(key)[1]
+        tid = ids.setdefault(name, len(ids) + 1)
+        entry = teachers.setdefault(str(tid), {"name": name, "subjects": [], "color": tdata.get("color", "#3498db")})
+        if subject not in entry["subjects"]:
+            entry["subjects"].append(subject)
+        lessons.append([tid, subject])
+        codes[key] = len(lessons)
+    upgraded = dict(data)
+    upgraded["format"] = FORMAT
+    upgraded["teachers"] = teachers
+    upgraded["lessons"] = lessons
+    upgraded["timetables"] = {
+        grade: {class_name: [[codes.get(key, EMPTY) for key in row] for row in rows]
+                for class_name, rows in classes.items()}
+        for grade, classes in data.get("timetables", {}).items()
+    }
+    for field in ("limits", "unavailable"):
+        # Briefly keyed by teacher name before IDs existed.
+        upgraded[field] = {str(ids[name]): value for name, value in data.get(field, {}).items() if name in ids}
+    return upgraded
+
+
+def current_format(data):
+    """The save dict *data* in the current format; ValueError if a newer program wrote it."""
+    if "format" not in data:
+        return upgrade(data)
+    if data["format"] > FORMAT:
+        raise ValueError(f"Save format {data['format']} is newer than this program supports ({FORMAT}).")
+    return data
+
+
+class Timetable:
+    """Weekly grid of one class, stored as a flat array of lesson codes."""
+
+    def __init__(self, class_name, school, grade=None, order=0):
+        self.class_name = class_name
+        self.grade = grade or grade_of(class_name)
+        self.order = order
+        self.school = school
+        self.rows = school.periods
+        self.cols = len(school.days)
+        self.cells = array("i", [EMPTY]) * (self.rows * self.cols)
+        # Room ID per cell, EMPTY where the lesson has none.
+        self.rooms = array("i", [EMPTY]) * (self.rows * self.cols)
+
+    def index(self, row, col):
+        return row * self.cols + col
+
+    def get_id(self, row, col):
+        return self.cells[row * self.cols + col]
+
+    def get(self, row, col):
+        """The (teacher id, subject) taught at (row, col), or None."""
+        return self.school.lesson_of(self.cells[row * self.cols + col])
+
+    def set(self, row, col, lesson):
+        self.set_id(row, col, self.school.code_of(*lesson) if lesson else EMPTY)
+
+    def set_id(self, row, col, code):
+        idx = row * self.cols + col
+        old = self.cells[idx]
+        if old == code:
+            return
+        if self.rooms[idx]:
+            # A room is booked for one lesson; it goes with it.
+            self.set_room(row, col, EMPTY)
+        self.cells[idx] = code
+        self.school.cell_changed(self, row, col, old, code)
+
+    def clear(self, row, col):
+        self.set_id(row, col, EMPTY)
+
+    def get_room(self, row, col):
+        return self.rooms[row * self.cols + col]
+
+    def set_room(self, row, col, room_id):
+        idx = row * self.cols + col
+        old = self.rooms[idx]
+        if old == room_id:
+            return
+        self.rooms[idx] = room_id
+        self.school.room_changed(self, row, col, old, room_id)
+
+    def to_rows(self):
+        timetable_perf.count(len(self.cells))
+        cells = self.cells
+        return [cells[r * self.cols:(r + 1) * self.cols].tolist() for r in range(self.rows)]
+
+    def load_rows(self, data, codes=None):
+        """Fill the grid from rows of lesson codes, translated through *codes* when given.
+
+        Codes that are out of range, or whose teacher no longer teaches the
+        subject, are dropped, as the table widgets always did with unknown keys.
+        """
+        school = self.school
+        known = school.known_code
+        timetable_perf.count(len(self.cells))
+        for r in range(self.rows):
+            row = data[r] if r < len(data) else ()
+            for c in range(self.cols):
+                code = row[c] if c < len(row) else EMPTY
+                if codes is not None:
+                    code = codes[code] if 0 <= code < len(codes) else EMPTY
+                self.set_id(r, c, code if known(code) else EMPTY)
+
+    def room_rows(self):
+        rooms = self.rooms
+        return [rooms[r * self.cols:(r + 1) * self.cols].tolist() for r in range(self.rows)]
+
+    def load_room_rows(self, data):
+        """Book rooms from rows of room IDs; unknown rooms and rooms on empty cells are dropped."""
+        rooms = self.school.rooms
+        for r in range(min(self.rows, len(data))):
+            row = data[r]
+            for c in range(min(self.cols, len(row))):
+                if row[c] in rooms and self.cells[r * self.cols + c]:
+                    self.set_room(r, c, row[c])
+
+
+def _put_at(mapping, key, value, at):
+    """Set ``mapping[key] = value`` with *key* at index *at* (None: last), keeping the dict object."""
+    mapping[key] = value
+    if at is not None and at < len(mapping) - 1:
+        items = list(mapping.items())
+        items.insert(at, items.pop())
+        mapping.clear()
+        mapping.update(items)
+
+
+def _grown(counts, size):
+    """*counts* with at least *size* teacher rows, the new ones zero."""
+    grown = np.zeros((max(size, 2 * len(counts)),) + counts.shape[1:], dtype=counts.dtype)
+    grown[:len(counts)] = counts
+    return grown
+
+
+class School:
+    """All teachers and class timetables, independent of any widget."""
+
+    def __init__(self, days=None, periods=PERIODS):
+        self.days = list(days or DAYS)
+        self.periods = periods
+        # teacher id -> Teacher
+        self.teachers = {}
+        self.grades = {}
+        # class name -> {subject: periods per week}, used by the generator
+        self.subject_quotas = {}
+        # teacher id -> {"day": max periods per day, "week": max periods per week}
+        self.teacher_limits = {}
+        # teacher id -> bitmask of the slots they cannot teach in (bit row * days + col)
+        self.unavailable = {}
+        # room id -> Room
+        self.rooms = {}
+        self.listeners = []
+        # Called with ("teacher", teacher id, before, after), ("room", room id, before, after),
+        # ("room_cell", timetable, row, col, old room id, new room id),
+        # ("class", timetable, added, (grade index, class index)),
+        # ("quota", class name, before, after), ("limits", teacher id, before, after) or
+        # ("unavailable", teacher id, old mask, new mask) for every change that is not a lesson edit.
+        self.hooks = []
+        self._class_seq = 0
+        self._next_id = 1
+        self._next_room_id = 1
+        self._room_roster = None
+        # Lesson code -> (teacher id, subject), and back; code 0 is the empty cell.
+        self._lessons = [None]
+        self._codes = {}
+        self._teacher_codes = {}
+        self._roster = None
+        self._reset_indexes()
+
+    def _reset_indexes(self):
+        # Occupancy index: slot -> {teacher id: classes booked}, and back.
+        self.slot_teachers = [{} for _ in range(self.periods * len(self.days))]
+        self.teacher_slots = {}
+        # Lessons per (teacher id, day, period), for vectorized roster queries.
+        capacity = max(16, 2 * self._next_id)
+        self.occupancy = np.zeros((capacity, len(self.days), self.periods), dtype=np.uint16)
+        # Lessons per (teacher id, day) and per class and subject, kept for the limit checks.
+        self.day_load = np.zeros((capacity, len(self.days)), dtype=np.int32)
+        self.subject_counts = {}
+        # The unavailability masks as a teacher id x days x periods array, for roster-wide queries.
+        self.blocked = np.zeros((capacity, len(self.days), self.periods), dtype=bool)
+        for tid, mask in self.unavailable.items():
+            self.blocked[tid] = self._mask_grid(mask)
+        # Reverse index: lesson code -> {(timetable, row, col)} of the cells showing it.
+        self.cells_of = {}
+        # Room bookings, indexed like the teachers': slot -> {room id: classes}, room id -> cells.
+        self.slot_rooms = [{} for _ in range(self.periods * len(self.days))]
+        self.room_cells = {}
+
+    def set_week(self, days, periods):
+        """Reshape every timetable to *days* x *periods*, keeping the cells that still fit."""
+        grids = [(timetable, timetable.to_rows(), timetable.room_rows()) for timetable in self.timetables()]
+        old_days = len(self.days)
+        masks = {tid: [divmod(slot, old_days) for slot in range(mask.bit_length()) if mask >> slot & 1]
+                 for tid, mask in self.unavailable.items()}
+        self.days = list(days)
+        self.periods = periods
+        self.unavailable = {}
+        for tid, cells in masks.items():
+            mask = sum(1 << self.slot(row, col) for row, col in cells if row < periods and col < len(self.days))
+            if mask:
+                self.unavailable[tid] = mask
+        self._reset_indexes()
+        for timetable, rows, rooms in grids:
+            timetable.rows, timetable.cols = periods, len(self.days)
+            timetable.cells = array("i", [EMPTY]) * (timetable.rows * timetable.cols)
+            timetable.rooms = array("i", [EMPTY]) * (timetable.rows * timetable.cols)
+            timetable.load_rows(rows)
+            timetable.load_room_rows(rooms)
+
+    # -- lesson codes ---------------------------------------------------------
+
+    def code_of(self, teacher_id, subject):
+        """The lesson code of *teacher_id* teaching *subject*, allocated on first use."""
+        code = self._codes.get((teacher_id, subject))
+        if code is None:
+            code = len(self._lessons)
+            self._codes[teacher_id, subject] = code
+            self._lessons.append((teacher_id, subject))
+            self._teacher_codes.setdefault(teacher_id, []).append(code)
+        return code
+
+    def lesson_of(self, code):
+        return self._lessons[code]
+
+    def teacher_of(self, code):
+        """The Teacher giving lesson *code*, or None for an empty cell or a removed teacher."""
+        return self.teachers.get(self._lessons[code][0]) if code else None
+
+    def known_code(self, code):
+        """True if *code* is empty or a lesson its teacher still teaches."""
+        if not code:
+            return True
+        if code >= len(self._lessons):
+            return False
+        tid, subject = self._lessons[code]
+        teacher = self.teachers.get(tid)
+        return teacher is not None and subject in teacher.subjects
+
+    def _ensure_capacity(self, tid):
+        if tid >= len(self.occupancy):
+            self.occupancy = _grown(self.occupancy, tid + 1)
+            self.day_load = _grown(self.day_load, tid + 1)
+            self.blocked = _grown(self.blocked, tid + 1)
+
+    # -- classes ------------------------------------------------------------
+
+    def add_class(self, class_name, grade=None):
+        grade = grade or grade_of(class_name)
+        classes = self.grades.setdefault(grade, {})
+        if class_name in classes:
+            return None
+        self._class_seq += 1
+        timetable = Timetable(class_name, self, grade, self._class_seq)
+        self.attach(timetable)
+        return timetable
+
+    def remove_class(self, class_name, grade=None):
+        grade = grade or grade_of(class_name)
+        classes = self.grades.get(grade, {})
+        timetable = classes.get(class_name)
+        if timetable is None:
+            return None
+        for r in range(timetable.rows):
+            for c in range(timetable.cols):
+                timetable.clear(r, c)
+        self.detach(timetable)
+        self.set_quota(class_name, None)
+        return timetable
+
+    def set_quota(self, class_name, quota):
+        """Set the periods per subject *class_name* needs each week (None or {} drops them)."""
+        before = self.subject_quotas.get(class_name)
+        if quota:
+            self.subject_quotas[class_name] = quota
+        else:
+            self.subject_quotas.pop(class_name, None)
+        if before != (quota or None):
+            self._notify(("quota", class_name, before, quota or None))
+
+    def attach(self, timetable, position=None):
+        """Put an existing (e.g. previously removed) timetable back into its grade.
+
+        *position* is the (grade index, class index) it had, as reported when
+        it was detached; without it the class, and a new grade, go last.
+        """
+        grade_at, class_at = position or (None, None)
+        if timetable.grade not in self.grades:
+            _put_at(self.grades, timetable.grade, {}, grade_at)
+        classes = self.grades[timetable.grade]
+        _put_at(classes, timetable.class_name, timetable, class_at)
+        self.subject_counts.setdefault(timetable, Counter())
+        self._notify(("class", timetable, True, self._position(timetable)))
+
+    def detach(self, timetable):
+        position = self._position(timetable)
+        classes = self.grades[timetable.grade]
+        del classes[timetable.class_name]
+        if not classes:
+            del self.grades[timetable.grade]
+        self.subject_counts.pop(timetable, None)
+        self._notify(("class", timetable, False, position))
+
+    def _position(self, timetable):
+        grade = timetable.grade
+        return list(self.grades).index(grade), list(self.grades[grade]).index(timetable.class_name)
+
+    def timetable(self, class_name, grade=None):
+        return self.grades.get(grade or grade_of(class_name), {}).get(class_name)
+
+    def timetables(self):
+        for classes in self.grades.values():
+            yield from classes.values()
+
+    def class_names(self):
+        return sorted(name for classes in self.grades.values() for name in classes)
+
+    def clear(self):
+        self.teachers.clear()
+        self.grades.clear()
+        self.subject_quotas.clear()
+        self.teacher_limits.clear()
+        self.unavailable.clear()
+        self.rooms.clear()
+        self._next_id = 1
+        self._next_room_id = 1
+        self._room_roster = None
+        del self._lessons[1:]
+        self._codes.clear()
+        self._teacher_codes.clear()
+        self._roster = None
+        self._reset_indexes()
+
+    # -- teachers -----------------------------------------------------------
+
+    def add_teacher(self, teacher):
+        """Store a new *teacher*, giving them the next free ID unless they carry one."""
+        if teacher.id is None:
+            teacher.id = self._next_id
+        self._next_id = max(self._next_id, teacher.id + 1)
+        self.put_teacher(teacher.id, teacher)
+        return teacher
+
+    def put_teacher(self, teacher_id, teacher):
+        """Store *teacher* under *teacher_id*, or drop the entry when *teacher* is None."""
+        before = self.teachers.get(teacher_id)
+        if teacher is None:
+            self.teachers.pop(teacher_id, None)
+        else:
+            self.teachers[teacher_id] = teacher
+            self._ensure_capacity(teacher_id)
+        self._roster = None
+        if before is not teacher:
+            self._notify(("teacher", teacher_id, before, teacher))
+
+    def update_teacher(self, teacher):
+        """Replace the teacher with *teacher*'s ID; returns every cell still showing them.
+
+        Only lessons in subjects they no longer teach are cleared; a rename or a
+        new colour leaves the grids as they are.
+        """
+        for subject in set(self.teachers[teacher.id].subjects) - set(teacher.subjects):
+            code = self._codes.get((teacher.id, subject))
+            for timetable, row, col in list(self.cells_of.get(code, ())):
+                timetable.clear(row, col)
+        self.put_teacher(teacher.id, teacher)
+        return self.slots_of(teacher.id)
+
+    def remove_teacher(self, teacher_id):
+        cleared = self.slots_of(teacher_id)
+        for timetable, row, col in cleared:
+            timetable.clear(row, col)
+        self.put_teacher(teacher_id, None)
+        return cleared
+
+    def teachers_named(self, name):
+        return [teacher for teacher in self.teachers.values() if teacher.name == name]
+
+    # -- rooms --------------------------------------------------------------
+
+    def add_room(self, room):
+        """Store a new *room*, giving it the next free ID unless it carries one."""
+        if room.id is None:
+            room.id = self._next_room_id
+        self._next_room_id = max(self._next_room_id, room.id + 1)
+        self.put_room(room.id, room)
+        return room
+
+    def put_room(self, room_id, room):
+        """Store *room* under *room_id*, or drop the entry when *room* is None."""
+        before = self.rooms.get(room_id)
+        if room is None:
+            self.rooms.pop(room_id, None)
+        else:
+            self.rooms[room_id] = room
+        self._room_roster = None
+        if before is not room:
+            self._notify(("room", room_id, before, room))
+
+    def update_room(self, room):
+        """Replace the room with *room*'s ID; lessons in subjects it no longer takes lose it."""
+        for timetable, row, col in list(self.room_cells.get(room.id, ())):
+            if timetable.get(row, col)[1] not in room.subjects:
+                timetable.set_room(row, col, EMPTY)
+        self.put_room(room.id, room)
+
+    def remove_room(self, room_id):
+        for timetable, row, col in list(self.room_cells.get(room_id, ())):
+            timetable.set_room(row, col, EMPTY)
+        self.put_room(room_id, None)
+
+    def rooms_for(self, subject):
+        """The rooms that take *subject*; a subject no room takes needs none."""
+        if self._room_roster is None:
+            roster = {}
+            for room in self.rooms.values():
+                for taken in room.subjects:
+                    roster.setdefault(taken, []).append(room)
+            self._room_roster = roster
+        return self._room_roster.get(subject, ())
+
+    def free_room(self, subject, row, col, current=EMPTY):
+        """ID of a room for *subject* with a place left at (row, col), or None if every one is full.
+
+        *current*, the room the cell already holds, is kept when it takes the subject.
+        """
+        booked = self.slot_rooms[row * len(self.days) + col]
+        for room in self.rooms_for(subject):
+            if room.id == current:
+                return room.id
+        for room in self.rooms_for(subject):
+            timetable_perf.count(1)
+            if booked.get(room.id, 0) < room.capacity:
+                return room.id
+        return None
+
+    # -- availability ---------------------------------------------------------
+
+    def slot(self, row, col):
+        return row * len(self.days) + col
+
+    def _mask_grid(self, mask):
+        bits = [mask >> slot & 1 for slot in range(self.periods * len(self.days))]
+        return np.array(bits, dtype=bool).reshape(self.periods, len(self.days)).T
+
+    def set_unavailable(self, teacher_id, mask):
+        """Mark the slots set in *mask* as ones the teacher cannot teach in (0 makes them always available)."""
+        before = self.unavailable.get(teacher_id, 0)
+        self._block(teacher_id, mask)
+        if before != mask:
+            self._notify(("unavailable", teacher_id, before, mask))
+
+    def _block(self, teacher_id, mask):
+        if mask:
+            self.unavailable[teacher_id] = mask
+        else:
+            self.unavailable.pop(teacher_id, None)
+        self._ensure_capacity(teacher_id)
+        self.blocked[teacher_id] = self._mask_grid(mask)
+
+    def is_unavailable(self, teacher_id, row, col):
+        return bool(self.unavailable.get(teacher_id, 0) >> self.slot(row, col) & 1)
+
+    # -- change notification -------------------------------------------------
+
+    def cell_changed(self, timetable, row, col, old_code, new_code):
+        slot = row * len(self.days) + col
+        counts = self.subject_counts.setdefault(timetable, Counter())
+        if old_code:
+            tid, subject = self._lessons[old_code]
+            self._unbook(tid, slot)
+            self.occupancy[tid, col, row] -= 1
+            self.day_load[tid, col] -= 1
+            counts[subject] -= 1
+            cells = self.cells_of[old_code]
+            cells.discard((timetable, row, col))
+            if not cells:
+                del self.cells_of[old_code]
+        if new_code:
+            tid, subject = self._lessons[new_code]
+            self._book(tid, slot)
+            self.occupancy[tid, col, row] += 1
+            self.day_load[tid, col] += 1
+            counts[subject] += 1
+            self.cells_of.setdefault(new_code, set()).add((timetable, row, col))
+        for listener in self.listeners:
+            listener(timetable, row, col, old_code, new_code)
+
+    def room_changed(self, timetable, row, col, old_room, new_room):
+        booked = self.slot_rooms[row * len(self.days) + col]
+        if old_room:
+            if booked[old_room] == 1:
+                del booked[old_room]
+            else:
+                booked[old_room] -= 1
+            cells = self.room_cells[old_room]
+            cells.discard((timetable, row, col))
+            if not cells:
+                del self.room_cells[old_room]
+        if new_room:
+            booked[new_room] = booked.get(new_room, 0) + 1
+            self.room_cells.setdefault(new_room, set()).add((timetable, row, col))
+        self._notify(("room_cell", timetable, row, col, old_room, new_room))
+
+    def _notify(self, change):
+        for hook in self.hooks:
+            hook(change)
+
+    def _book(self, tid, slot):
+        booked = self.slot_teachers[slot]
+        booked[tid] = booked.get(tid, 0) + 1
+        slots = self.teacher_slots.setdefault(tid, {})
+        slots[slot] = slots.get(slot, 0) + 1
+
+    def _unbook(self, tid, slot):
+        booked = self.slot_teachers[slot]
+        if booked[tid] == 1:
+            del booked[tid]
+        else:
+            booked[tid] -= 1
+        slots = self.teacher_slots[tid]
+        if slots[slot] == 1:
+            del slots[slot]
+            if not slots:
+                del self.teacher_slots[tid]
+        else:
+            slots[slot] -= 1
+
+    # -- queries --------------------------------------------------------------
+
+    def is_booked(self, teacher_id, row, col):
+        """True if the teacher already teaches any class at (row, col)."""
+        timetable_perf.count(1)
+        return teacher_id in self.slot_teachers[row * len(self.days) + col]
+
+    def set_limits(self, teacher_id, limits):
+        """Cap the teacher's periods per day and week ({"day": n, "week": n}; None or {} lifts both)."""
+        before = self.teacher_limits.get(teacher_id)
+        if limits:
+            self.teacher_limits[teacher_id] = limits
+        else:
+            self.teacher_limits.pop(teacher_id, None)
+        if before != (limits or None):
+            self._notify(("limits", teacher_id, before, limits or None))
+
+    def limit_problem(self, timetable, row, col, code):
+        """Why putting lesson *code* at (row, col) would break a subject quota or load limit, else None.
+
+        Only the running counters are read, so this is as cheap as ``is_booked``.
+        """
+        old_code = timetable.get_id(row, col)
+        if old_code == code:
+            return None
+        tid, subject = self._lessons[code]
+        old_tid, old_subject = self._lessons[old_code] if old_code else (None, None)
+        wanted = self.subject_quotas.get(timetable.class_name, {}).get(subject)
+        if wanted is not None:
+            given = self.subject_counts.get(timetable, {}).get(subject, 0)
+            if old_subject == subject:
+                given -= 1
+            if given >= wanted:
+                return f"{timetable.class_name} already has its full {subject} quota ({wanted} per week)."
+        limits = self.teacher_limits.get(tid)
+        if limits:
+            name = self.teachers[tid].name
+            load = self.day_load[tid]
+            replaced = 1 if old_tid == tid else 0
+            day, week = int(load[col]) - replaced, int(load.sum()) - replaced
+            if limits.get("day") is not None and day >= limits["day"]:
+                return f"{name} is already at their daily limit ({limits['day']}) on {self.days[col]}."
+            if limits.get("week") is not None and week >= limits["week"]:
+                return f"{name} is already at their weekly limit ({limits['week']})."
+        return None
+
+    def booked_slots(self, teacher_id):
+        """Sorted (row, col) pairs at which the teacher teaches."""
+        return [divmod(slot, len(self.days)) for slot in sorted(self.teacher_slots.get(teacher_id, ()))]
+
+    def double_bookings(self):
+        """(teacher id, row, col, class names) for every slot where a teacher is booked more than once."""
+        found = []
+        for slot, booked in enumerate(self.slot_teachers):
+            for tid, count in booked.items():
+                if count > 1:
+                    row, col = divmod(slot, len(self.days))
+                    classes = [t.class_name for t in self.timetables()
+                               if t.get_id(row, col) and self._lessons[t.get_id(row, col)][0] == tid]
+                    found.append((tid, row, col, classes))
+        return found
+
+    def room_clashes(self):
+        """(room id, row, col, class names) for every slot where a room holds more classes than it fits."""
+        found = []
+        for slot, booked in enumerate(self.slot_rooms):
+            for room_id, count in booked.items():
+                if count > self.rooms[room_id].capacity:
+                    row, col = divmod(slot, len(self.days))
+                    classes = sorted(t.class_name for t, r, c in self.room_cells[room_id] if (r, c) == (row, col))
+                    found.append((room_id, row, col, classes))
+        return found
+
+    def roomless_lessons(self):
+        """(timetable, row, col) of every lesson in a subject that needs a room but has none."""
+        found = []
+        for code, cells in self.cells_of.items():
+            if self.rooms_for(self._lessons[code][1]):
+                found.extend(cell for cell in cells if not cell[0].get_room(cell[1], cell[2]))
+        return sorted(found, key=lambda cell: (cell[0].order, cell[1], cell[2]))
+
+    def free_rooms(self, rows, cols, subject=None):
+        """IDs of rooms with a place left in every (row, col) slot, optionally only those taking *subject*."""
+        days = len(self.days)
+        rooms = self.rooms_for(subject) if subject is not None else self.rooms.values()
+        return [room.id for room in rooms
+                if all(self.slot_rooms[r * days + c].get(room.id, 0) < room.capacity for r in rows for c in cols)]
+
+    def roster(self):
+        """Teacher IDs as an array, with {subject: bool array, True for each teacher of it}."""
+        if self._roster is None:
+            ids = np.array(list(self.teachers), dtype=np.intp)
+            by_subject = {}
+            for i, teacher in enumerate(self.teachers.values()):
+                for subject in teacher.subjects:
+                    by_subject.setdefault(subject, np.zeros(len(ids), dtype=bool))[i] = True
+            self._roster = (ids, by_subject)
+        return self._roster
+
+    def availability(self, subject=None):
+        """Roster teacher IDs and a teachers x days x periods array, True where the teacher is free.
+
+        A teacher is busy in every slot they teach any class in, whatever the
+        subject, and in every slot of their unavailability mask.
+        """
+        ids, by_subject = self.roster()
+        free = (self.occupancy[ids] == 0) & ~self.blocked[ids]
+        timetable_perf.count(free.size)
+        if subject is not None:
+            teaches = by_subject.get(subject)
+            free &= (teaches if teaches is not None else np.zeros(len(ids), dtype=bool))[:, None, None]
+        return ids.tolist(), free
+
+    def free_teachers(self, rows, cols, subject=None):
+        """IDs of teachers free in every (row, col) slot, optionally only those teaching *subject*."""
+        ids, free = self.availability(subject)
+        mask = free[np.ix_(range(len(ids)), list(cols), list(rows))].all(axis=(1, 2))
+        return [ids[i] for i in np.flatnonzero(mask)]
+
+    def slots_of(self, teacher_id, cols=None):
+        """(timetable, row, col) for every cell the teacher teaches, in any subject."""
+        cells = [cell for code in self._teacher_codes.get(teacher_id, ()) for cell in self.cells_of.get(code, ())]
+        timetable_perf.count(len(cells))
+        if cols is not None:
+            cols = set(cols)
+            cells = [cell for cell in cells if cell[2] in cols]
+        return sorted(cells, key=lambda cell: (cell[0].order, cell[1], cell[2]))
+
+    def teacher_week(self, teacher_id):
+        """Periods x days grid of [(class name, subject)] for the teacher."""
+        grid = [[[] for _ in self.days] for _ in range(self.periods)]
+        for timetable, row, col in self.slots_of(teacher_id):
+            grid[row][col].append((timetable.class_name, timetable.get(row, col)[1]))
+        return grid
+
+    # -- (de)serialisation ---------------------------------------------------
+
+    def to_dict(self):
+        data = {
+            "format": FORMAT,
+            "teachers": {},
+            # Cell value i refers to lessons[i - 1]: [teacher id, subject].
+            "lessons": [list(lesson) for lesson in self._lessons[1:]],
+            "timetables": {},
+            "week": {"days": list(self.days), "periods": self.periods}
+        }
+        for tid, teacher in self.teachers.items():
+            data["teachers"][str(tid)] = {
+                "name": teacher.name,
+                "subjects": list(teacher.subjects),
+                "color": color_name(teacher.color)
+            }
+        for grade, classes in self.grades.items():
+            data["timetables"][grade] = {}
+            for class_name, timetable in classes.items():
+                data["timetables"][grade][class_name] = timetable.to_rows()
+        data["quotas"] = {name: dict(quota) for name, quota in self.subject_quotas.items() if quota}
+        data["limits"] = {str(tid): dict(limits) for tid, limits in self.teacher_limits.items()
+                          if limits and tid in self.teachers}
+        data["unavailable"] = {str(tid): mask for tid, mask in self.unavailable.items() if tid in self.teachers}
+        data["rooms"] = {str(rid): {"name": room.name, "subjects": list(room.subjects), "capacity": room.capacity}
+                         for rid, room in self.rooms.items()}
+        # Room IDs per cell, only for classes that have any.
+        data["room_cells"] = {}
+        for grade, classes in self.grades.items():
+            for class_name, timetable in classes.items():
+                if any(timetable.rooms):
+                    data["room_cells"].setdefault(grade, {})[class_name] = timetable.room_rows()
+        return data
+
+    def load_dict(self, data, make_color=str):
+        data = current_format(data)
+        week = data.get("week", {})
+        days = list(week.get("days", DAYS))
+        periods = int(week.get("periods", PERIODS))
+        # Nothing above touches the school, so a rejected file leaves it as it was.
+        self.days, self.periods = days, periods
+        self.clear()
+        for tid, tdata in data.get("teachers", {}).items():
+            teacher = Teacher(tdata["name"], tdata["subjects"], make_color(tdata.get("color", "#3498db")), int(tid))
+            self.teachers[teacher.id] = teacher
+            self._next_id = max(self._next_id, teacher.id + 1)
+            self._ensure_capacity(teacher.id)
+        for rid, rdata in data.get("rooms", {}).items():
+            room = Room(rdata["name"], rdata.get("subjects", []), int(rdata.get("capacity", 1)), int(rid))
+            self.rooms[room.id] = room
+            self._next_room_id = max(self._next_room_id, room.id + 1)
+        codes = [EMPTY] + [self.code_of(tid, subject) for tid, subject in data.get("lessons", [])]
+        for grade, classes in data.get("timetables", {}).items():
+            for class_name, rows in classes.items():
+                timetable = self.add_class(class_name, grade)
+                if timetable is not None:
+                    timetable.load_rows(rows, codes)
+        for grade, classes in data.get("room_cells", {}).items():
+            for class_name, rows in classes.items():
+                timetable = self.timetable(class_name, grade)
+                if timetable is not None:
+                    timetable.load_room_rows(rows)
+        for class_name, quota in data.get("quotas", {}).items():
+            self.subject_quotas[class_name] = {subject: int(n) for subject, n in quota.items()}
+        for tid, limits in data.get("limits", {}).items():
+            limits = {kind: int(n) for kind, n in limits.items() if kind in ("day", "week")}
+            if int(tid) in self.teachers and limits:
+                self.teacher_limits[int(tid)] = limits
+        for tid, mask in data.get("unavailable", {}).items():
+            if int(tid) in self.teachers:
+                self._block(int(tid), int(mask))
+
+    @classmethod
+    def from_dict(cls, data, make_color=str):
+        school = cls()
+        school.load_dict(data, make_color)
+        return school
@@ -0,0 +1,128 @@
+"""Opt-in timing of SmartShed's hot paths.
+
+Wrap an operation in ``timed`` or decorate it with ``instrument``; either
+costs one flag test while timing is off.  Work finished on another thread
+is measured there and handed to ``record`` on the UI thread::
+
+    @timetable_perf.instrument("drop")
+    def dropEvent(self, event):
+        timetable_perf.count(1)   # cells (or roster entries) examined
+        ...
+
+While on (``SMARTSHED_PROFILE=1`` or the checkbox in the stats panel),
+every operation adds to per-name totals, and any operation slower than
+``threshold`` seconds is kept in ``recent`` and appended, as one JSON
+line with its duration, cells scanned and school size, to a rotating
+log (``~/.smartshed/perf.log``, three backups of 1 MB).
+"""
+
+import json
+import logging
+import logging.handlers
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+
+LOG_PATH = os.path.join(os.path.expanduser("~"), ".smartshed", "perf.log")
+
+
+class Recorder:
+    def __init__(self, threshold=0.05, log_path=LOG_PATH, max_bytes=1_000_000, backups=3):
+        self.enabled = os.environ.get("SMARTSHED_PROFILE") == "1"
+        self.threshold = threshold
+        self.log_path = log_path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.school = None
+        # name -> [calls, total seconds, slowest seconds]
+        self.stats = {}
+        self.recent = deque(maxlen=200)
+        self._open = []
+        self._logger = None
+
+    @contextmanager
+    def timed(self, name, cells=0):
+        """Time the block; the yielded dict's "cells" may be updated from inside it."""
+        if not self.enabled:
+            yield {}
+            return
+        entry = {"op": name, "cells": cells}
+        self._open.append(entry)
+        started = time.perf_counter()
+        try:
+            yield entry
+        finally:
+            self._open.pop()
+            self.record(entry, time.perf_counter() - started)
+
+    def count(self, cells):
+        if self._open:
+            self._open[-1]["cells"] += cells
+
+    def record(self, entry, seconds):
+        stats = self.stats.setdefault(entry["op"], [0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += seconds
+        stats[2] = max(stats[2], seconds)
+        if seconds < self.threshold:
+            return
+        entry["seconds"] = round(seconds, 6)
+        entry["time"] = time.strftime("%Y-%m-%d %H:%M:%S")
+        if self.school is not None:
+            entry["classes"] = sum(len(classes) for classes in self.school.grades.values())
+            entry["teachers"] = len(self.school.teachers)
+        self.recent.append(entry)
+        try:
+            self.logger().info(json.dumps(entry))
+        except OSError:
+            pass  # an unwritable log must never break the operation being timed
+
+    def logger(self):
+        if self._logger is None:
+            os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+            handler = logging.handlers.RotatingFileHandler(
+                self.log_path, maxBytes=self.max_bytes, backupCount=self.backups, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger = logging.getLogger("smartshed.perf")
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            logger.addHandler(handler)
+            self._logger = logger
+        return self._logger
+
+    def reset(self):
+        self.stats.clear()
+        self.recent.clear()
+
+
+recorder = Recorder()
+
+
+def timed(name, cells=0):
+    return recorder.timed(name, cells)
+
+
+def record(name, seconds, cells=0):
+    """Record an operation that was timed elsewhere, such as a write on a worker thread."""
+    if recorder.enabled:
+        recorder.record({"op": name, "cells": cells}, seconds)
+
+
+def count(cells):
+    """Add *cells* to the innermost operation being timed, if any."""
+    recorder.count(cells)
+
+
+def instrument(name):
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not recorder.enabled:
+                return fn(*args, **kwargs)
+            with recorder.timed(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
@@ -0,0 +1,105 @@
+"""As-you-type teacher search for SmartShed's teacher list.
+
+``TeacherIndex`` listens to a ``School`` and keeps, for every lesson code
+in the roster (one per teacher and subject), the words of the teacher's
+name and of the subject in two inverted indexes:
+
+* every prefix of every word, so a query word is one dict lookup however
+  short it is;
+* the padded trigrams of every word (``"  j", " jo", "joh", ...``), so a
+  query word of four or more letters that is no word's prefix, most
+  likely a typo, still finds the words sharing half of its trigrams.
+
+A query matches a lesson when each of its words does.  Teacher changes
+update only that teacher's entries; a load needs ``rebuild``.
+"""
+
+import re
+from collections import Counter
+
+
+FUZZY_MIN = 4       # shorter query words match by prefix only
+FUZZY_SHARE = 0.5   # of the query word's trigrams a fuzzy match must share
+
+_WORD = re.compile(r"\w+")
+
+
+def words(text):
+    return _WORD.findall(text.lower())
+
+
+def trigrams(word, closed=True):
+    """The trigrams of *word* padded at the start, and at the end unless it may still be typed on."""
+    padded = "  " + word + (" " if closed else "")
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TeacherIndex:
+    def __init__(self, school):
+        self.school = school
+        school.hooks.append(self._on_change)
+        self.rebuild()
+
+    def rebuild(self):
+        """Reindex every teacher; needed after a load."""
+        self.prefixes = {}
+        self.trigrams = {}
+        # lesson code -> the prefix and trigram keys it is filed under
+        self.keys = {}
+        self.codes = {}
+        for teacher in self.school.teachers.values():
+            self._add(teacher)
+
+    def _on_change(self, change):
+        if change[0] == "teacher":
+            _, teacher_id, _, after = change
+            self._remove(teacher_id)
+            if after is not None:
+                self._add(after)
+
+    def _add(self, teacher):
+        codes = self.codes[teacher.id] = []
+        for subject in teacher.subjects:
+            code = self.school.code_of(teacher.id, subject)
+            codes.append(code)
+            prefixes, grams = set(), set()
+            for word in words(teacher.name) + words(subject):
+                prefixes.update(word[:n] for n in range(1, len(word) + 1))
+                grams |= trigrams(word)
+            for key in prefixes:
+                self.prefixes.setdefault(key, set()).add(code)
+            for key in grams:
+                self.trigrams.setdefault(key, set()).add(code)
+            self.keys[code] = (prefixes, grams)
+
+    def _remove(self, teacher_id):
+        for code in self.codes.pop(teacher_id, ()):
+            prefixes, grams = self.keys.pop(code)
+            for index, keys in ((self.prefixes, prefixes), (self.trigrams, grams)):
+                for key in keys:
+                    posting = index[key]
+                    posting.discard(code)
+                    if not posting:
+                        del index[key]
+
+    def _word_matches(self, word):
+        found = self.prefixes.get(word)
+        if found or len(word) < FUZZY_MIN:
+            return set(found or ())
+        # Nothing starts with the word as typed: take it for a typo.
+        grams = trigrams(word, closed=False)
+        shared = Counter()
+        for key in grams:
+            shared.update(self.trigrams.get(key, ()))
+        need = FUZZY_SHARE * len(grams)
+        return {code for code, n in shared.items() if n >= need}
+
+    def search(self, query):
+        """The lesson codes matching every word of *query*, or None when it has no words."""
+        found = None
+        for word in words(query):
+            matches = self._word_matches(word)
+            found = matches if found is None else found & matches
+            if not found:
+                return set()
+        return found
@@ -0,0 +1,657 @@
+"""Automatic timetable generator for SmartShed.
+
+The generator works on a ``Problem``, a plain picklable snapshot of a
+``School``: every class gets the number of periods per subject asked for
+in ``School.subject_quotas`` and no teacher is ever booked twice in the
+same slot (the rule ``TimetableTable.dropEvent`` enforces by hand), nor
+over their daily or weekly limit in ``School.teacher_limits``, nor in a
+slot marked in ``School.unavailable``.
+
+Rooms are pooled: subjects that share a room form one pool, a subject
+with fewer rooms than its pool gets a pool of its own as well, and no
+slot may hold more lessons of a pool than its rooms hold classes
+together.  ``apply_solution`` then books an actual room for each
+generated lesson.  When rooms overlap in more tangled ways the pools are
+only an upper bound, so a lesson can be left without a room (the health
+panel lists these).
+
+Each class/teacher lesson is an edge of a bipartite multigraph and each
+slot a colour, so a clash-free week is a proper edge colouring. Lessons
+are inserted greedily and, when no common free slot exists, room is made
+by flipping an alternating (Kempe) chain of two slots. Without locked
+cells this always succeeds when every class and every teacher has at
+most one lesson per slot (Konig's theorem); anything left over is handed
+to a tabu min-conflicts search bounded by a time limit.
+
+``RestartRun`` runs several seeded searches on a process pool and keeps
+the best-scoring week.
+"""
+
+import multiprocessing
+import random
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+
+
+FREE = -1
+BLOCKED = -2    # in _Search.busy: the teacher is unavailable in that slot
+
+
+class Problem:
+    """Picklable snapshot of everything the generator needs from a School."""
+
+    def __init__(self, day_names, slots, classes, teachers, quotas, fixed, week_limits=None, unavailable=None,
+                 names=None, room_pools=None, pool_capacity=None, day_limits=None):
+        self.day_names = day_names
+        self.days = len(day_names)  # columns of the grid
+        self.slots = slots          # cells per class per week
+        self.classes = classes      # (grade, class name) pairs
+        self.teachers = teachers    # (lesson code, teacher id, subject) triples
+        self.quotas = quotas        # per class: {subject: periods per week}
+        self.fixed = fixed          # per class: teacher index per slot, FREE if not locked
+        self.week_limits = week_limits or {}    # teacher id -> max periods per week
+        self.day_limits = day_limits or {}      # teacher id -> max periods per day
+        self.unavailable = unavailable or {}    # teacher id -> bitmask of slots they cannot teach in
+        self.names = names or {}                # teacher id -> name, for messages
+        self.room_pools = room_pools or {}      # subject -> indexes of the room pools it draws on
+        self.pool_capacity = pool_capacity or []  # per room pool: classes its rooms hold at once
+
+    def week_cap(self, person):
+        mask = self.unavailable.get(person, 0)
+        per_day = self.day_cap(person)
+        open_slots = sum(min(per_day, sum(1 for slot in range(day, self.slots, self.days) if not mask >> slot & 1))
+                         for day in range(self.days))
+        return min(open_slots, self.week_limits.get(person, self.slots))
+
+    def day_cap(self, person):
+        return self.day_limits.get(person, self.slots // self.days)
+
+    def teacher_label(self, t):
+        _, person, subject = self.teachers[t]
+        return f"{self.names.get(person, person)} ({subject})"
+
+    def slot_label(self, slot):
+        period, day = divmod(slot, self.days)
+        return f"{self.day_names[day]} P{period + 1}"
+
+
+class Solution:
+    def __init__(self, grid=None, unplaced=None, problems=None, seed=None):
+        self.grid = grid                    # per class: teacher index per slot, FREE if empty
+        self.unplaced = unplaced or []      # (class index, teacher index) lessons left out
+        self.problems = problems or []
+        self.seed = seed
+        self.score = None
+
+    @property
+    def ok(self):
+        return self.grid is not None and not self.problems
+
+
+def room_pools(school):
+    """({subject: [pool index]}, [classes held at once per pool]) for the school's rooms.
+
+    Rooms sharing a subject, directly or through other rooms, form one pool;
+    a subject taken by only some of a pool's rooms also has a pool of its own.
+    """
+    groups = []
+    for room in school.rooms.values():
+        subjects, capacity = set(room.subjects), room.capacity
+        for group in [group for group in groups if group[0] & subjects]:
+            groups.remove(group)
+            subjects |= group[0]
+            capacity += group[1]
+        groups.append((subjects, capacity))
+    pools = {subject: [g] for g, (subjects, _) in enumerate(groups) for subject in subjects}
+    capacities = [capacity for _, capacity in groups]
+    for subject, (g,) in sorted(pools.items()):
+        capacity = sum(room.capacity for room in school.rooms_for(subject))
+        if capacity < capacities[g]:
+            pools[subject].append(len(capacities))
+            capacities.append(capacity)
+    return pools, capacities
+
+
+def snapshot(school, keep_existing=True):
+    teachers = [(school.code_of(tid, subject), tid, subject)
+                for tid, teacher in school.teachers.items() for subject in teacher.subjects]
+    index = {code: i for i, (code, _, _) in enumerate(teachers)}
+    classes, quotas, fixed = [], [], []
+    slots = school.periods * len(school.days)
+    for timetable in school.timetables():
+        classes.append((timetable.grade, timetable.class_name))
+        quotas.append(dict(school.subject_quotas.get(timetable.class_name, {})))
+        row = [FREE] * slots
+        if keep_existing:
+            for slot, code in enumerate(timetable.cells):
+                if code:
+                    row[slot] = index.get(code, FREE)
+        fixed.append(row)
+    week_limits = {tid: limits["week"] for tid, limits in school.teacher_limits.items()
+                   if limits.get("week") is not None}
+    day_limits = {tid: limits["day"] for tid, limits in school.teacher_limits.items()
+                  if limits.get("day") is not None}
+    names = {tid: teacher.name for tid, teacher in school.teachers.items()}
+    pools, capacities = room_pools(school)
+    return Problem(list(school.days), slots, classes, teachers, quotas, fixed, week_limits,
+                   dict(school.unavailable), names, pools, capacities, day_limits)
+
+
+def check(problem):
+    """Reasons why the quotas of *problem* can never be met; empty if none found."""
+    problems = []
+    by_subject = {}
+    for _, person, subject in problem.teachers:
+        by_subject.setdefault(subject, set()).add(person)
+
+    person_load = Counter()
+    day_load = Counter()
+    booked = {}
+    for c, row in enumerate(problem.fixed):
+        for slot, t in enumerate(row):
+            if t == FREE:
+                continue
+            person = problem.teachers[t][1]
+            person_load[person] += 1
+            day_load[person, slot % problem.days] += 1
+            if (slot, person) in booked:
+                problems.append(f"{problem.names.get(person, person)} is double-booked at {problem.slot_label(slot)} "
+                                f"({booked[slot, person]} and {problem.classes[c][1]}).")
+            booked[slot, person] = problem.classes[c][1]
+    for (person, day), n in sorted(day_load.items()):
+        if n > problem.day_cap(person):
+            problems.append(f"{problem.names.get(person, person)} has {n} locked periods on {problem.day_names[day]}, "
+                            f"over their daily limit ({problem.day_cap(person)}).")
+
+    demand = Counter()
+    for c, quota in enumerate(problem.quotas):
+        class_name = problem.classes[c][1]
+        have = Counter(problem.teachers[t][2] for t in problem.fixed[c] if t != FREE)
+        needed = 0
+        for subject, n in quota.items():
+            if n - have[subject] <= 0:
+                continue
+            if subject not in by_subject:
+                problems.append(f"{class_name}: no teacher teaches {subject}.")
+                continue
+            needed += n - have[subject]
+            demand[subject] += n - have[subject]
+        free = problem.fixed[c].count(FREE)
+        if needed > free:
+            problems.append(f"{class_name} needs {needed} more periods but only {free} slots are free.")
+
+    for subject, n in sorted(demand.items()):
+        capacity = sum(max(0, problem.week_cap(person) - person_load[person]) for person in by_subject[subject])
+        if n > capacity:
+            problems.append(f"{subject}: {n} periods requested but its teachers have only {capacity} free.")
+
+    room_demand = Counter()
+    for subject, pools in problem.room_pools.items():
+        for pool in pools:
+            room_demand[pool] += demand[subject]
+    for row in problem.fixed:
+        for t in row:
+            if t != FREE:
+                for pool in problem.room_pools.get(problem.teachers[t][2], ()):
+                    room_demand[pool] += 1
+    for pool, n in sorted(room_demand.items()):
+        capacity = problem.pool_capacity[pool] * problem.slots
+        if n > capacity:
+            subjects = ", ".join(sorted(s for s, pools in problem.room_pools.items() if pool in pools))
+            problems.append(f"Rooms for {subjects}: {n} periods requested but they hold only {capacity}.")
+    return problems
+
+
+def solve(problem, seed=None, time_limit=10.0, should_stop=None):
+    problems = check(problem)
+    if problems:
+        return Solution(problems=problems, seed=seed)
+    return _Search(problem, random.Random(seed), time_limit, should_stop).run(seed)
+
+
+class RestartRun:
+    """*restarts* seeded solve() runs spread over worker processes; keeps the best one.
+
+    Nothing here blocks: the GUI polls ``poll()`` from a timer and may call
+    ``cancel()`` at any time, which also stops searches already running.
+    """
+
+    def __init__(self, problem, restarts=8, workers=None, time_limit=10.0, seed=None):
+        self.problem = problem
+        self.best = None
+        self.failure = None
+        self.finished = 0
+        self.cancelled = False
+        base = random.randrange(1 << 30) if seed is None else seed
+        self._stop = multiprocessing.Event()
+        self._pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                         initargs=(self._stop,))
+        self._pending = [self._pool.submit(solve, problem, base + i, time_limit, _worker_stopped)
+                         for i in range(restarts)]
+        self.restarts = restarts
+
+    def poll(self):
+        """Collect finished runs; True once every run is done or cancelled."""
+        still = []
+        for future in self._pending:
+            if not future.done():
+                still.append(future)
+                continue
+            self.finished += 1
+            if future.cancelled() or future.exception() is not None:
+                continue
+            solution = future.result()
+            if not solution.ok:
+                self.failure = solution
+            elif self.best is None or solution.score < self.best.score:
+                self.best = solution
+        self._pending = still
+        if not still:
+            self._pool.shutdown(wait=False)
+            return True
+        return False
+
+    def cancel(self):
+        self.cancelled = True
+        self._stop.set()
+        for future in self._pending:
+            future.cancel()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def result(self):
+        """Block until all runs are done and return the best solution (headless use)."""
+        while not self.poll():
+            time.sleep(0.05)
+        return self.best
+
+
+_stop_event = None
+
+
+def _init_worker(stop_event):
+    global _stop_event
+    _stop_event = stop_event
+
+
+def _worker_stopped():
+    return _stop_event is not None and _stop_event.is_set()
+
+
+def spread_penalty(problem, grid):
+    """Soft cost: lessons of one subject beyond an even spread over the days of a class."""
+    penalty = 0
+    for c, row in enumerate(grid):
+        per_day = Counter()
+        totals = Counter()
+        for slot, t in enumerate(row):
+            if t != FREE:
+                subject = problem.teachers[t][2]
+                per_day[subject, slot % problem.days] += 1
+                totals[subject] += 1
+        for (subject, _), n in per_day.items():
+            allowed = -(-totals[subject] // problem.days)
+            penalty += max(0, n - allowed)
+    return penalty
+
+
+def apply_solution(school, problem, solution):
+    """Write the generated lessons of *solution* into *school* and book their rooms; locked cells are left alone."""
+    waiting = []
+    for c, (grade, class_name) in enumerate(problem.classes):
+        timetable = school.timetable(class_name, grade)
+        if timetable is None:
+            continue
+        for slot, t in enumerate(solution.grid[c]):
+            if problem.fixed[c][slot] != FREE:
+                continue
+            row, col = divmod(slot, problem.days)
+            if t == FREE:
+                timetable.clear(row, col)
+            else:
+                timetable.set_id(row, col, problem.teachers[t][0])
+                if school.rooms_for(problem.teachers[t][2]) and not timetable.get_room(row, col):
+                    waiting.append((timetable, row, col, problem.teachers[t][2]))
+    # Subjects with the fewest rooms choose first.
+    waiting.sort(key=lambda lesson: len(school.rooms_for(lesson[3])))
+    for timetable, row, col, subject in waiting:
+        room_id = school.free_room(subject, row, col)
+        if room_id is not None:
+            timetable.set_room(row, col, room_id)
+
+
+class _Search:
+    def __init__(self, problem, rng, time_limit, should_stop):
+        self.problem = problem
+        self.rng = rng
+        self.deadline = time.monotonic() + time_limit
+        self.should_stop = should_stop
+
+        people = {}
+        self.person_of = [people.setdefault(person, len(people)) for _, person, _ in problem.teachers]
+        self.grid = [list(row) for row in problem.fixed]
+        # busy[n][slot]: class person n teaches at slot, FREE if none,
+        # BLOCKED if they are unavailable then.
+        self.busy = [[FREE] * problem.slots for _ in people]
+        self.load = [0] * len(people)
+        self.cap = [problem.week_cap(person) for person in people]
+        # day_load[n][day]: periods person n teaches that day, against day_cap[n].
+        self.day_load = [[0] * problem.days for _ in people]
+        self.day_cap = [problem.day_cap(person) for person in people]
+        for person, n in people.items():
+            mask = problem.unavailable.get(person, 0)
+            for slot in range(problem.slots):
+                if mask >> slot & 1:
+                    self.busy[n][slot] = BLOCKED
+        self.by_subject = {}
+        for t, (_, _, subject) in enumerate(problem.teachers):
+            self.by_subject.setdefault(subject, []).append(t)
+        # room_use[p][slot]: lessons drawing on room pool p at slot, against room_cap[p].
+        self.pools = [tuple(problem.room_pools.get(subject, ())) for _, _, subject in problem.teachers]
+        self.room_cap = list(problem.pool_capacity)
+        self.room_use = [[0] * problem.slots for _ in self.room_cap]
+        for c, row in enumerate(problem.fixed):
+            for slot, t in enumerate(row):
+                if t != FREE:
+                    n = self.person_of[t]
+                    self.busy[n][slot] = c
+                    self.load[n] += 1
+                    self.day_load[n][slot % problem.days] += 1
+                    self.book_room(t, slot, 1)
+
+    def stopped(self):
+        return time.monotonic() > self.deadline or (self.should_stop is not None and self.should_stop())
+
+    def run(self, seed):
+        problem = self.problem
+        lessons, problems = self.assign_teachers()
+        if problems:
+            return Solution(problems=problems, seed=seed)
+        self.rng.shuffle(lessons)
+        # Busiest teachers first: their lessons have the fewest free slots to go to.
+        lessons.sort(key=lambda lesson: -self.load[self.person_of[lesson[1]]])
+        leftover = [lesson for lesson in lessons if not self.insert(*lesson)]
+        unplaced = self.repair(leftover) if leftover else []
+        solution = Solution(self.grid, unplaced, seed=seed)
+        solution.score = (len(unplaced), spread_penalty(problem, self.grid))
+        return solution
+
+    def assign_teachers(self):
+        """Split each class's remaining quota into (class, teacher) lessons, balancing loads."""
+        problem = self.problem
+        by_subject = self.by_subject
+        groups = []
+        for c, quota in enumerate(problem.quotas):
+            have = Counter(problem.teachers[t][2] for t in problem.fixed[c] if t != FREE)
+            current = {problem.teachers[t][2]: t for t in problem.fixed[c] if t != FREE}
+            for subject, n in quota.items():
+                if n > have[subject]:
+                    groups.append((c, subject, n - have[subject], current.get(subject)))
+        self.rng.shuffle(groups)
+        groups.sort(key=lambda group: -group[2])
+
+        load = list(self.load)
+        lessons, problems = [], []
+        for c, subject, need, current in groups:
+            while need:
+                spare = [t for t in by_subject[subject] if load[self.person_of[t]] < self.cap[self.person_of[t]]]
+                if not spare:
+                    problems.append(f"{problem.classes[c][1]}: every {subject} teacher is fully booked.")
+                    break
+                whole = [t for t in spare if load[self.person_of[t]] + need <= self.cap[self.person_of[t]]]
+                # Keep a class with the teacher it already has for a subject where possible.
+                t = min(whole or spare, key=lambda t: (t != current, load[self.person_of[t]], self.rng.random()))
+                take = min(need, self.cap[self.person_of[t]] - load[self.person_of[t]])
+                load[self.person_of[t]] += take
+                lessons.extend([(c, t)] * take)
+                need -= take
+        self.load = load
+        return lessons, problems
+
+    def place(self, c, t, slot):
+        self.grid[c][slot] = t
+        self.busy[self.person_of[t]][slot] = c
+        self.book_day(t, slot, 1)
+        self.book_room(t, slot, 1)
+
+    def book_day(self, t, slot, n):
+        self.day_load[self.person_of[t]][slot % self.problem.days] += n
+
+    def day_full(self, t, slot):
+        """True if t's teacher is at their daily limit on the day of slot."""
+        n = self.person_of[t]
+        return self.day_load[n][slot % self.problem.days] >= self.day_cap[n]
+
+    def day_over(self, t, slot):
+        n = self.person_of[t]
+        return self.day_load[n][slot % self.problem.days] > self.day_cap[n]
+
+    def days_fit(self, t, chain, alpha, beta):
+        """After a chain flip: t still fits on alpha's day and no teacher on the chain is over their daily limit."""
+        if self.day_full(t, alpha):
+            return False
+        return not any(row[s] != FREE and self.day_over(row[s], s)
+                       for row in map(self.grid.__getitem__, chain) for s in (alpha, beta))
+
+    def book_room(self, t, slot, n):
+        for p in self.pools[t]:
+            self.room_use[p][slot] += n
+
+    def room_full(self, t, slot):
+        """True if one more lesson of t's subject at slot would not fit in its rooms."""
+        return any(self.room_use[p][slot] >= self.room_cap[p] for p in self.pools[t])
+
+    def room_over(self, t, slot):
+        return any(self.room_use[p][slot] > self.room_cap[p] for p in self.pools[t])
+
+    def rooms_fit(self, t, alpha, beta):
+        """After a chain flip: t still fits at alpha and no room pool is over capacity at alpha or beta."""
+        if not self.room_cap:
+            return True
+        return not self.room_full(t, alpha) and all(
+            use[alpha] <= cap and use[beta] <= cap for use, cap in zip(self.room_use, self.room_cap))
+
+    def insert(self, c, t):
+        problem = self.problem
+        row = self.grid[c]
+        busy = self.busy[self.person_of[t]]
+        open_slots = [s for s in range(problem.slots) if row[s] == FREE]
+        both = [s for s in open_slots if busy[s] == FREE and not self.room_full(t, s) and not self.day_full(t, s)]
+        if both:
+            self.place(c, t, self.rng.choice(both))
+            return True
+        # No common free slot: free one up by flipping an alpha/beta chain.
+        teacher_free = [s for s in range(problem.slots) if busy[s] == FREE]
+        self.rng.shuffle(open_slots)
+        self.rng.shuffle(teacher_free)
+        for alpha in open_slots:
+            for beta in teacher_free:
+                chain = self.flip_chain(self.person_of[t], alpha, beta)
+                if chain is None:
+                    continue
+                if self.rooms_fit(t, alpha, beta) and self.days_fit(t, chain, alpha, beta):
+                    self.place(c, t, alpha)
+                    return True
+                # The flip moved lessons into full rooms or over a daily limit; put them back.
+                for c2 in reversed(chain):
+                    self.swap(c2, alpha, beta)
+        # Last resort: hand this one lesson to another teacher of the subject.
+        subject = problem.teachers[t][2]
+        for other in self.by_subject[subject]:
+            n = self.person_of[other]
+            if self.load[n] >= self.cap[n]:
+                continue
+            both = [s for s in open_slots
+                    if self.busy[n][s] == FREE and not self.room_full(other, s) and not self.day_full(other, s)]
+            if both:
+                self.load[self.person_of[t]] -= 1
+                self.load[n] += 1
+                self.place(c, other, self.rng.choice(both))
+                return True
+        return False
+
+    def flip_chain(self, n, alpha, beta):
+        """Swap alpha and beta along the chain starting at teacher n.
+
+        Returns the classes swapped, or None (and changes nothing) if the chain hits a locked cell.
+        """
+        fixed = self.problem.fixed
+        # Teacher -> class edges on the chain are all alpha, class -> teacher edges all beta.
+        chain = []
+        while True:
+            c = self.busy[n][alpha]
+            if c == BLOCKED:
+                return None
+            if c == FREE:
+                break
+            if fixed[c][alpha] != FREE or fixed[c][beta] != FREE:
+                return None
+            chain.append(c)
+            t = self.grid[c][beta]
+            if t == FREE:
+                break
+            n = self.person_of[t]
+        for c in chain:
+            self.swap(c, alpha, beta)
+        return chain
+
+    def swap(self, c, a, b):
+        row = self.grid[c]
+        ta, tb = row[a], row[b]
+        if ta != FREE and self.busy[self.person_of[ta]][a] == c:
+            self.busy[self.person_of[ta]][a] = FREE
+        if tb != FREE and self.busy[self.person_of[tb]][b] == c:
+            self.busy[self.person_of[tb]][b] = FREE
+        row[a], row[b] = tb, ta
+        if tb != FREE:
+            self.busy[self.person_of[tb]][a] = c
+            self.move(tb, b, a)
+        if ta != FREE:
+            self.busy[self.person_of[ta]][b] = c
+            self.move(ta, a, b)
+
+    def move(self, t, a, b):
+        """Move the day and room bookings of a lesson of t from slot a to slot b."""
+        self.book_day(t, a, -1)
+        self.book_day(t, b, 1)
+        self.book_room(t, a, -1)
+        self.book_room(t, b, 1)
+
+    def repair(self, leftover):
+        """Tabu min-conflicts search over within-class swaps; returns lessons it could not place.
+
+        A lesson clashes when its teacher is booked twice or over their daily
+        limit, or its room group is over capacity.
+        """
+        problem, rng = self.problem, self.rng
+        slots = problem.slots
+        # count[n][slot] counts every booking, clashes included; busy[] is not used from here on.
+        # An unavailable slot counts as already taken twice over, so nothing stays there.
+        count = [[2 if s == BLOCKED else 0 for s in busy] for busy in self.busy]
+        for row in self.grid:
+            for slot, t in enumerate(row):
+                if t != FREE:
+                    count[self.person_of[t]][slot] += 1
+        for c, t in leftover:
+            row = self.grid[c]
+            open_slots = [s for s in range(slots) if row[s] == FREE]
+            slot = min(open_slots, key=lambda s: (count[self.person_of[t]][s] + self.room_full(t, s)
+                                                  + self.day_full(t, s), rng.random()))
+            row[slot] = t
+            count[self.person_of[t]][slot] += 1
+            self.book_day(t, slot, 1)
+            self.book_room(t, slot, 1)
+
+        def clashing(t, s):
+            return count[self.person_of[t]][s] > 1 or self.room_over(t, s) or self.day_over(t, s)
+
+        def clashes():
+            return [(c, s) for c, row in enumerate(self.grid) for s, t in enumerate(row)
+                    if t != FREE and problem.fixed[c][s] == FREE and clashing(t, s)]
+
+        tabu = {}
+        step = 0
+        conflicted = clashes()
+        while conflicted and not self.stopped():
+            step += 1
+            if step % 200 == 0:
+                conflicted = clashes()
+                if not conflicted:
+                    break
+            c, s = rng.choice(conflicted)
+            row = self.grid[c]
+            t = row[s]
+            if t == FREE or not clashing(t, s):
+                conflicted = clashes()
+                continue
+            n = self.person_of[t]
+            # Another teacher of the subject fixes a teacher clash, never a full room.
+            other = self.free_substitute(t, s, count) if count[n][s] > 1 or self.day_over(t, s) else None
+            if other is not None:
+                count[n][s] -= 1
+                count[self.person_of[other]][s] += 1
+                self.load[n] -= 1
+                self.load[self.person_of[other]] += 1
+                self.book_day(t, s, -1)
+                self.book_day(other, s, 1)
+                row[s] = other
+                continue
+            best, best_delta = [], None
+            for s2 in range(slots):
+                if s2 == s or problem.fixed[c][s2] != FREE or tabu.get((c, s2, t), 0) > step:
+                    continue
+                t2 = row[s2]
+                if t2 != FREE and self.person_of[t2] == n:
+                    continue
+                delta = (count[n][s2] >= 1) - (count[n][s] > 1)
+                if t2 != FREE:
+                    n2 = self.person_of[t2]
+                    delta += (count[n2][s] >= 1) - (count[n2][s2] > 1)
+                pools, pools2 = self.pools[t], self.pools[t2] if t2 != FREE else ()
+                if s2 % problem.days != s % problem.days:
+                    delta += self.day_full(t, s2) - self.day_over(t, s)
+                    if t2 != FREE:
+                        delta += self.day_full(t2, s) - self.day_over(t2, s2)
+                if pools != pools2:
+                    # Swapping two lessons drawing on the same rooms leaves their use as it is.
+                    if pools:
+                        delta += self.room_full(t, s2) - self.room_over(t, s)
+                    if pools2:
+                        delta += self.room_full(t2, s) - self.room_over(t2, s2)
+                if best_delta is None or delta < best_delta:
+                    best, best_delta = [s2], delta
+                elif delta == best_delta:
+                    best.append(s2)
+            if not best:
+                continue
+            s2 = rng.choice(best)
+            t2 = row[s2]
+            count[n][s] -= 1
+            count[n][s2] += 1
+            self.move(t, s, s2)
+            if t2 != FREE:
+                count[self.person_of[t2]][s2] -= 1
+                count[self.person_of[t2]][s] += 1
+                self.move(t2, s2, s)
+            row[s], row[s2] = t2, t
+            tabu[c, s, t] = step + 5 + rng.randrange(10)
+            conflicted.append((c, s2))
+
+        unplaced = []
+        for c, s in clashes():
+            t = self.grid[c][s]
+            if clashing(t, s):
+                count[self.person_of[t]][s] -= 1
+                self.book_day(t, s, -1)
+                self.book_room(t, s, -1)
+                self.grid[c][s] = FREE
+                unplaced.append((c, t))
+        return unplaced
+
+    def free_substitute(self, t, slot, count):
+        for other in self.by_subject[self.problem.teachers[t][2]]:
+            n = self.person_of[other]
+            if count[n][slot] == 0 and self.load[n] < self.cap[n] and not self.day_full(other, slot):
+                return other
+        return None
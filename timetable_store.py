@@ -0,0 +1,110 @@
+"""Reading and writing SmartShed save files.
+
+Two formats share one schema (the dict built by ``School.to_dict``):
+
+* JSON, as written by every earlier version.
+* A compact binary file: a versioned header holding everything except the
+  grids as JSON, then all timetables' lesson codes packed as little-endian
+  small-integer arrays.  Version 1 files, from before teacher IDs, index
+  the teacher dictionary's keys instead (0 = empty, i = i-th key).
+
+``load`` detects the format from the file's first bytes, so the Load
+button accepts either.  Files from before teacher IDs load as they were
+written and are upgraded by ``School.load_dict``.
+"""
+
+import json
+import os
+import struct
+import sys
+from array import array
+
+
+MAGIC = b"SMTT"
+VERSION = 2
+BINARY_SUFFIX = ".smtt"
+
+_HEADER = struct.Struct("<4sHI")
+
+
+def is_binary(blob):
+    return blob[:len(MAGIC)] == MAGIC
+
+
+def dumps_binary(data):
+    header = {key: value for key, value in data.items() if key != "timetables"}
+    classes = []
+    cells = []
+    for grade, grade_classes in data.get("timetables", {}).items():
+        for class_name, rows in grade_classes.items():
+            classes.append([grade, class_name, [len(row) for row in rows]])
+            for row in rows:
+                cells.extend(row)
+    packed = array("H" if len(data.get("lessons", ())) < 0xFFFF else "I", cells)
+    header["_grids"] = {
+        "grades": list(data.get("timetables", {})),
+        "classes": classes,
+        "typecode": packed.typecode
+    }
+    if sys.byteorder != "little":
+        packed.byteswap()
+    meta = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    return _HEADER.pack(MAGIC, VERSION, len(meta)) + meta + packed.tobytes()
+
+
+def loads_binary(blob):
+    magic, version, meta_len = _HEADER.unpack_from(blob)
+    if magic != MAGIC:
+        raise ValueError("Not a SmartShed binary timetable file.")
+    if version > VERSION:
+        raise ValueError(f"File format version {version} is newer than this program supports ({VERSION}).")
+    start = _HEADER.size
+    header = json.loads(blob[start:start + meta_len].decode("utf-8"))
+    grids = header.pop("_grids")
+    packed = array(grids["typecode"])
+    packed.frombytes(blob[start + meta_len:])
+    if sys.byteorder != "little":
+        packed.byteswap()
+
+    # Version 1 cells index the teacher keys; later ones are lesson codes already.
+    keys = [""] + list(header.get("teachers", {})) + grids["extra_keys"] if version == 1 else None
+    timetables = {grade: {} for grade in grids["grades"]}
+    pos = 0
+    for grade, class_name, widths in grids["classes"]:
+        rows = []
+        for width in widths:
+            chunk = packed[pos:pos + width]
+            rows.append([keys[i] for i in chunk] if keys else chunk.tolist())
+            pos += width
+        timetables[grade][class_name] = rows
+
+    data = {"teachers": header.pop("teachers", {}), "timetables": timetables}
+    data.update(header)
+    return data
+
+
+def load(filename):
+    with open(filename, "rb") as f:
+        blob = f.read()
+    if is_binary(blob):
+        return loads_binary(blob)
+    return json.loads(blob.decode("utf-8"))
+
+
+def save(filename, data):
+    """Write *data* to a temporary file and rename it over *filename*.
+
+    A crash mid-write leaves the previous file intact.
+    """
+    tmp = filename + ".tmp"
+    if filename.lower().endswith(BINARY_SUFFIX):
+        with open(tmp, "wb") as f:
+            f.write(dumps_binary(data))
+            f.flush()
+            os.fsync(f.fileno())
+    else:
+        with open(tmp, "w") as f:
+            json.dump(data, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp, filename)